@@ -1,12 +1,20 @@
 # Micropython
 '''Creates 50% duty cycle square waves using PWM and PIO. You can hook these up to an LED if you
 want but my purpose is to use an oscilloscope to compare the quality of the waves produced
-by the two different techniques.'''
+by the two different techniques.
+
+Without an oscilloscope, set LOOPBACK to True and wire GP0 to GP16 and GP15
+to GP17. Both waves are then measured on-chip by pio_counter, which prints
+their frequency, duty cycle and jitter.'''
 
 import time
+import rp2
 from machine import Pin, PWM
 from rp2 import PIO, StateMachine, asm_pio
 
+# Measure both outputs looped back to GP16 and GP17
+LOOPBACK = False
+
 @asm_pio(set_init=PIO.OUT_LOW)
 def square():
     wrap_target()
@@ -27,3 +35,18 @@ pwm_pin.duty_u16(32767)
 sm = rp2.StateMachine(0, square, freq=freq*2, set_base=Pin(15))
 sm.active(1)
 
+if LOOPBACK:
+    import signal_stats
+    from pio_counter import PeriodCounter
+    for label, pin in (('PWM', 16), ('PIO', 17)):
+        counter = PeriodCounter(pin)
+        stats, counts = counter.measure()
+        counter.deinit()
+        if stats is None:
+            print(f'{label}: no signal on GP{pin}')
+            continue
+        print(f'{label}: {stats.freq:.3f} Hz duty {stats.duty:.4f} '
+              f'jitter {stats.jitter_rms_ns:.1f} ns rms {stats.jitter_pp_ns:.1f} ns p-p')
+        edges, bins = signal_stats.period_histogram(counts, counter.clock_freq)
+        print(signal_stats.format_histogram(edges, bins))
+
@@ -0,0 +1,120 @@
+# Micropython
+'''Proportional bitmap fonts for the SSD1306 driver.
+
+framebuf.text only has an 8x8 font, and drawing bigger glyphs one pixel at a
+time is far too slow. A BitmapFont reads pre-rasterized glyphs from a font
+file in flash. Each glyph is stored in MONO_VLSB layout, so it can be drawn
+with a single blit. Recently used glyphs are kept in a small LRU cache so the
+file is only read for a glyph that isn't cached.
+
+Font files are made on a PC with make_font.py. The layout is:
+
+    b'MVF1', height, first char code, number of chars
+    per char: width, offset of the glyph data from the start (little endian 16 bit)
+    glyph data: ((height + 7) // 8) pages of width bytes each
+
+A width of 0 means the font has no glyph for that char.'''
+
+import framebuf
+from array import array
+
+MAGIC = b'MVF1'
+HEADER_SIZE = 7
+ENTRY_SIZE = 3
+
+
+class BitmapFont():
+    '''A font loaded from a make_font.py file. cache_size is the number of
+    glyphs kept in RAM.'''
+
+    def __init__(self, path, cache_size=16):
+        self.file = open(path, 'rb') if isinstance(path, str) else path
+        header = self.file.read(HEADER_SIZE)
+        if header[:4] != MAGIC:
+            raise ValueError('Not a bitmap font file')
+        self.height = header[4]
+        self.first = header[5]
+        self.count = header[6]
+        self.pages = (self.height + 7) // 8
+        self.table = self.file.read(self.count * ENTRY_SIZE)
+        self.max_width = max(self.table[ii] for ii in range(0, len(self.table), ENTRY_SIZE))
+        # chars the font doesn't have advance by half the height
+        self.space = self.height // 2
+
+        # Every cache slot is sized for the widest glyph, so filling a slot
+        # never allocates a new buffer
+        slot_size = self.pages * self.max_width
+        self.slots = [bytearray(slot_size) for _ in range(cache_size)]
+        self.views = [memoryview(buf) for buf in self.slots]
+        self.glyphs = [None] * cache_size # FrameBuffer of the glyph in each slot
+        self.chars = [-1] * cache_size # char code held by each slot
+        self.used = array('I', [0] * cache_size) # last use of each slot
+        self.lookup = {} # char code -> slot
+        self.clock = 0
+        self.hits = 0
+        self.misses = 0
+
+    def width(self, code):
+        '''Width in pixels of a char code, 0 if the font has no glyph.'''
+        index = code - self.first
+        if index < 0 or index >= self.count:
+            return 0
+        return self.table[index * ENTRY_SIZE]
+
+    def measure(self, s):
+        '''Width in pixels of a string drawn with text().'''
+        total = 0
+        for ch in s:
+            total += self.width(ord(ch)) or self.space
+        return total
+
+    def glyph(self, code):
+        '''Returns the FrameBuffer of a char code, reading it from the file
+        if it isn't cached. Returns None if the font has no glyph.'''
+        self.clock += 1
+        slot = self.lookup.get(code)
+        if slot is not None:
+            self.used[slot] = self.clock
+            self.hits += 1
+            return self.glyphs[slot]
+
+        w = self.width(code)
+        if w == 0:
+            return None
+        self.misses += 1
+        # Evict the least recently used slot
+        slot = 0
+        oldest = self.used[0]
+        for ii in range(1, len(self.used)):
+            if self.used[ii] < oldest:
+                oldest = self.used[ii]
+                slot = ii
+        if self.chars[slot] >= 0:
+            del self.lookup[self.chars[slot]]
+
+        entry = (code - self.first) * ENTRY_SIZE
+        offset = self.table[entry + 1] | (self.table[entry + 2] << 8)
+        self.file.seek(offset)
+        self.file.readinto(self.views[slot][:self.pages * w])
+        self.glyphs[slot] = framebuf.FrameBuffer(self.slots[slot], w, self.height, framebuf.MONO_VLSB)
+        self.chars[slot] = code
+        self.used[slot] = self.clock
+        self.lookup[code] = slot
+        return self.glyphs[slot]
+
+    def text(self, fb, s, x, y):
+        '''Draws a string into a FrameBuffer (or an SSD1306) with its top
+        left corner at x, y. Only set pixels are drawn, so clear the area
+        first when overwriting. Returns the x after the last char.'''
+        for ch in s:
+            code = ord(ch)
+            glyph = self.glyph(code)
+            if glyph is None:
+                x += self.space
+                continue
+            fb.blit(glyph, x, y, 0)
+            x += self.width(code)
+        return x
+
+    def close(self):
+        self.file.close()
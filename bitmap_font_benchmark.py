@@ -0,0 +1,102 @@
+# Micropython
+'''Measures how fast BitmapFont draws glyphs. A seven segment font is built
+with make_font and written to a file, as it would be in flash, so no font
+file needs to be copied over first. Drawing goes into an SSD1306 on the
+counting bus from counting_bus, so no panel is needed either.
+
+The text is a run of temperature readings, like a status display showing a
+value that drifts. Prints glyphs per second for:
+
+    per pixel        each glyph read from the file and drawn pixel by pixel
+    blit, cached     a cache that holds every glyph
+    blit, LRU        a cache smaller than the glyphs used, so it evicts
+    blit, no cache   one slot, so every glyph is read from the file
+    framebuf.text    the built-in 8x8 font, as a reference
+
+with the cache hit rate and the number of glyph reads from the file for the
+blit cases.
+
+On the board blit is native code. On a PC under host/run.py --realtime the
+framebuf stand-in's blit is pure Python and copies pixel by pixel, so blit
+comes out no faster than per-pixel drawing and hides what the cache saves.
+Only the hit rates and file reads mean much there.'''
+
+import utime
+import uos
+from ssd1306 import SSD1306_I2C
+from counting_bus import CountingI2C
+from bitmap_font import BitmapFont, ENTRY_SIZE
+from make_font import font_bytes, seven_segment
+
+FONT_FILE = 'bench_font.bin'
+READINGS = [f'{(2300 + ii * 7) / 100:.2f} C' for ii in range(40)]
+LRU_SLOTS = 8
+
+
+def per_pixel(oled, font, s, x, y):
+    '''Draws a string one pixel at a time, reading each glyph from the file
+    as a renderer without blit or a cache would.'''
+    f = font.file
+    pages = font.pages
+    for ch in s:
+        code = ord(ch)
+        width = font.width(code)
+        if width == 0:
+            x += font.space
+            continue
+        entry = (code - font.first) * ENTRY_SIZE
+        f.seek(font.table[entry + 1] | (font.table[entry + 2] << 8))
+        data = f.read(pages * width)
+        for xx in range(width):
+            for page in range(pages):
+                bits = data[page * width + xx]
+                yy = y + page * 8
+                while bits:
+                    if bits & 1:
+                        oled.pixel(x + xx, yy, 1)
+                    bits >>= 1
+                    yy += 1
+        x += width
+
+
+def rate(label, repeats, draw, font=None):
+    glyphs = repeats * sum(len(s) for s in READINGS)
+    if font is not None:
+        font.hits = font.misses = 0
+    start = utime.ticks_us()
+    for _ in range(repeats):
+        for s in READINGS:
+            draw(s)
+    us = utime.ticks_diff(utime.ticks_us(), start)
+    line = f'  {label:<24} {glyphs * 1000000 // us:>7} glyphs/s'
+    if font is not None:
+        line += (f'  {font.hits * 100 // (font.hits + font.misses):>3}% hits,'
+                 f' {font.misses:>4} file reads')
+    print(line)
+
+
+def run(height, repeats=2):
+    oled = SSD1306_I2C(128, 32, CountingI2C())
+    height, glyphs = seven_segment(height)
+    data = font_bytes(height, glyphs)
+    print(f'{height} pixel seven segment font, {len(data)} bytes')
+    with open(FONT_FILE, 'wb') as f:
+        f.write(data)
+    fonts = []
+    try:
+        fonts = [BitmapFont(FONT_FILE, cache_size=n) for n in (16, LRU_SLOTS, 1)]
+        cached, lru, uncached = fonts
+        rate('per pixel', repeats, lambda s: per_pixel(oled, uncached, s, 0, 0))
+        rate('blit, cached', repeats, lambda s: cached.text(oled, s, 0, 0), cached)
+        rate(f'blit, LRU {LRU_SLOTS} slots', repeats, lambda s: lru.text(oled, s, 0, 0), lru)
+        rate('blit, no cache', repeats, lambda s: uncached.text(oled, s, 0, 0), uncached)
+        rate('framebuf.text 8x8', repeats, lambda s: oled.text(s, 0, 0))
+    finally:
+        for font in fonts:
+            font.close()
+        uos.remove(FONT_FILE)
+
+
+if __name__ == "__main__":
+    run(16)
+    run(24)
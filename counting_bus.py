@@ -0,0 +1,62 @@
+# Micropython
+'''Stand-ins for the buses and pins used by the display drivers. They count
+transactions and bytes instead of talking to hardware, so a driver can run
+without a device attached while we measure its bus traffic.'''
+
+
+class CountingI2C():
+    '''Stands in for machine.I2C and counts what is written to it.'''
+
+    def __init__(self):
+        self.transactions = 0
+        self.bytes = 0
+
+    def writeto(self, addr, buf):
+        self.transactions += 1
+        self.bytes += len(buf)
+
+    def writevto(self, addr, vector):
+        self.transactions += 1
+        for buf in vector:
+            self.bytes += len(buf)
+
+    def reset(self):
+        '''Zeroes the counters.'''
+        self.transactions = 0
+        self.bytes = 0
+
+
+class CountingSPI():
+    '''Stands in for machine.SPI. Counts chip-select framed writes and the
+    number of times the bus is reconfigured.'''
+
+    def __init__(self):
+        self.transactions = 0
+        self.bytes = 0
+        self.inits = 0
+
+    def init(self, **kwargs):
+        self.inits += 1
+
+    def write(self, buf):
+        self.transactions += 1
+        self.bytes += len(buf)
+
+    def reset(self):
+        '''Zeroes the counters.'''
+        self.transactions = 0
+        self.bytes = 0
+
+
+class FakePin():
+    '''Stands in for an output machine.Pin such as DC, RES or CS.'''
+    OUT = 1
+
+    def __init__(self):
+        self.value = 0
+
+    def init(self, mode, value=0):
+        self.value = value
+
+    def __call__(self, value):
+        self.value = value
@@ -1,72 +1,268 @@
 # Taken from https://github.com/ashchap/PIO_DHT11_Python/blob/main/src/dht11.py
+'''Reads a DHT11 humidity and temperature sensor with a PIO state machine.
+
+The state machine is set up once. Its program waits at a pull() for a
+trigger word before sending the start pulse, so each read only costs one
+put(). Reads poll the RX FIFO with a deadline, so a missing or failed sensor
+returns a result with a failure status instead of hanging in sm.get(). If a
+read fails the state machine is restarted so the next read starts clean.
+
+By default the packed program is used. It pushes the 40 bit frame as one
+32 bit word plus the checksum, so a read takes two sm.get() calls instead of
+five, and dht_decode unpacks it with integer operations. DHT22/AM2302
+sensors are read with model=MODEL_DHT22.
+
+With capture=True the state machine doesn't decide the bits itself. It
+measures the width of every high pulse in 2 us steps, and the 0/1
+threshold is learned from those widths on each read. This copes with
+sensors and cables that shift the pulse widths away from the fixed
+countdown of the other programs. The widths are packed 6 bits each, five
+to a word, so a whole frame fits in the joined RX FIFO and nobody needs to
+drain it while the sensor is sending.'''
+
 import utime
-import rp2 
+import rp2
 from rp2 import PIO, asm_pio
 from machine import Pin
+from array import array
+from collections import namedtuple
+from dht_decode import MODEL_DHT11, MODEL_DHT22, DEFAULT_THRESHOLD_US, decode, pack_bytes, \
+    learn_threshold, widths_to_frame
+
+# A reading. humidity and temperature are None unless status is STATUS_OK.
+# They are integers for a DHT11 and floats with one decimal for a DHT22.
+DHTResult = namedtuple('DHTResult', ('humidity', 'temperature', 'status'))
+
+STATUS_OK = 0
+STATUS_TIMEOUT = 1  # the sensor didn't send all 40 bits
+STATUS_CHECKSUM = 2 # the bits arrived but the checksum didn't match
+STATUS_NAMES = ('ok', 'timeout', 'checksum')
+
+# A reading from DHTGroup: the pin, the result and the sensor's totals
+GroupReading = namedtuple('GroupReading', ('pin', 'humidity', 'temperature', 'status',
+                                           'reads', 'timeouts', 'checksum_failures'))
+
+# A reading from CachedDHT. humidity and temperature are the last good values,
+# age_ms is how old they are, status is that of the latest conversion.
+CachedReading = namedtuple('CachedReading', ('humidity', 'temperature', 'status', 'age_ms'))
+
+BITS = 40
+# The start pulse takes ~60 ms and the data ~5 ms
+READ_TIMEOUT_MS = 100
+# Length of the start pulse for the packed program. The pulse lasts
+# steps + 1 passes of a 3362 cycle loop, 2.10 ms each at 1.6 MHz.
+# The DHT11 needs at least 18 ms, the DHT22 1 to 10 ms.
+START_STEPS = {MODEL_DHT11: 31, MODEL_DHT22: 1}
+# The same for the capture program, whose loop passes take 3.36 ms at 1 MHz
+CAPTURE_START_STEPS = {MODEL_DHT11: 7, MODEL_DHT22: 1}
+# Captured widths: 6 bit counts of 2 us, five per 30 bit word
+CAPTURE_BITS = 6
+CAPTURE_PER_WORD = 5
+CAPTURE_US_PER_COUNT = 2
+# The DHT11 can't be sampled faster than this
+MIN_INTERVAL_MS = 1000
+
 
 class DHT11_PIO():
-    '''Provide a way to read from a DHT11 sensor.'''
-    def __init__(self, pin, sm_id):
-        self.sm=rp2.StateMachine(sm_id)               #create empty state machine
+    '''Provide a way to read from a DHT11 (or, with model=MODEL_DHT22, a
+    DHT22/AM2302) sensor.'''
+    def __init__(self, pin, sm_id, timeout_ms=READ_TIMEOUT_MS, model=MODEL_DHT11, packed=True,
+                 capture=False):
+        self.pin = pin
         self.dht_data = Pin(pin, Pin.IN, Pin.PULL_UP) #connect pin to 'out' on DHT11
+        self.model = model
+        self.packed = packed
+        self.capture = capture
+        freq = 1600000
+        if capture:
+            program = self.DHT_CAPTURE
+            freq = 1000000 # two cycles per count, so one count is 2 us
+            # The capture program has no TX FIFO to take a trigger, so the
+            # start pulse length is loaded into y before each read
+            self.trigger = rp2.asm_pio_encode('set(y, %d)' % CAPTURE_START_STEPS[model], 0)
+            self.words = BITS // CAPTURE_PER_WORD # 8, the depth of the joined FIFO
+            self.widths = bytearray(BITS)
+            self.threshold = DEFAULT_THRESHOLD_US
+        elif packed:
+            program = self.DHT_PACKED
+            self.trigger = ((BITS - 1) << 16) | START_STEPS[model]
+            self.words = 2 # the first 32 bits and the checksum
+        elif model == MODEL_DHT11:
+            program = self.DHT11
+            self.trigger = BITS - 1
+            self.words = 5 # one byte per word
+        else:
+            raise ValueError('The byte-wise program only supports the DHT11')
+        #state machine frequency adjusted so that PIO countdown during 'readdata' ends somewhere between the
+        #duration of a '0' and a '1' high signal
+        self.sm = rp2.StateMachine(sm_id, program,
+                                   freq=freq,
+                                   set_base=self.dht_data,
+                                   in_base=self.dht_data,
+                                   jmp_pin=self.dht_data)
+        # The program waits for a trigger, so it's safe to start it now.
+        # The capture program is started by start().
+        if not capture:
+            self.sm.active(1)
+        self.timeout_ms = timeout_ms
+        self.raw = array('I', [0] * self.words)
+        self.count = 0 # words received by the current read
+        self.started = None # ticks_ms() when the current read started
+        self.reads = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.checksum_failures = 0
 
     def deinit(self):
         self.sm.active(0)
-        
-    def read(self):       
-        # It seems like the calls to sm.init() and sm.active() could be
-        # done in __init__() but when I put them there, the [rpgram hangs.
-        # I need to investigate this further.
-        #state machine frequency adjusted so that PIO countdown during 'readdata' ends somewhere between the  
-        #duration of a '0' and a '1' high signal
-        self.sm.init(self.DHT11,
-                     freq=1600000,
-                     set_base=self.dht_data,
-                     in_base=self.dht_data,
-                     jmp_pin=self.dht_data) #start state machine
-        self.sm.active(1)    
-        data=[]
-        total=0
-
-        for i in range(5):         #data should be 40 bits (5 bytes) long
-            data.append(self.sm.get())  #read byte
-        
-        #print("data: " + str(data))
-        
-        #check checksum (lowest 8 bits of the sum of the first 4 bytes)
-        for i in range(4):
-            total=total+data[i]
-        if((total & 255) == data[4]):
-            humidity=data[0]        #DHT11 provides integer humidity (no decimal part)
-            temperature=(1-2*(data[2] >> 7) )*(data[2] & 0x7f) #DHT11 provides signed integer temperature (no decimal part)
-            print("Humidity: %d%%, Temp: %dC" % (humidity, temperature))
-            return (humidity, temperature)
+
+    def restart(self):
+        '''Puts the state machine back at the start of its program with empty
+        FIFOs and the pin released, ready for the next start(). The capture
+        program is left stopped; start() runs it.'''
+        sm = self.sm
+        sm.active(0)
+        while sm.rx_fifo():
+            sm.get()
+        sm.restart()
+        sm.exec('set(pindirs, 0)')
+        if not self.capture:
+            sm.active(1)
+
+    def start(self):
+        '''Sends the start pulse and begins receiving. Does nothing if a read
+        is already in progress.'''
+        if self.started is not None:
+            return
+        self.count = 0
+        self.started = utime.ticks_ms()
+        if self.capture:
+            sm = self.sm
+            sm.active(0)
+            while sm.rx_fifo():
+                sm.get()
+            sm.restart()
+            sm.exec(self.trigger)
+            sm.active(1)
+        else:
+            self.sm.put(self.trigger)
+
+    def poll(self):
+        '''Collects the bytes that have arrived. Returns None while the read
+        is still in progress and a DHTResult when it has finished, failed or
+        timed out.'''
+        if self.started is None:
+            return None
+        sm = self.sm
+        raw = self.raw
+        # Collect before looking at the deadline, so a frame that finished in
+        # time but is collected late still counts
+        while sm.rx_fifo() and self.count < self.words:
+            raw[self.count] = sm.get()
+            self.count += 1
+        if self.count < self.words:
+            if utime.ticks_diff(utime.ticks_ms(), self.started) < self.timeout_ms:
+                return None
+            return self._finish(STATUS_TIMEOUT)
+
+        if self.capture:
+            word, check = self._decode_widths()
+        elif self.packed:
+            word, check = raw[0], raw[1]
         else:
-            print("Checksum: failed")
-            return (None, None)
+            word, check = pack_bytes(raw)
+        humidity, temperature, ok = decode(word, check, self.model)
+        if not ok:
+            return self._finish(STATUS_CHECKSUM)
+        if self.capture:
+            self.sm.active(0) # stop timing the idle line
+        self.started = None
+        self.reads += 1
+        if self.model == MODEL_DHT11:
+            # whole units, like the DHT11's own resolution
+            humidity //= 10
+            temperature = -(-temperature // 10) if temperature < 0 else temperature // 10
+        else:
+            humidity /= 10
+            temperature /= 10
+        return DHTResult(humidity, temperature, STATUS_OK)
+
+    def _decode_widths(self):
+        '''Unpacks the captured widths, learns the threshold from them and
+        returns (word, checksum).'''
+        raw = self.raw
+        widths = self.widths
+        # The first width of each word is in its top bits. Each count is
+        # widened to the middle of its 2 us step.
+        top = (CAPTURE_PER_WORD - 1) * CAPTURE_BITS
+        mask = (1 << CAPTURE_BITS) - 1
+        for ii in range(BITS):
+            word = raw[ii // CAPTURE_PER_WORD]
+            count = (word >> (top - (ii % CAPTURE_PER_WORD) * CAPTURE_BITS)) & mask
+            widths[ii] = count * CAPTURE_US_PER_COUNT + 1
+        threshold = learn_threshold(widths, self.threshold)
+        word, check = widths_to_frame(widths, threshold)
+        self.threshold = threshold
+        return word, check
+
+    def _finish(self, status):
+        self.started = None
+        self.reads += 1
+        self.failures += 1
+        if status == STATUS_TIMEOUT:
+            self.timeouts += 1
+        else:
+            self.checksum_failures += 1
+        self.restart()
+        return DHTResult(None, None, status)
+
+    def read(self):
+        '''Reads the sensor, waiting at most timeout_ms. Returns a DHTResult.'''
+        self.start()
+        while True:
+            result = self.poll()
+            if result is not None:
+                return result
+
+    async def read_async(self, interval_ms=5):
+        '''Version of read() that lets other uasyncio tasks run while the
+        sensor answers.'''
+        try:
+            import uasyncio as asyncio
+        except ImportError:
+            import asyncio
+        self.start()
+        while True:
+            result = self.poll()
+            if result is not None:
+                return result
+            await asyncio.sleep(interval_ms / 1000)
 
     @asm_pio(set_init=(PIO.OUT_HIGH),autopush=True, push_thresh=8) #output one byte at a time
     def DHT11():
+        label('start')
+        pull(block)                 #wait for a trigger: the number of bits to read - 1
         #drive output low for at least 20ms
-        set(pindirs,1)              #set pin to output  
+        set(pindirs,1)              #set pin to output
         set(pins,0)                 #set pin low
         set(y,31)                   #prepare countdown, y*x*100cycles
         label ('waity')
-        set(x,31) 
+        set(x,31)
         label ('waitx')
-        nop() [25] 
+        nop() [25]
         nop() [25]
         nop() [25]
         nop() [25]                  #wait 100cycles
         jmp(x_dec,'waitx')          #decrement x reg every 100 cycles
         jmp(y_dec,'waity')          #decrement y reg every time x reaches zero
-         
+
         #begin reading from device
-        set(pindirs,0)              #set pin to input 
+        set(pindirs,0)              #set pin to input
         wait(1,pin,0)               #check pin is high before starting
         wait(0,pin,0)
         wait(1,pin,0)
         wait(0,pin,0)               #wait for start of data
+        mov(y,osr)                  #count the bits with y
 
         #read databit
         label('readdata')
@@ -75,49 +271,248 @@ class DHT11_PIO():
         label('countdown')
         jmp(pin,'continue')         #if pin still high continue counting
         #pin is low before countdown is complete - bit '0' detected
-        set(y,0)                 
-        in_(y, 1)                   #shift '0' into the isr
-        jmp('readdata')             #read the next bit
-            
+        in_(pins, 1)                #shift the low pin, a '0', into the isr
+        jmp(y_dec,'readdata')       #read the next bit
+        jmp('start')                #all bits read, wait for the next trigger
+
+        label('continue')
+        jmp(x_dec,'countdown')      #decrement x reg and continue counting if x!=0
+        #pin is still high after countdown complete - bit '1' detected
+        in_(pins, 1)                #shift the high pin, a '1', into the isr
+        wait(0,pin,0)               #wait for low signal (next bit)
+        jmp(y_dec,'readdata')       #read the next bit
+        jmp('start')                #all bits read, wait for the next trigger
+
+    @asm_pio(set_init=(PIO.OUT_HIGH), autopush=True, push_thresh=32, out_shiftdir=PIO.SHIFT_RIGHT)
+    def DHT_PACKED():
+        #the trigger word holds the start pulse length in the low 16 bits and
+        #the number of bits to read - 1 in the high 16 bits
+        pull(block)
+        out(y,16)                   #start pulse countdown, y*x*100cycles
+        set(pindirs,1)              #set pin to output
+        set(pins,0)                 #set pin low
+        label ('waity')
+        set(x,31)
+        label ('waitx')
+        nop() [25]
+        nop() [25]
+        nop() [25]
+        nop() [25]                  #wait 100cycles
+        jmp(x_dec,'waitx')          #decrement x reg every 100 cycles
+        jmp(y_dec,'waity')          #decrement y reg every time x reaches zero
+
+        #begin reading from device
+        set(pindirs,0)              #set pin to input
+        wait(1,pin,0)               #check pin is high before starting
+        wait(0,pin,0)
+        wait(1,pin,0)
+        wait(0,pin,0)               #wait for start of data
+        out(y,16)                   #count the bits with y
+
+        #read databit, the first 32 bits are autopushed as one word
+        label('readdata')
+        set(x,20)                   #reset x register to count down from 20
+        wait(1,pin,0)               #wait for high signal
+        label('countdown')
+        jmp(pin,'continue')         #if pin still high continue counting
+        in_(pins, 1)                #pin low before countdown is complete - bit '0'
+        jmp(y_dec,'readdata')       #read the next bit
+        jmp('done')
+
         label('continue')
         jmp(x_dec,'countdown')      #decrement x reg and continue counting if x!=0
-        #pin is still high after countdown complete - bit '1' detected 
-        set(y,1)                  
-        in_(y, 1)                   #shift one bit into the isr
-        wait(0,pin,0)               #wait for low signal (next bit) 
-        jmp('readdata')             #read the next bit
+        in_(pins, 1)                #pin still high after countdown complete - bit '1'
+        wait(0,pin,0)               #wait for low signal (next bit)
+        jmp(y_dec,'readdata')       #read the next bit
+
+        label('done')
+        push(block)                 #push the checksum byte, then wrap to wait for the next trigger
+
+    @asm_pio(set_init=(PIO.OUT_HIGH), autopush=True, push_thresh=30, fifo_join=PIO.JOIN_RX)
+    def DHT_CAPTURE():
+        #y holds the start pulse length, loaded before the state machine is started
+        set(pindirs,1)              #set pin to output
+        set(pins,0)                 #set pin low
+        label ('waity')
+        set(x,31)
+        label ('waitx')
+        nop() [25]
+        nop() [25]
+        nop() [25]
+        nop() [25]                  #wait 100cycles
+        jmp(x_dec,'waitx')          #decrement x reg every 100 cycles
+        jmp(y_dec,'waity')          #decrement y reg every time x reaches zero
+
+        #begin reading from device
+        set(pindirs,0)              #set pin to input
+        wait(1,pin,0)               #check pin is high before starting
+        wait(0,pin,0)
+        wait(1,pin,0)
+        wait(0,pin,0)               #wait for start of data
+
+        #time each high pulse, two cycles per count. Five 6 bit widths are
+        #pushed per word, so the 40 widths fill the 8 deep joined RX FIFO.
+        wrap_target()
+        mov(x, invert(null))        #x = 0xffffffff
+        wait(1,pin,0)               #wait for high signal
+        label('high')
+        jmp(x_dec,'next')           #count down, x never reaches 0
+        label('next')
+        jmp(pin,'high')             #keep counting while the pin is high
+        mov(x, invert(x))           #x = number of counts
+        in_(x, 6)                   #five widths are autopushed per word
+        wrap()
+
+
+class DHTGroup():
+    '''Reads several DHT sensors at the same time, one state machine per
+    pin. State machines 0-3 are on PIO0 and 4-7 on PIO1; the program is
+    loaded into each PIO block that is used. By default pins get state
+    machines 0, 1, 2... in order; pass sm_ids to choose others. Reading all
+    of them takes about as long as reading one.'''
+
+    def __init__(self, pins, sm_ids=None, timeout_ms=READ_TIMEOUT_MS, model=MODEL_DHT11, packed=True,
+                 capture=False):
+        if sm_ids is None:
+            sm_ids = range(len(pins))
+        if len(sm_ids) < len(pins) or len(pins) > 8:
+            raise ValueError('Need one state machine per pin, at most 8')
+        self.sensors = [DHT11_PIO(pins[ii], sm_ids[ii], timeout_ms, model, packed, capture)
+                        for ii in range(len(pins))]
+
+    def __len__(self):
+        return len(self.sensors)
+
+    def deinit(self):
+        for sensor in self.sensors:
+            sensor.deinit()
+
+    def start(self):
+        '''Sends the start pulse on every pin.'''
+        for sensor in self.sensors:
+            sensor.start()
+
+    def poll(self, results):
+        '''Fills in results[ii] for each sensor that has finished. Returns
+        the number of sensors still in progress.'''
+        pending = 0
+        for ii in range(len(self.sensors)):
+            if results[ii] is None:
+                result = self.sensors[ii].poll()
+                if result is None:
+                    pending += 1
+                else:
+                    results[ii] = self._reading(ii, result)
+        return pending
+
+    def _reading(self, ii, result):
+        sensor = self.sensors[ii]
+        return GroupReading(sensor.pin, result.humidity, result.temperature, result.status,
+                            sensor.reads, sensor.timeouts, sensor.checksum_failures)
+
+    def read(self):
+        '''Reads every sensor. Returns a list of GroupReading in pin order.
+        Each sensor times out on its own, so one dead sensor doesn't hold
+        up the others for longer than timeout_ms.'''
+        results = [None] * len(self.sensors)
+        self.start()
+        while self.poll(results):
+            pass
+        return results
+
+    async def read_async(self, interval_ms=5):
+        '''Version of read() that lets other uasyncio tasks run while the
+        sensors answer.'''
+        try:
+            import uasyncio as asyncio
+        except ImportError:
+            import asyncio
+        results = [None] * len(self.sensors)
+        self.start()
+        while self.poll(results):
+            await asyncio.sleep(interval_ms / 1000)
+        return results
+
+
+class CachedDHT():
+    '''Wraps a DHT11_PIO so it can be read as often as the caller likes.
+    A new conversion is only started once min_interval_ms has passed since
+    the last one; until then read() returns the cached values with their age.
+
+    With background=True a due conversion is started and read() returns at
+    once with the cached values. The result is collected by a later read(),
+    so the caller never waits for the sensor, except on the very first read.'''
+
+    def __init__(self, sensor, min_interval_ms=MIN_INTERVAL_MS, background=False):
+        self.sensor = sensor
+        self.min_interval_ms = min_interval_ms
+        self.background = background
+        self.humidity = None
+        self.temperature = None
+        self.status = STATUS_TIMEOUT
+        self.good_ms = None # ticks_ms() of the last good conversion
+        self.start_ms = None # ticks_ms() of the last conversion start
+        self.hits = 0 # reads served from the cache
+        self.misses = 0 # reads that started a conversion
+        self.checksum_failures = 0
+        self.timeouts = 0
+
+    def _store(self, result, now):
+        self.status = result.status
+        if result.status == STATUS_OK:
+            self.humidity = result.humidity
+            self.temperature = result.temperature
+            self.good_ms = now
+        elif result.status == STATUS_CHECKSUM:
+            self.checksum_failures += 1
+        else:
+            self.timeouts += 1
+
+    def age_ms(self):
+        '''Age of the cached values, None if there has been no good reading.'''
+        if self.good_ms is None:
+            return None
+        return utime.ticks_diff(utime.ticks_ms(), self.good_ms)
+
+    def read(self):
+        '''Returns a CachedReading. Only touches the sensor when the minimum
+        interval has passed.'''
+        sensor = self.sensor
+        now = utime.ticks_ms()
+        if sensor.started is not None:
+            # A background conversion is in progress
+            result = sensor.poll()
+            if result is not None:
+                self._store(result, now)
+
+        due = self.start_ms is None or utime.ticks_diff(now, self.start_ms) >= self.min_interval_ms
+        if not due or sensor.started is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self.start_ms = now
+            if self.background and self.good_ms is not None:
+                sensor.start()
+            else:
+                self._store(sensor.read(), utime.ticks_ms())
+        return CachedReading(self.humidity, self.temperature, self.status, self.age_ms())
 
 
 if __name__ == "__main__":
     #main program
     dht_pwr = Pin(14, Pin.OUT)      #connect GPIO 14 to '+' on DHT11
-    dht_data = Pin(15, Pin.IN, Pin.PULL_UP) #connect GPIO 15 to 'out' on DHT11
-
     dht_pwr.value(1)                #power on DHT11
-    sm=rp2.StateMachine(1)          #create empty state machine
+    dht11 = DHT11_PIO(15, 1)        #connect GPIO 15 to 'out' on DHT11
     utime.sleep(2)                  #wait for DHT11 to start up
 
-    #while True:
     for ii in range(10):
-        print('reading')
-        data=[]
-        total=0
-        sm.init(DHT11_PIO.DHT11,freq=1600000,set_base=dht_data,in_base=dht_data,jmp_pin=dht_data) #start state machine
-        #state machine frequency adjusted so that PIO countdown during 'readdata' ends somewhere between the  
-        #duration of a '0' and a '1' high signal
-        sm.active(1)    
-        for i in range(5):         #data should be 40 bits (5 bytes) long
-            data.append(sm.get())  #read byte
-        
-        print("data: " + str(data))
-        
-        #check checksum (lowest 8 bits of the sum of the first 4 bytes)
-        for i in range(4):
-            total=total+data[i]
-        if((total & 255) == data[4]):
-            humidity=data[0]        #DHT11 provides integer humidity (no decimal part)
-            temperature=(1-2*(data[2] >> 7) )*(data[2] & 0x7f) #DHT11 provides signed integer temperature (no decimal part)
-            print("Humidity: %d%%, Temp: %dC" % (humidity, temperature))        
+        start = utime.ticks_us()
+        result = dht11.read()
+        us = utime.ticks_diff(utime.ticks_us(), start)
+        if result.status == STATUS_OK:
+            print("Humidity: %d%%, Temp: %dC (%d us)" % (result.humidity, result.temperature, us))
         else:
-            print("Checksum: failed")
+            print("Read failed: %s (%d us)" % (STATUS_NAMES[result.status], us))
         utime.sleep_ms(500)
+    print(f'{dht11.failures} of {dht11.reads} reads failed')
+    dht11.deinit()
@@ -0,0 +1,123 @@
+# Micropython
+'''Decodes DHT11 and DHT22/AM2302 frames. Pure integer code with no hardware
+access, so it runs, and can be checked, on a PC as well as on the board.
+
+A frame is 40 bits: humidity high and low bytes, temperature high and low
+bytes, then a checksum byte which is the low 8 bits of the sum of the other
+four. Here the first 32 bits are given as one word, most significant byte
+first, as the packed PIO program pushes them.
+
+Values are returned in tenths, so 215 is 21.5 C or 21.5 %.
+
+Frames can also be decoded from the measured widths of the 40 high pulses,
+as captured by the pulse-width PIO program. learn_threshold() finds the
+width that separates 0 bits from 1 bits in the data itself, so marginal
+sensors and long cables that stretch or shrink the pulses still decode.'''
+
+MODEL_DHT11 = 11
+MODEL_DHT22 = 22 # also the AM2302
+
+# High pulse widths in microseconds: ~26 for a 0 bit, ~70 for a 1 bit
+DEFAULT_THRESHOLD_US = 48
+# Below this spread the pulses are taken to be all 0s or all 1s
+MIN_SEPARATION_US = 16
+
+
+def pack_bytes(data):
+    '''Packs the five bytes of a frame into (word, checksum).'''
+    return (data[0] << 24) | (data[1] << 16) | (data[2] << 8) | data[3], data[4]
+
+
+def checksum_ok(word, check):
+    return ((word >> 24) + (word >> 16) + (word >> 8) + word) & 0xFF == check & 0xFF
+
+
+def decode(word, check, model=MODEL_DHT11):
+    '''Returns (humidity, temperature, ok) from a frame. humidity and
+    temperature are in tenths; ok is False if the checksum doesn't match.'''
+    if model == MODEL_DHT22:
+        # 16 bit values, the temperature in sign and magnitude
+        humidity = (word >> 16) & 0xFFFF
+        temperature = word & 0x7FFF
+        if word & 0x8000:
+            temperature = -temperature
+    else:
+        # An integer byte and a decimal byte for each value. Depending on the
+        # version the temperature sign is bit 7 of either byte.
+        humidity = ((word >> 24) & 0xFF) * 10 + ((word >> 16) & 0x0F)
+        temperature = ((word >> 8) & 0x7F) * 10 + (word & 0x0F)
+        if word & 0x8080:
+            temperature = -temperature
+    return humidity, temperature, checksum_ok(word, check)
+
+
+def learn_threshold(widths, default=DEFAULT_THRESHOLD_US):
+    '''Splits the pulse widths into two groups by 2-means clustering and
+    returns the width halfway between the group means. Returns default if
+    the widths don't form two groups.'''
+    lo = hi = widths[0]
+    for w in widths:
+        if w < lo:
+            lo = w
+        elif w > hi:
+            hi = w
+    if hi - lo < MIN_SEPARATION_US:
+        return default
+    threshold = (lo + hi) >> 1
+    for _ in range(8):
+        sum0 = n0 = sum1 = n1 = 0
+        for w in widths:
+            if w > threshold:
+                sum1 += w
+                n1 += 1
+            else:
+                sum0 += w
+                n0 += 1
+        new = (sum0 // n0 + sum1 // n1) >> 1
+        if new == threshold:
+            break
+        threshold = new
+    return threshold
+
+
+def widths_to_frame(widths, threshold):
+    '''Turns 40 pulse widths into (word, checksum). Pulses wider than the
+    threshold are 1 bits.'''
+    word = 0
+    for ii in range(32):
+        word = (word << 1) | (widths[ii] > threshold)
+    check = 0
+    for ii in range(32, 40):
+        check = (check << 1) | (widths[ii] > threshold)
+    return word, check
+
+
+if __name__ == "__main__":
+    # Frames recorded from sensors and datasheet examples:
+    # (model, word, checksum, humidity, temperature, ok)
+    frames = (
+        (MODEL_DHT11, 0x28001500, 0x3D, 400, 210, True),
+        (MODEL_DHT11, 0x25001702, 0x3E, 370, 232, True),
+        (MODEL_DHT11, 0x1E008102, 0xA1, 300, -12, True),
+        (MODEL_DHT11, 0x1E000182, 0xA1, 300, -12, True),
+        (MODEL_DHT11, 0x28001500, 0x3C, 400, 210, False),
+        (MODEL_DHT22, 0x0292010D, 0xA2, 658, 269, True),
+        (MODEL_DHT22, 0x02928065, 0x79, 658, -101, True),
+        (MODEL_DHT22, 0x03E80000, 0xEB, 1000, 0, True),
+    )
+    for model, word, check, humidity, temperature, ok in frames:
+        result = decode(word, check, model)
+        assert result == (humidity, temperature, ok), (hex(word), result)
+    assert pack_bytes(bytes((0x28, 0x00, 0x15, 0x00, 0x3D))) == (0x28001500, 0x3D)
+
+    # Pulse widths as seen over a long cable, where 0 bits stretch to ~50 us
+    # so the default threshold reads them all as 1s
+    widths = bytes((50, 52, 66, 50, 65, 52, 51, 52,   52, 50, 52, 50, 51, 51, 52, 50,
+                    50, 52, 51, 66, 52, 65, 51, 66,   50, 50, 52, 50, 52, 51, 52, 50,
+                    52, 50, 64, 66, 64, 65, 50, 65))
+    threshold = learn_threshold(widths)
+    assert 52 <= threshold < 64, threshold
+    assert widths_to_frame(widths, threshold) == (0x28001500, 0x3D)
+    assert not checksum_ok(*widths_to_frame(widths, DEFAULT_THRESHOLD_US))
+    assert learn_threshold(bytes(40)) == DEFAULT_THRESHOLD_US
+    print(f'{len(frames)} frames decoded correctly')
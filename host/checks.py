@@ -0,0 +1,258 @@
+# CPython
+'''Checks the pure decoding and arithmetic code against slow reference
+versions written here, with no hardware:
+
+    python host/run.py host/checks.py
+
+dht_decode       frames of both models round trip, widths over a cable
+mcp9808          decode_temp*, the bulk decoder and encode_temp_centi
+signal_stats     analyse() and the histograms on made up counts
+pio_clock        solve() against a plain search of every period
+ssd1306          find_dirty() and what the panel model shows after show(),
+                 in every rotation
+
+Each script's own __main__ checks stay where they are; these go wider,
+over many values or random frames, and run under run.py so the display
+checks reach the SSD1306 model on I2C 0.'''
+
+import random
+from array import array
+
+import devices
+from machine import I2C
+
+import dht_decode
+import mcp9808
+import pio_clock
+import signal_stats
+from ssd1306 import SSD1306_I2C
+
+rng = random.Random(2040)
+
+
+def dht_frame(model, humidity, temperature):
+    '''Builds (word, checksum) for humidity and temperature in tenths, as a
+    sensor of the model sends them.'''
+    if model == dht_decode.MODEL_DHT22:
+        t = abs(temperature) | (0x8000 if temperature < 0 else 0)
+        data = [humidity >> 8, humidity & 0xFF, t >> 8, t & 0xFF]
+    else:
+        t = abs(temperature)
+        data = [humidity // 10, humidity % 10, (t // 10) | (0x80 if temperature < 0 else 0), t % 10]
+    data.append(sum(data) & 0xFF)
+    return dht_decode.pack_bytes(data)
+
+
+def check_dht_decode():
+    cases = [(dht_decode.MODEL_DHT11, h, t) for h in range(200, 960, 35) for t in range(-200, 510, 37)]
+    cases += [(dht_decode.MODEL_DHT22, h, t) for h in range(0, 1001, 47) for t in range(-400, 801, 53)]
+    for model, humidity, temperature in cases:
+        word, check = dht_frame(model, humidity, temperature)
+        assert dht_decode.decode(word, check, model) == (humidity, temperature, True), (model, humidity, temperature)
+        # One flipped bit anywhere spoils the checksum
+        bit = rng.randrange(40)
+        if bit < 32:
+            word ^= 1 << bit
+        else:
+            check ^= 1 << (bit - 32)
+        assert not dht_decode.decode(word, check, model)[2]
+
+    # Pulse widths with 0 bits stretched by up to 30 us, as over a long cable
+    for stretch in range(0, 31, 3):
+        word, check = dht_frame(dht_decode.MODEL_DHT11, 550, 234)
+        bits = [(word >> (31 - ii)) & 1 for ii in range(32)] + [(check >> (7 - ii)) & 1 for ii in range(8)]
+        widths = bytes(rng.randint(66, 74) if b else rng.randint(24, 28) + stretch for b in bits)
+        threshold = dht_decode.learn_threshold(widths)
+        assert dht_decode.widths_to_frame(widths, threshold) == (word, check), (stretch, threshold)
+    return len(cases)
+
+
+def check_mcp9808():
+    # Every 13 bit reading, with and without alert flags in the top bits
+    raws = [flags | t for flags in (0, mcp9808.ALERT_FLAG_CRIT, mcp9808.ALERT_FLAGS) for t in range(0x2000)]
+    for raw in raws:
+        sixteenths = (raw & 0x0FFF) - (0x1000 if raw & 0x1000 else 0)
+        assert mcp9808.decode_temp(raw) == sixteenths / 16, hex(raw)
+        assert mcp9808.decode_temp_centi(raw) == (sixteenths * 625) // 100, hex(raw)
+
+    expected = array('h', [mcp9808.decode_temp_centi(raw) for raw in raws])
+    assert mcp9808.decode_temps_centi(array('H', raws)) == expected
+    assert mcp9808._decode_temps_centi_loop(array('H', raws), array('h', [0] * len(raws))) == expected
+    dst = array('i', [0] * len(raws))
+    assert list(mcp9808.decode_temps_centi(array('H', raws), dst)) == list(expected)
+    in_place = array('i', raws)
+    assert mcp9808.decode_temps_centi(in_place, in_place) is in_place and list(in_place) == list(expected)
+    assert len(mcp9808.decode_temps_centi(array('H'))) == 0
+
+    # Boundaries hold quarter degrees; encoding truncates towards zero
+    for centi in range(-4000, 12501, 7):
+        quarters = int(centi / 25)
+        raw = mcp9808.encode_temp_centi(centi)
+        assert raw & 0x3 == 0 and raw & ~0x1FFC == 0, (centi, hex(raw))
+        assert mcp9808.decode_temp_centi(raw) == quarters * 25, (centi, hex(raw))
+    return len(raws)
+
+
+def check_signal_stats():
+    clock_freq = 125000000
+    for high, low, jitter in ((31250, 93750, 0), (1000, 1000, 4), (40, 60, 2), (62500, 62500, 20)):
+        counts = []
+        periods = []
+        for _ in range(200):
+            h = high + rng.randint(0, jitter)
+            l = low + rng.randint(0, jitter)
+            # Counts that reproduce h and l exactly: overhead plus 2 per count
+            h += (h - signal_stats.HIGH_OVERHEAD) & 1
+            l += (l - signal_stats.LOW_OVERHEAD) & 1
+            counts += [(h - signal_stats.HIGH_OVERHEAD) // 2, (l - signal_stats.LOW_OVERHEAD) // 2]
+            periods.append((h, l))
+        stats = signal_stats.analyse(counts, clock_freq)
+        total = sum(h + l for h, l in periods)
+        mean = total / len(periods)
+        ns = 1e9 / clock_freq
+        sd = (sum((h + l - mean) ** 2 for h, l in periods) / len(periods)) ** 0.5
+        spread = max(h + l for h, l in periods) - min(h + l for h, l in periods)
+        assert stats.periods == len(periods)
+        assert abs(stats.freq - clock_freq / mean) < 1e-6 * stats.freq
+        assert abs(stats.duty - sum(h for h, l in periods) / total) < 1e-9
+        assert abs(stats.jitter_rms_ns - sd * ns) < 1e-3 and abs(stats.jitter_pp_ns - spread * ns) < 1e-6
+        # A trailing half period is ignored
+        assert signal_stats.analyse(counts + [counts[0]], clock_freq) == stats
+
+        edges, bins = signal_stats.period_histogram(counts, clock_freq, 7)
+        assert sum(bins) == len(periods) and len(edges) == 7
+        assert abs(edges[0] - min(h + l for h, l in periods) * ns) < 1e-6
+        text = signal_stats.format_histogram(edges, bins)
+        assert len(text.split('\n')) == 7 and '#' * 40 in text
+
+    # No signal, one value, all values equal
+    assert signal_stats.analyse([], clock_freq) is None
+    assert signal_stats.histogram([]) == ([], [])
+    assert signal_stats.histogram([5.0], 3) == ([5.0, 6.0, 7.0], [1, 0, 0])
+    assert signal_stats.histogram([2, 2, 2], 2)[1] == [3, 0]
+    return 4
+
+
+def brute_force(freq, duty, sys_freq, integer_only, max_search):
+    '''The least frequency error solve() can reach, trying every divider
+    near each period rather than following solve()'s shortcuts.'''
+    target = sys_freq * 256 / freq
+    best = None
+    periods = list(range(pio_clock.MIN_PERIOD, min(int(target / 256), max_search) + 1))
+    periods.append(round(target / 256))
+    for period in periods:
+        ideal = target / period
+        for div256 in range(int(ideal) - 2, int(ideal) + 3):
+            if integer_only and div256 & 0xFF:
+                continue
+            if not 256 <= div256 <= pio_clock.MAX_DIV * 256:
+                continue
+            err = abs(sys_freq * 256 / (div256 * period) - freq) * 1e6 / freq
+            if best is None or err < best:
+                best = err
+        if integer_only:
+            for div256 in (int(ideal / 256) * 256, int(ideal / 256) * 256 + 256):
+                if 256 <= div256 <= pio_clock.MAX_DIV * 256:
+                    err = abs(sys_freq * 256 / (div256 * period) - freq) * 1e6 / freq
+                    best = err if best is None or err < best else best
+    return best
+
+
+def check_pio_clock():
+    freqs = [1, 3, 440, 1000, 4000, 38000, 44100, 100003, 1000000, 7372800, 12345678, 31250000]
+    freqs += [rng.randint(2000, 30000000) for _ in range(20)]
+    for freq in freqs:
+        for integer_only in (False, True):
+            duty = rng.choice((0.5, 0.25, 0.33, 0.9))
+            s = pio_clock.solve(freq, duty, integer_only=integer_only, max_search=512)
+            best = brute_force(freq, duty, pio_clock.SYS_FREQ, integer_only, 512)
+            assert abs(s.error_ppm) <= best + 1e-3, (freq, integer_only, s, best)
+            if integer_only:
+                assert s.div_frac == 0
+            # The Setting describes itself consistently
+            period = s.high + s.low + 4
+            div = pio_clock.divider(s.div_int, s.div_frac)
+            assert abs(s.freq - pio_clock.SYS_FREQ / (div * period)) < 1e-9 * s.freq
+            assert s.duty == (s.high + 2) / period and min(s.high, s.low) >= 0
+    for freq in (pio_clock.SYS_FREQ // pio_clock.MIN_PERIOD + 1, 0.001):
+        try:
+            pio_clock.solve(freq)
+        except ValueError:
+            pass
+        else:
+            assert False, f'{freq} Hz solved'
+    return len(freqs)
+
+
+def find_dirty_reference(buf, shadow, width, pages, mask=None):
+    spans = []
+    for page in range(pages):
+        cols = [x for x in range(width) if buf[page * width + x] != shadow[page * width + x]]
+        if not cols or (mask is not None and not mask & (1 << page)):
+            spans.append(None)
+        else:
+            spans.append((cols[0], cols[-1]))
+    return spans
+
+
+def panel_xy(rotation, x, y, width, height):
+    '''Where a logical pixel lands on the panel for a rotation.'''
+    if rotation == 90:
+        return y, height - 1 - x
+    if rotation == 180:
+        return width - 1 - x, height - 1 - y
+    if rotation == 270:
+        return width - 1 - y, x
+    return x, y
+
+
+def check_ssd1306():
+    panel = devices.i2c_device(0, 0x3C)
+    assert panel is not None, 'run under host/run.py, with the OLED attached'
+    i2c = I2C(0)
+    oled = SSD1306_I2C(128, 32, i2c)
+    for _ in range(200):
+        buf = bytearray(oled.shadow)
+        for _ in range(rng.randint(0, 6)):
+            buf[rng.randrange(len(buf))] = rng.randrange(256)
+        mask = rng.choice((None, rng.randrange(16)))
+        expected = find_dirty_reference(buf, oled.shadow, oled.width, oled.pages, mask)
+        found = oled.find_dirty(buf, mask)
+        assert found == any(expected), (found, expected)
+        if found:
+            spans = [None if oled.dirty_x0[p] == 255 else (oled.dirty_x0[p], oled.dirty_x1[p])
+                     for p in range(oled.pages)]
+            assert spans == expected, (spans, expected)
+        # show() sends the changes and the panel RAM catches up
+        oled.buffer[:] = buf
+        oled.show()
+        assert panel.ram[:len(buf)] == buf and oled.shadow == buf
+
+    # Portrait and flipped frames, drawn at random and read back off the panel
+    frames = 0
+    for rotation in (0, 90, 180, 270):
+        oled = SSD1306_I2C(128, 32, i2c, rotation=rotation)
+        for _ in range(3):
+            lit = set()
+            oled.fill(0)
+            for _ in range(300):
+                x = rng.randrange(oled.logical_width)
+                y = rng.randrange(oled.logical_height)
+                oled.pixel(x, y, 1)
+                lit.add(panel_xy(rotation, x, y, oled.width, oled.height))
+            oled.fill_rect(0, 0, 3, 2, 1)
+            for x in range(3):
+                for y in range(2):
+                    lit.add(panel_xy(rotation, x, y, oled.width, oled.height))
+            oled.show()
+            shown = {(x, y) for y in range(oled.height) for x in range(oled.width) if panel.pixel(x, y)}
+            assert shown == lit, (rotation, sorted(shown ^ lit)[:8])
+            frames += 1
+    return frames
+
+
+if __name__ == "__main__":
+    for name, check in (('dht_decode', check_dht_decode), ('mcp9808', check_mcp9808),
+                        ('signal_stats', check_signal_stats), ('pio_clock', check_pio_clock),
+                        ('ssd1306', check_ssd1306)):
+        print(f'{name:<14} {check():>6} cases OK')
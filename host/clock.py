@@ -0,0 +1,175 @@
+# CPython
+'''The virtual clock shared by the host stand-ins for the MicroPython
+modules.
+
+Virtual time is pio_sim's simulated time, so the state machines, the
+machine.Timer callbacks and the device models all move along one timeline.
+The clock moves when the program sleeps, waits on a FIFO, or talks on a bus
+for as long as the transfer would take. Each poll, meaning a read of the
+clock, a pin, a PIO register or a state machine's status, also moves it
+forward, so loops that wait for something to happen do finish. The first
+poll moves it POLL_US. Polls in a row with nothing else in between double
+the step, up to POLL_MAX_US, so long busy-waits finish quickly. The price
+is that such a loop may notice what it waits for up to POLL_MAX_US late.
+A loop that only looks at Python variables, waiting for a Timer or irq
+callback to change them, never polls and so never ends; it needs a poll,
+a sleep or a state machine query in its body.
+
+There are two modes. In the default virtual mode, running Python code
+takes no time at all. Everything runs as fast as the host can go, usually
+much faster than real time, but timings of Python code read as zero.
+
+In real time mode (use_realtime()), Python code costs the time it takes on
+the host, measured with time.perf_counter(). Sleeps and bus transfers still
+skip ahead without waiting. Benchmarks of driver code need this mode. PIO
+timings don't: the simulator is far slower than a real state machine, so
+any comparison between Python and PIO speed is meaningless here.
+
+asyncio runs on the same clock with EventLoopPolicy installed, as run.py
+does: the loop reads the time from here, and waiting for the next timer
+skips ahead like a sleep. It skips in steps of at most WAKE_S, so a task
+woken by an interrupt handler, through an asyncio.Event say, runs at most
+that late.'''
+
+import asyncio
+import os
+import selectors
+import sys
+import time
+try:
+    import pio_sim
+except ImportError:
+    # Run from this directory: the simulator lives in the repository root
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import pio_sim
+
+POLL_US = 1
+POLL_MAX_US = 100
+_poll_us = POLL_US # the next poll's step
+epoch = int(time.time()) # utime.time() at virtual time zero
+realtime = False
+_origin = 0.0 # perf_counter() at virtual time zero, in real time mode
+_skipped = 0.0 # seconds skipped by sleeps and transfers, in real time mode
+WAKE_S = 0.001
+
+
+def sim():
+    return pio_sim.SIM
+
+
+def now():
+    '''Virtual seconds since the start.'''
+    s = pio_sim.SIM
+    return s.seconds(s.time_now())
+
+
+def _sync():
+    '''Brings the simulation up to the real time passed, in real time mode.'''
+    s = pio_sim.SIM
+    target = s.to_time(time.perf_counter() - _origin + _skipped)
+    if target > s.time:
+        s.run_until(target)
+
+
+def advance(seconds):
+    '''Moves the clock forward, running everything due on the way.'''
+    global _skipped, _poll_us
+    s = pio_sim.SIM
+    if s.running is not None:
+        return # called back from inside a state machine step
+    _poll_us = POLL_US
+    if realtime:
+        _skipped += seconds
+        _sync()
+    else:
+        s.run_until(s.time + s.to_time(seconds))
+
+
+def poll():
+    global _poll_us
+    if realtime:
+        if pio_sim.SIM.running is None:
+            _sync()
+        return
+    step = _poll_us
+    advance(step * 1e-6)
+    _poll_us = min(step * 2, POLL_MAX_US)
+
+
+def use_realtime(on=True):
+    '''Switches between real time and virtual mode, carrying on from the
+    current time.'''
+    global realtime, _origin, _skipped
+    realtime = on
+    _origin = time.perf_counter() - now()
+    _skipped = 0.0
+
+
+def call_later(seconds, fn, *args):
+    '''Calls fn(*args) after a number of virtual seconds. Returns a handle
+    for cancel().'''
+    s = pio_sim.SIM
+    return s.call_at(s.time_now() + s.to_time(seconds), fn, *args)
+
+
+def cancel(handle):
+    pio_sim.SIM.cancel(handle)
+
+
+class _Selector(selectors.DefaultSelector):
+    '''Polls the loop's own file descriptors, then moves the clock on to the
+    next timer instead of waiting for it, or until an interrupt handler
+    makes a callback ready.'''
+
+    def __init__(self, loop):
+        super().__init__()
+        self.loop = loop
+
+    def select(self, timeout=None):
+        events = super().select(0)
+        if events or timeout == 0:
+            return events
+        loop = self.loop
+        s = pio_sim.SIM
+        end = None if timeout is None else s.time + s.to_time(timeout)
+        loop.woken = False
+        while not loop.woken:
+            step = WAKE_S
+            if end is not None:
+                left = end - s.time
+                if left <= 0:
+                    break
+                step = min(s.seconds(left), step)
+            advance(step)
+        return events
+
+
+class EventLoop(asyncio.SelectorEventLoop):
+    '''An asyncio loop on the virtual clock.'''
+
+    def __init__(self):
+        self.woken = False
+        super().__init__(_Selector(self))
+
+    def call_soon(self, callback, *args, context=None):
+        self.woken = True
+        return super().call_soon(callback, *args, context=context)
+
+    def time(self):
+        if realtime and pio_sim.SIM.running is None:
+            _sync()
+        return now()
+
+
+class EventLoopPolicy(asyncio.DefaultEventLoopPolicy):
+    def new_event_loop(self):
+        return EventLoop()
+
+
+def reset():
+    '''Starts again at time zero with a fresh simulator, in the same mode.'''
+    global epoch
+    epoch = int(time.time())
+    s = pio_sim.reset()
+    use_realtime(realtime)
+    return s
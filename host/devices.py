@@ -0,0 +1,544 @@
+# CPython
+'''Device models for the host stand-ins, and the registry machine uses to
+find them.
+
+I2C devices are attached to a bus id with attach_i2c() and answer
+i2c_write(data) and i2c_read(n), so machine.I2C can reach them by address.
+SPI devices are attached with attach_spi() and get spi_write(data) while
+their chip select pin is low. Analog sources are functions of no arguments
+returning volts, set per ADC channel with set_analog(). The DHT11 model
+works at the pin level through pio_sim, so the PIO driver reads it bit by
+bit.
+
+Temperatures and humidities can be numbers, or functions of the virtual
+time in seconds, for readings that change.
+
+pico_board() wires up the sensors and display the demos expect.'''
+
+import math
+import clock
+
+_i2c = {} # bus id: {addr: device}
+_spi = {} # bus id: [device]
+_analog = {} # ADC channel: source
+
+
+def reset():
+    _i2c.clear()
+    _spi.clear()
+    _analog.clear()
+
+
+def attach_i2c(bus, device):
+    _i2c.setdefault(bus, {})[device.addr] = device
+    return device
+
+
+def detach_i2c(bus, addr):
+    _i2c.get(bus, {}).pop(addr, None)
+
+
+def i2c_device(bus, addr):
+    return _i2c.get(bus, {}).get(addr)
+
+
+def i2c_addresses(bus):
+    return sorted(_i2c.get(bus, {}))
+
+
+def attach_spi(bus, device):
+    _spi.setdefault(bus, []).append(device)
+    return device
+
+
+def spi_devices(bus):
+    return _spi.get(bus, [])
+
+
+def set_analog(channel, source):
+    '''source is volts, or a function returning volts.'''
+    _analog[channel] = source if callable(source) else (lambda: source)
+
+
+def analog(channel):
+    source = _analog.get(channel)
+    return source() if source is not None else 0.0
+
+
+def _value(v):
+    '''A model parameter: a number, or a function of the virtual time.'''
+    return v(clock.now()) if callable(v) else v
+
+
+def drifting(base, swing=0.5, period=600):
+    '''A value that swings sinusoidally around base, for a temperature that
+    moves slowly over a run.'''
+    return lambda t: base + swing * math.sin(2 * math.pi * t / period)
+
+
+class MCP9808():
+    '''Register model of the MCP9808 temperature sensor. It converts
+    continuously at the selected resolution; the ambient register holds the
+    last finished conversion, or the one before shutdown.
+
+    With alert_pin given, the open-drain ALERT output pulls that pin low
+    when active, against a pull-up. Once enabled in the config register it
+    is updated after every conversion and register write. In comparator
+    mode it is active while the reading is outside the window; in interrupt
+    mode it latches on every crossing of the window until the interrupt
+    clear bit is written. At or above the critical limit it is active in
+    either mode and can't be cleared. Hysteresis and the locks aren't
+    modelled.'''
+
+    CONVERSION_S = (0.030, 0.065, 0.130, 0.250)
+
+    def __init__(self, celsius=23.0, addr=0x18, alert_pin=None):
+        self.addr = addr
+        self.celsius = celsius
+        self.pointer = 0
+        self.regs = {1: 0x0000, 2: 0x0000, 3: 0x0000, 4: 0x0000, 6: 0x0054, 7: 0x0400}
+        self.resolution = 3
+        self.frozen = None # the ambient register while shut down
+        self.reads = 0
+        self.writes = 0
+        self.alert_pin = alert_pin
+        self.alerting = False
+        self.zone = 0 # upper and lower flags of the last reading
+        self.latched = False # interrupt mode output
+        self.tick = None # next conversion while the output is enabled
+        if alert_pin is not None:
+            clock.sim().pins.set_pull(alert_pin, 1)
+
+    def ambient(self):
+        '''The ambient temperature register: the flags and the 13 bit
+        reading, truncated to the resolution.'''
+        if self.frozen is not None:
+            return self.frozen
+        period = self.CONVERSION_S[self.resolution]
+        t = math.floor(clock.now() / period) * period
+        celsius = self.celsius(t) if callable(self.celsius) else self.celsius
+        step = 1 << (3 - self.resolution) # in sixteenths
+        sixteenths = math.floor(celsius * 16 / step) * step
+        reading = sixteenths & 0x1FFF
+
+        def limit(reg):
+            v = self.regs[reg] & 0x1FFC
+            return v - 0x2000 if v & 0x1000 else v
+        flags = 0
+        if sixteenths >= limit(4):
+            flags |= 0x8000
+        if sixteenths > limit(2):
+            flags |= 0x4000
+        if sixteenths < limit(3):
+            flags |= 0x2000
+        return flags | reading
+
+    def i2c_write(self, data):
+        if not data:
+            return
+        self.pointer = data[0] & 0x0F
+        value = data[1:]
+        if not value:
+            return
+        self.writes += 1
+        reg = self.pointer
+        if reg == 8:
+            self.resolution = value[0] & 0x03
+        elif reg == 1 and len(value) >= 2:
+            config = (value[0] << 8) | value[1]
+            shutdown = bool(config & 0x0100)
+            if shutdown and self.frozen is None:
+                self.frozen = self.ambient()
+            elif not shutdown:
+                self.frozen = None
+            self.regs[1] = config & ~0x0030 # interrupt clear and alert status read as 0
+            if config & 0x0020:
+                self.latched = False
+            self._alert()
+        elif reg in (2, 3, 4) and len(value) >= 2:
+            self.regs[reg] = ((value[0] << 8) | value[1]) & 0x1FFC
+            self._alert()
+
+    def i2c_read(self, n):
+        self.reads += 1
+        reg = self.pointer
+        if reg == 8:
+            data = bytes((self.resolution,))
+        else:
+            value = self.ambient() if reg == 5 else self.regs.get(reg, 0)
+            if reg == 1 and self.alerting:
+                value |= 0x0010 # alert output status
+            data = bytes(((value >> 8) & 0xFF, value & 0xFF))
+        return (data * n)[:n]
+
+    def _alert(self):
+        '''Works out the ALERT output from the latest reading.'''
+        config = self.regs[1]
+        flags = self.ambient() & 0xE000
+        zone = flags & 0x6000
+        enabled = config & 0x0008
+        if enabled and config & 0x0001 and zone != self.zone:
+            self.latched = True
+        self.zone = zone
+        if not enabled:
+            active = False
+        elif flags & 0x8000:
+            active = True
+        elif config & 0x0004: # critical limit only
+            active = False
+        elif config & 0x0001:
+            active = self.latched
+        else:
+            active = zone != 0
+        self.alerting = active
+        if self.alert_pin is not None:
+            # Open drain: active-high polarity releases the pin when active
+            high = active if config & 0x0002 else not active
+            clock.sim().drive(self.alert_pin, None if high else 0)
+        if enabled and self.tick is None:
+            self._schedule()
+        elif not enabled and self.tick is not None:
+            clock.cancel(self.tick)
+            self.tick = None
+
+    def _schedule(self):
+        period = self.CONVERSION_S[self.resolution]
+        now = clock.now()
+        # Just after the conversion finishes, clear of rounding
+        due = (math.floor(now / period) + 1) * period + 1e-6
+        self.tick = clock.call_later(due - now, self._converted)
+
+    def _converted(self):
+        self.tick = None
+        self._alert()
+
+
+class SSD1306():
+    '''Register model of an SSD1306 OLED controller: the command set, the
+    three addressing modes and the display RAM. It takes the I2C framing
+    (control bytes) or, with dc_pin given, SPI data with the D/C pin.
+    render() draws the panel as text.'''
+
+    # Parameter bytes for the commands that take them
+    PARAMS = {0x20: 1, 0x21: 2, 0x22: 2, 0x26: 6, 0x27: 6, 0x29: 5, 0x2A: 5, 0x81: 1, 0x8D: 1,
+              0xA3: 2, 0xA8: 1, 0xAD: 1, 0xD3: 1, 0xD5: 1, 0xD9: 1, 0xDA: 1, 0xDB: 1}
+
+    def __init__(self, width=128, height=32, addr=0x3C, dc_pin=None, cs_pin=None):
+        self.width = width
+        self.height = height
+        self.addr = addr
+        self.dc_pin = dc_pin
+        self.cs_pin = cs_pin
+        self.ram = bytearray(128 * 8)
+        self.on = False
+        self.contrast = 0x7F
+        self.inverted = False
+        self.entire_on = False
+        self.seg_remap = False
+        self.com_flip = False
+        self.mode = 2 # page addressing
+        self.col_start, self.col_end = 0, 127
+        self.page_start, self.page_end = 0, 7
+        self.col = 0
+        self.page = 0
+        self.cmd = []
+        self.commands = 0
+        self.data_bytes = 0
+        self.transactions = 0
+
+    # -- bus framing --------------------------------------------------------
+
+    def i2c_write(self, data):
+        self.transactions += 1
+        ii = 0
+        while ii < len(data):
+            control = data[ii]
+            ii += 1
+            if control & 0x80:
+                # Co=1: one byte, then another control byte
+                if ii < len(data):
+                    self._byte(data[ii], control & 0x40)
+                ii += 1
+            else:
+                for b in data[ii:]:
+                    self._byte(b, control & 0x40)
+                break
+
+    def i2c_read(self, n):
+        return bytes(n) # status reads aren't modelled
+
+    def spi_write(self, data):
+        self.transactions += 1
+        is_data = clock.sim().pins.level(self.dc_pin)
+        for b in data:
+            self._byte(b, is_data)
+
+    def _byte(self, b, is_data):
+        if is_data:
+            self._data(b)
+        else:
+            self._command(b)
+
+    # -- commands and data --------------------------------------------------
+
+    def _command(self, b):
+        cmd = self.cmd
+        if not cmd:
+            self.commands += 1
+        cmd.append(b)
+        if len(cmd) <= self.PARAMS.get(cmd[0], 0):
+            return # waiting for parameters
+        self.cmd = []
+        c = cmd[0]
+        if c <= 0x0F:
+            self.col = (self.col & 0xF0) | c
+        elif c <= 0x1F:
+            self.col = (self.col & 0x0F) | ((c & 0x0F) << 4)
+        elif c == 0x20:
+            self.mode = cmd[1] & 0x03
+        elif c == 0x21:
+            self.col_start, self.col_end = cmd[1] & 0x7F, cmd[2] & 0x7F
+            self.col = self.col_start
+        elif c == 0x22:
+            self.page_start, self.page_end = cmd[1] & 0x07, cmd[2] & 0x07
+            self.page = self.page_start
+        elif c == 0x81:
+            self.contrast = cmd[1]
+        elif c in (0xA0, 0xA1):
+            self.seg_remap = c == 0xA1
+        elif c in (0xA4, 0xA5):
+            self.entire_on = c == 0xA5
+        elif c in (0xA6, 0xA7):
+            self.inverted = c == 0xA7
+        elif c in (0xAE, 0xAF):
+            self.on = c == 0xAF
+        elif 0xB0 <= c <= 0xB7:
+            self.page = c & 0x07
+        elif c in (0xC0, 0xC8):
+            self.com_flip = c == 0xC8
+
+    def _data(self, b):
+        self.data_bytes += 1
+        self.ram[self.page * 128 + self.col] = b
+        if self.mode == 2: # page: wraps within the page
+            self.col = (self.col + 1) & 0x7F
+        elif self.mode == 0: # horizontal
+            if self.col >= self.col_end:
+                self.col = self.col_start
+                self.page = self.page_start if self.page >= self.page_end else self.page + 1
+            else:
+                self.col += 1
+        else: # vertical
+            if self.page >= self.page_end:
+                self.page = self.page_start
+                self.col = self.col_start if self.col >= self.col_end else self.col + 1
+            else:
+                self.page += 1
+
+    # -- what the panel shows -----------------------------------------------
+
+    def pixel(self, x, y):
+        '''The pixel as seen on the panel, in the orientation the driver's
+        default remap and scan direction give.'''
+        col = x if self.seg_remap else 127 - x
+        row = y if self.com_flip else self.height - 1 - y
+        lit = (self.ram[(row >> 3) * 128 + col] >> (row & 7)) & 1
+        if self.entire_on:
+            lit = 1
+        return lit ^ self.inverted if self.on else 0
+
+    def render(self):
+        '''The panel as text, two pixel rows per line.'''
+        chars = ' ▀▄█'
+        lines = []
+        for y in range(0, self.height, 2):
+            lines.append(''.join(chars[self.pixel(x, y) | (self.pixel(x, y + 1) << 1)]
+                                 for x in range(self.width)).rstrip())
+        return '\n'.join(lines)
+
+
+class DHT11():
+    '''Pin level model of a DHT11, or with model=22 a DHT22. When the host
+    has held the data line low for long enough and lets it go, it answers
+    with the 80 us low and high response and the 40 data bits, each a 50 us
+    low then a 26 us (0) or 70 us (1) high.'''
+
+    MIN_START_S = {11: 0.018, 22: 0.001}
+
+    def __init__(self, pin, humidity=45, celsius=23.0, model=11):
+        self.pin = pin
+        self.humidity = humidity
+        self.celsius = celsius
+        self.model = model
+        self.low_at = None
+        self.responses = 0
+        sim = clock.sim()
+        sim.pins.set_pull(pin, 1) # the module's pull-up resistor
+        sim.watch(pin, self._changed)
+
+    def frame(self):
+        '''The five bytes the sensor sends.'''
+        humidity = _value(self.humidity)
+        celsius = _value(self.celsius)
+        if self.model == 11:
+            tenths = round(abs(celsius) * 10)
+            temp_int, temp_dec = tenths // 10, tenths % 10
+            if celsius < 0:
+                temp_dec |= 0x80
+            data = [int(humidity), 0, temp_int, temp_dec]
+        else:
+            h = round(humidity * 10)
+            t = round(abs(celsius) * 10) | (0x8000 if celsius < 0 else 0)
+            data = [h >> 8, h & 0xFF, t >> 8, t & 0xFF]
+        return data + [sum(data) & 0xFF]
+
+    def _changed(self, pin, level, t):
+        sim = clock.sim()
+        driven = sim.pins.oe[pin]
+        if level == 0 and driven:
+            self.low_at = t
+        elif level == 1 and not driven and self.low_at is not None:
+            held = sim.seconds(t - self.low_at)
+            self.low_at = None
+            if held >= self.MIN_START_S[self.model]:
+                self._respond(t)
+
+    def _respond(self, t):
+        sim = clock.sim()
+        self.responses += 1
+        at = t + sim.to_time(30e-6)
+        edges = [(0, 80), (None, 80)]
+        for byte in self.frame():
+            for bit in range(7, -1, -1):
+                edges.append((0, 50))
+                edges.append((None, 70 if byte >> bit & 1 else 26))
+        edges.append((0, 50))
+        edges.append((None, 0))
+        for level, us in edges:
+            sim.drive(self.pin, level, at)
+            at += sim.to_time(us * 1e-6)
+
+
+class TMP36():
+    '''A TMP36 on an ADC channel: 500 mV at 0 C and 10 mV per degree.'''
+
+    def __init__(self, channel=0, celsius=23.0):
+        self.channel = channel
+        self.celsius = celsius
+        set_analog(channel, lambda: 0.5 + _value(self.celsius) / 100)
+
+
+class CoreTemperature():
+    '''The RP2040's temperature sensor on ADC channel 4: 0.706 V at 27 C,
+    falling 1.721 mV per degree.'''
+
+    def __init__(self, celsius=25.0):
+        self.celsius = celsius
+        set_analog(4, lambda: 0.706 - (_value(self.celsius) - 27) * 0.001721)
+
+
+def pico_board(celsius=23.0, humidity=45, oled=True, dht=True):
+    '''Attaches the parts the demos use: an MCP9808 with its ALERT output on
+    GP13 and a 128x32 SSD1306 on I2C 0, a DHT11 on GP15, a TMP36 on ADC 0
+    and the core temperature sensor. Returns the models by name.'''
+    parts = {
+        'mcp9808': attach_i2c(0, MCP9808(celsius, alert_pin=13)),
+        'tmp36': TMP36(0, celsius),
+        'core': CoreTemperature(celsius),
+    }
+    if oled:
+        parts['oled'] = attach_i2c(0, SSD1306(128, 32))
+    if dht:
+        parts['dht11'] = DHT11(15, humidity, celsius)
+    return parts
+
+
+if __name__ == '__main__':
+    # machine finds the models through the imported module, not __main__
+    import devices
+    from machine import I2C
+    clock.reset()
+    devices.reset()
+    parts = devices.pico_board(celsius=-1.3)
+    i2c = I2C(0)
+    assert i2c.scan() == [0x18, 0x3C]
+
+    # MCP9808: IDs, a negative reading truncated to 1/16 C, the resolution
+    # register and a frozen reading in shutdown
+    assert i2c.readfrom_mem(0x18, 6, 2) == b'\x00T'
+    assert i2c.readfrom_mem(0x18, 7, 2) == b'\x04\x00'
+    raw = int.from_bytes(i2c.readfrom_mem(0x18, 5, 2), 'big')
+    assert raw & 0x1FFF == (-21) & 0x1FFF, hex(raw)
+    i2c.writeto_mem(0x18, 8, b'\x00')
+    assert i2c.readfrom_mem(0x18, 8, 1) == b'\x00'
+    assert int.from_bytes(i2c.readfrom_mem(0x18, 5, 2), 'big') & 0x1FFF == (-24) & 0x1FFF
+    i2c.writeto_mem(0x18, 1, b'\x01\x00')
+    parts['mcp9808'].celsius = 40
+    clock.advance(1)
+    assert int.from_bytes(i2c.readfrom_mem(0x18, 5, 2), 'big') & 0x1FFF == (-24) & 0x1FFF
+    i2c.writeto_mem(0x18, 1, b'\x00\x00')
+    clock.advance(0.1)
+    assert int.from_bytes(i2c.readfrom_mem(0x18, 5, 2), 'big') & 0x1FFF == 40 * 16
+
+    # MCP9808 ALERT on GP13 through the driver's MCP9808Monitor. Interrupt
+    # mode latches each crossing of the window until the handler acks it;
+    # comparator mode follows the window, both edges reporting.
+    import asyncio
+    import mcp9808
+    from machine import Pin
+    mcp = parts['mcp9808']
+    mcp.celsius = 25
+    sensor = mcp9808.MCP9808(i2c)
+    sensor.set_alert_boundary_temp(mcp9808.REG_TEMP_BOUNDARY_CRITICAL, 60)
+    sensor.set_alert_boundary_temp(mcp9808.REG_TEMP_BOUNDARY_UPPER, 30)
+    sensor.set_alert_boundary_temp(mcp9808.REG_TEMP_BOUNDARY_LOWER, 20)
+    alert = Pin(13, Pin.IN)
+    monitor = mcp9808.MCP9808Monitor(sensor, alert)
+    clock.advance(0.1)
+    assert alert.value() == 1 and monitor.pending() == 0
+    mcp.celsius = 31
+    clock.advance(0.1)
+    assert alert.value() == 1 and not mcp.latched # acknowledged by the handler
+    mcp.celsius = 25
+    clock.advance(0.1)
+    events = [monitor.get_event() for _ in range(monitor.pending())]
+    assert [flags for flags, raw in events] == [mcp9808.ALERT_FLAG_UPPER, 0], events
+    assert events[0][1] & 0x1FFF == 31 * 16
+
+    async def cold():
+        mcp.celsius = 15
+        return await monitor.next_event()
+    asyncio.set_event_loop_policy(clock.EventLoopPolicy())
+    assert asyncio.run(cold())[0] == mcp9808.ALERT_FLAG_LOWER
+    monitor.stop()
+    assert monitor.pending() == 0 and alert.value() == 1
+
+    monitor = mcp9808.MCP9808Monitor(sensor, alert, output_mode=mcp9808.ALERT_OUTPUT_COMPARATOR)
+    clock.advance(0.1)
+    assert alert.value() == 0 and monitor.pending() == 1 # still below the window
+    mcp.celsius = 25
+    clock.advance(0.1)
+    assert alert.value() == 1
+    assert [monitor.get_event()[0] for _ in range(2)] == [mcp9808.ALERT_FLAG_LOWER, 0]
+    mcp.celsius = 70
+    clock.advance(0.1)
+    assert monitor.get_event()[0] == mcp9808.ALERT_FLAG_CRIT | mcp9808.ALERT_FLAG_UPPER
+    monitor.stop()
+
+    # SSD1306: horizontal addressing inside a window wraps to the next page
+    oled = parts['oled']
+    i2c.writeto(0x3C, bytes((0x00, 0x20, 0x00, 0x21, 10, 11, 0x22, 2, 3)))
+    i2c.writeto(0x3C, bytes((0x40, 1, 2, 3, 4, 5)))
+    assert oled.ram[2 * 128 + 11] == 2
+    assert oled.ram[3 * 128 + 10:3 * 128 + 12] == b'\x03\x04'
+    assert oled.ram[2 * 128 + 10] == 5 # wrapped back to the window start
+    try:
+        i2c.writeto(0x3D, b'\x00')
+    except OSError as e:
+        assert e.args[0] == 5
+    else:
+        assert False, 'no device at 0x3D'
+
+    # DHT11 and the ADC sensors
+    assert parts['dht11'].frame() == [45, 0, 1, 0x83, (45 + 1 + 0x83) & 0xFF]
+    print('devices OK')
@@ -0,0 +1,245 @@
+# CPython
+'''Pure-Python stand-in for MicroPython's framebuf module. Implements the
+monochrome formats with the drawing primitives, text, scroll and blit.
+
+The 8x8 text cell and the drawing semantics match the firmware. The glyphs
+are a classic 5x7 font centred in the cell, so text looks slightly different
+from the firmware's font.'''
+
+MONO_VLSB = 0
+RGB565 = 1
+GS4_HMSB = 2
+MONO_HLSB = 3
+MONO_HMSB = 4
+GS2_HMSB = 5
+GS8 = 6
+MVLSB = MONO_VLSB
+
+# 5x7 glyphs for chr(32)..chr(127), one byte per column, LSB at the top
+_FONT = bytes.fromhex(
+    '0000000000' '00005f0000' '0007000700' '147f147f14' '242a7f2a12'
+    '2313086462' '3649562050' '0008070300' '001c224100' '0041221c00'
+    '2a1c7f1c2a' '08083e0808' '0080703000' '0808080808' '0000606000'
+    '2010080402' '3e5149453e' '00427f4000' '7249494946' '2141494d33'
+    '1814127f10' '2745454539' '3c4a494931' '4121110907' '3649494936'
+    '464949291e' '0000140000' '0040340000' '0008142241' '1414141414'
+    '0041221408' '0201590906' '3e415d594e' '7c1211127c' '7f49494936'
+    '3e41414122' '7f4141413e' '7f49494941' '7f09090901' '3e41415173'
+    '7f0808087f' '00417f4100' '2040413f01' '7f08142241' '7f40404040'
+    '7f021c027f' '7f0408107f' '3e4141413e' '7f09090906' '3e4151215e'
+    '7f09192946' '2649494932' '03017f0103' '3f4040403f' '1f2040201f'
+    '3f4038403f' '6314081463' '0304780403' '61594d4943' '007f414141'
+    '0204081020' '004141417f' '0402010204' '4040404040' '0003070800'
+    '2054547840' '7f28444438' '3844444428' '384444287f' '3854545418'
+    '00087e0902' '18a4a49c78' '7f08040478' '00447d4000' '2040403d00'
+    '7f10284400' '00417f4000' '7c0478047c' '7c08040478' '3844444438'
+    'fc18242418' '18242418fc' '7c08040408' '4854545424' '04043f4424'
+    '3c4040207c' '1c2040201c' '3c4030403c' '4428102844' '4c9090907c'
+    '4464544c44' '0008364100' '0000770000' '0041360800' '0201020402'
+    '7f7f7f7f7f'
+)
+
+
+class FrameBuffer():
+    '''A monochrome frame buffer over a caller-supplied buffer.'''
+
+    def __init__(self, buffer, width, height, format, stride=None):
+        if format not in (MONO_VLSB, MONO_HLSB, MONO_HMSB):
+            raise ValueError('invalid format')
+        self._buf = buffer
+        self._mv = memoryview(buffer)
+        self._width = width
+        self._height = height
+        self._format = format
+        self._stride = width if stride is None else stride
+        if format == MONO_VLSB:
+            need = ((height + 7) // 8) * self._stride
+        else:
+            self._stride = (self._stride + 7) & ~7
+            need = (self._stride // 8) * height
+        if len(self._mv) < need:
+            raise ValueError('buffer too small')
+
+    # -- pixel access -------------------------------------------------------
+
+    def _get(self, x, y):
+        if self._format == MONO_VLSB:
+            return (self._buf[(y >> 3) * self._stride + x] >> (y & 7)) & 1
+        index = (y * self._stride + x) >> 3
+        if self._format == MONO_HLSB:
+            return (self._buf[index] >> (7 - (x & 7))) & 1
+        return (self._buf[index] >> (x & 7)) & 1
+
+    def _set(self, x, y, c):
+        if self._format == MONO_VLSB:
+            index = (y >> 3) * self._stride + x
+            bit = 1 << (y & 7)
+        else:
+            index = (y * self._stride + x) >> 3
+            if self._format == MONO_HLSB:
+                bit = 0x80 >> (x & 7)
+            else:
+                bit = 1 << (x & 7)
+        if c & 1:
+            self._buf[index] |= bit
+        else:
+            self._buf[index] &= ~bit & 0xFF
+
+    def pixel(self, x, y, c=None):
+        if not (0 <= x < self._width and 0 <= y < self._height):
+            return None
+        if c is None:
+            return self._get(x, y)
+        self._set(x, y, c)
+
+    # -- filled shapes ------------------------------------------------------
+
+    def fill_rect(self, x, y, w, h, c):
+        x0 = max(x, 0)
+        y0 = max(y, 0)
+        x1 = min(x + w, self._width)
+        y1 = min(y + h, self._height)
+        if x0 >= x1 or y0 >= y1:
+            return
+        if self._format == MONO_VLSB:
+            buf = self._buf
+            stride = self._stride
+            page = y0 >> 3
+            while page * 8 < y1:
+                top = max(y0 - page * 8, 0)
+                bottom = min(y1 - page * 8, 8)
+                mask = ((0xFF << top) & 0xFF) & (0xFF >> (8 - bottom))
+                base = page * stride
+                if c & 1:
+                    for x in range(base + x0, base + x1):
+                        buf[x] |= mask
+                else:
+                    inv = ~mask & 0xFF
+                    for x in range(base + x0, base + x1):
+                        buf[x] &= inv
+                page += 1
+            return
+        for yy in range(y0, y1):
+            for xx in range(x0, x1):
+                self._set(xx, yy, c)
+
+    def fill(self, c):
+        if self._format == MONO_VLSB and self._stride == self._width:
+            value = 0xFF if c & 1 else 0
+            n = ((self._height + 7) // 8) * self._stride
+            self._mv[:n] = bytes((value,)) * n
+            return
+        self.fill_rect(0, 0, self._width, self._height, c)
+
+    def hline(self, x, y, w, c):
+        self.fill_rect(x, y, w, 1, c)
+
+    def vline(self, x, y, h, c):
+        self.fill_rect(x, y, 1, h, c)
+
+    def rect(self, x, y, w, h, c, f=False):
+        if f:
+            self.fill_rect(x, y, w, h, c)
+            return
+        self.fill_rect(x, y, w, 1, c)
+        self.fill_rect(x, y + h - 1, w, 1, c)
+        self.fill_rect(x, y, 1, h, c)
+        self.fill_rect(x + w - 1, y, 1, h, c)
+
+    def line(self, x1, y1, x2, y2, c):
+        dx = abs(x2 - x1)
+        dy = -abs(y2 - y1)
+        sx = 1 if x1 < x2 else -1
+        sy = 1 if y1 < y2 else -1
+        err = dx + dy
+        while True:
+            self.pixel(x1, y1, c)
+            if x1 == x2 and y1 == y2:
+                break
+            e2 = 2 * err
+            if e2 >= dy:
+                err += dy
+                x1 += sx
+            if e2 <= dx:
+                err += dx
+                y1 += sy
+
+    def ellipse(self, x, y, xr, yr, c, f=False, m=0xF):
+        for yy in range(-yr, yr + 1):
+            for xx in range(-xr, xr + 1):
+                d = (xx * xx) * (yr * yr) + (yy * yy) * (xr * xr)
+                r = (xr * xr) * (yr * yr)
+                if d > r:
+                    continue
+                if not f:
+                    # keep only the outline
+                    xo = abs(xx) + 1
+                    yo = abs(yy) + 1
+                    if (xo * xo) * (yr * yr) + (yy * yy) * (xr * xr) <= r and \
+                            (xx * xx) * (yr * yr) + (yo * yo) * (xr * xr) <= r:
+                        continue
+                quadrant = (1 if xx >= 0 and yy <= 0 else 0) | (2 if xx <= 0 and yy <= 0 else 0) | \
+                           (4 if xx <= 0 and yy >= 0 else 0) | (8 if xx >= 0 and yy >= 0 else 0)
+                if quadrant & m:
+                    self.pixel(x + xx, y + yy, c)
+
+    # -- text, scrolling and blitting ---------------------------------------
+
+    def text(self, s, x, y, c=1):
+        for ch in s:
+            code = ord(ch)
+            if code < 32 or code > 127:
+                code = 127
+            glyph = (code - 32) * 5
+            for col in range(5):
+                bits = _FONT[glyph + col]
+                xx = x + 1 + col
+                if bits and 0 <= xx < self._width:
+                    for row in range(8):
+                        if bits & (1 << row):
+                            self.pixel(xx, y + row, c)
+            x += 8
+
+    def scroll(self, xstep, ystep):
+        '''Shifts the contents by the given steps. As on the firmware, the
+        vacated area keeps its previous contents.'''
+        w = self._width
+        h = self._height
+        if xstep < 0:
+            sx, xend, dx = 0, w + xstep, 1
+        else:
+            sx, xend, dx = w - 1, xstep - 1, -1
+        if ystep < 0:
+            y, yend, dy = 0, h + ystep, 1
+        else:
+            y, yend, dy = h - 1, ystep - 1, -1
+        get = self._get
+        put = self._set
+        while y != yend:
+            x = sx
+            while x != xend:
+                put(x, y, get(x - xstep, y - ystep))
+                x += dx
+            y += dy
+
+    def blit(self, fbuf, x, y, key=-1, palette=None):
+        if isinstance(fbuf, tuple):
+            fbuf = FrameBuffer(*fbuf)
+        x0 = max(x, 0)
+        y0 = max(y, 0)
+        x1 = min(x + fbuf._width, self._width)
+        y1 = min(y + fbuf._height, self._height)
+        get = fbuf._get
+        put = self._set
+        for yy in range(y0, y1):
+            for xx in range(x0, x1):
+                c = get(xx - x, yy - y)
+                if palette is not None:
+                    c = palette._get(c, 0)
+                if c != key:
+                    put(xx, yy, c)
+
+
+def FrameBuffer1(buffer, width, height, stride=None):
+    '''Legacy constructor for a MONO_VLSB frame buffer.'''
+    return FrameBuffer(buffer, width, height, MONO_VLSB, stride)
@@ -0,0 +1,476 @@
+# CPython
+'''machine for the host. Pins are pio_sim's pins, so the CPU, the state
+machines and the device models in devices.py see the same levels. Buses
+reach the models attached in devices.py and take as long, in virtual
+time, as the transfer would on the wire. PWM only keeps its settings; it
+produces no edges.'''
+
+import clock
+import devices
+
+
+def _sim():
+    return clock.sim()
+
+
+class Pin():
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    ALT = 3
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 4
+    IRQ_RISING = 8
+
+    NAMES = {'LED': 25}
+
+    def __init__(self, id, mode=-1, pull=-1, *, value=None):
+        self.id = self.NAMES.get(id, id)
+        self.mode = self.IN
+        self.handler = None
+        self.watching = False
+        self.init(mode, pull, value=value)
+
+    def init(self, mode=-1, pull=-1, *, value=None):
+        pins = _sim().pins
+        if value is not None:
+            pins.set_level(self.id, 1 if value else 0)
+        if pull != -1:
+            pins.set_pull(self.id, 1 if pull == self.PULL_UP else 0)
+        if mode != -1:
+            self.mode = mode
+            if mode == self.OPEN_DRAIN:
+                self._open_drain(pins.out[self.id])
+            else:
+                pins.set_dir(self.id, 1 if mode == self.OUT else 0)
+
+    def _open_drain(self, value):
+        pins = _sim().pins
+        pins.set_pin(self.id, 0, 0 if value else 1)
+        pins.out[self.id] = value
+
+    def value(self, value=None):
+        if value is None:
+            clock.poll()
+            return _sim().pins.level(self.id)
+        value = 1 if value else 0
+        if self.mode == self.OPEN_DRAIN:
+            self._open_drain(value)
+        else:
+            _sim().pins.set_level(self.id, value)
+
+    def __call__(self, value=None):
+        return self.value(value)
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+    high = on
+    low = off
+
+    def toggle(self):
+        self.value(1 - _sim().pins.out[self.id])
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING, hard=False):
+        '''Calls handler(pin) on the chosen edges, just after the edge, as
+        the interrupt would once the current instruction finishes.'''
+        if not self.watching:
+            self.watching = True
+            _sim().watch(self.id, self._edge)
+        self.handler = handler
+        self.trigger = trigger
+
+    def _edge(self, pin, level, t):
+        if self.handler is None:
+            return
+        if self.trigger & (self.IRQ_RISING if level else self.IRQ_FALLING):
+            _sim().call_at(t, self.handler, self)
+
+    def __repr__(self):
+        return f'Pin({self.id})'
+
+
+class ADC():
+    '''12 bit conversions scaled to 16 bits, as read_u16() gives them on
+    the Pico. The voltage comes from devices.analog().'''
+
+    CORE_TEMP = 4
+    VREF = 3.3
+
+    def __init__(self, pin):
+        if isinstance(pin, Pin):
+            pin = pin.id
+        self.channel = pin - 26 if pin >= 26 else pin
+
+    def read_u16(self):
+        clock.advance(2e-6) # 96 ADC clocks at 48 MHz
+        volts = devices.analog(self.channel)
+        code = max(0, min(4095, int(volts / self.VREF * 4096)))
+        return (code << 4) | (code >> 8)
+
+
+class I2C():
+    '''Reaches the devices attached to this bus id in devices.py. A missing
+    device raises OSError(EIO), as on the Pico when nothing acknowledges.'''
+
+    def __init__(self, id=0, *, scl=None, sda=None, freq=400000, timeout=50000):
+        self.id = id
+        self.freq = freq
+
+    def init(self, scl=None, sda=None, *, freq=400000, timeout=50000):
+        self.freq = freq
+
+    def _wire(self, nbytes):
+        # Start, address and data bytes, nine clocks each
+        clock.advance((nbytes + 1) * 9 / self.freq)
+
+    def _device(self, addr):
+        device = devices.i2c_device(self.id, addr)
+        if device is None:
+            self._wire(0)
+            raise OSError(5) # EIO
+        return device
+
+    def scan(self):
+        for addr in range(0x08, 0x78):
+            self._wire(0)
+        return devices.i2c_addresses(self.id)
+
+    def writeto(self, addr, buf, stop=True):
+        device = self._device(addr)
+        self._wire(len(buf))
+        device.i2c_write(bytes(buf))
+        return len(buf)
+
+    def writevto(self, addr, vector, stop=True):
+        data = b''.join(bytes(b) for b in vector)
+        return self.writeto(addr, data, stop)
+
+    def readfrom(self, addr, nbytes, stop=True):
+        device = self._device(addr)
+        self._wire(nbytes)
+        return device.i2c_read(nbytes)
+
+    def readfrom_into(self, addr, buf, stop=True):
+        buf[:] = self.readfrom(addr, len(buf), stop)
+
+    def writeto_mem(self, addr, memaddr, buf, *, addrsize=8):
+        self.writeto(addr, self._memaddr(memaddr, addrsize) + bytes(buf))
+
+    def readfrom_mem(self, addr, memaddr, nbytes, *, addrsize=8):
+        self.writeto(addr, self._memaddr(memaddr, addrsize), False)
+        return self.readfrom(addr, nbytes)
+
+    def readfrom_mem_into(self, addr, memaddr, buf, *, addrsize=8):
+        buf[:] = self.readfrom_mem(addr, memaddr, len(buf), addrsize=addrsize)
+
+    @staticmethod
+    def _memaddr(memaddr, addrsize):
+        return memaddr.to_bytes(addrsize // 8, 'big')
+
+
+SoftI2C = I2C
+
+
+class SPI():
+    '''Writes go to the devices attached to this bus id whose chip select
+    pin is low, or to all of them when they have none.'''
+
+    MSB = 0
+    LSB = 1
+
+    def __init__(self, id=0, baudrate=1000000, *, polarity=0, phase=0, bits=8, firstbit=MSB,
+                 sck=None, mosi=None, miso=None):
+        self.id = id
+        self.baudrate = baudrate
+
+    def init(self, baudrate=1000000, **kwargs):
+        self.baudrate = baudrate
+
+    def deinit(self):
+        pass
+
+    def _selected(self):
+        pins = _sim().pins
+        return [d for d in devices.spi_devices(self.id)
+                if getattr(d, 'cs_pin', None) is None or not pins.level(d.cs_pin)]
+
+    def write(self, buf):
+        clock.advance(len(buf) * 8 / self.baudrate)
+        for device in self._selected():
+            device.spi_write(bytes(buf))
+
+    def read(self, nbytes, write=0x00):
+        clock.advance(nbytes * 8 / self.baudrate)
+        return bytes(nbytes)
+
+    def readinto(self, buf, write=0x00):
+        buf[:] = self.read(len(buf), write)
+
+    def write_readinto(self, write_buf, read_buf):
+        self.write(write_buf)
+        read_buf[:] = bytes(len(read_buf))
+
+
+SoftSPI = SPI
+
+
+class PWM():
+    '''Keeps the settings; no edges appear on the pin.'''
+
+    def __init__(self, pin, *, freq=None, duty_u16=None, duty_ns=None):
+        self.pin = pin
+        self._freq = 1000
+        self._duty = 0
+        if freq is not None:
+            self.freq(freq)
+        if duty_u16 is not None:
+            self.duty_u16(duty_u16)
+        if duty_ns is not None:
+            self.duty_ns(duty_ns)
+
+    def freq(self, value=None):
+        if value is None:
+            return self._freq
+        if not 8 <= value <= 62500000:
+            raise ValueError('freq too small' if value < 8 else 'freq too large')
+        self._freq = value
+
+    def duty_u16(self, value=None):
+        if value is None:
+            return self._duty
+        self._duty = max(0, min(65535, int(value)))
+
+    def duty_ns(self, value=None):
+        period_ns = 1e9 / self._freq
+        if value is None:
+            return int(self._duty * period_ns / 65535)
+        self.duty_u16(value * 65535 / period_ns)
+
+    def deinit(self):
+        self._duty = 0
+
+
+class Timer():
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id=-1, *, mode=PERIODIC, period=-1, freq=-1, callback=None):
+        self.handle = None
+        if callback is not None:
+            self.init(mode=mode, period=period, freq=freq, callback=callback)
+
+    def init(self, *, mode=PERIODIC, period=-1, freq=-1, callback=None, tick_hz=1000):
+        self.deinit()
+        if freq > 0:
+            self.period_s = 1 / freq
+        else:
+            self.period_s = period / tick_hz
+        self.mode = mode
+        self.callback = callback
+        self.handle = clock.call_later(self.period_s, self._fire)
+
+    def _fire(self):
+        if self.mode == self.PERIODIC:
+            self.handle = clock.call_later(self.period_s, self._fire)
+        else:
+            self.handle = None
+        if self.callback is not None:
+            self.callback(self)
+
+    def deinit(self):
+        if self.handle is not None:
+            clock.cancel(self.handle)
+            self.handle = None
+
+
+class UART():
+    '''Writes take the time the characters would on the wire and are kept
+    in sent. Data for reads is queued with feed().'''
+
+    def __init__(self, id, baudrate=115200, bits=8, parity=None, stop=1, **kwargs):
+        self.id = id
+        self.baudrate = baudrate
+        self.sent = bytearray()
+        self.received = bytearray()
+
+    def init(self, baudrate=115200, bits=8, parity=None, stop=1, **kwargs):
+        self.baudrate = baudrate
+
+    def deinit(self):
+        pass
+
+    def feed(self, data):
+        self.received.extend(data)
+
+    def write(self, buf):
+        if isinstance(buf, str):
+            buf = buf.encode()
+        clock.advance(len(buf) * 10 / self.baudrate)
+        self.sent.extend(buf)
+        return len(buf)
+
+    def any(self):
+        return len(self.received)
+
+    def read(self, nbytes=None):
+        if not self.received:
+            return None
+        n = len(self.received) if nbytes is None else nbytes
+        data = bytes(self.received[:n])
+        del self.received[:n]
+        return data
+
+    def readinto(self, buf, nbytes=None):
+        data = self.read(len(buf) if nbytes is None else nbytes)
+        if data is None:
+            return None
+        buf[:len(data)] = data
+        return len(data)
+
+    def readline(self):
+        end = self.received.find(b'\n')
+        return self.read(None if end < 0 else end + 1)
+
+    def flush(self):
+        pass
+
+    def txdone(self):
+        return True
+
+
+class RTC():
+    def datetime(self, datetimetuple=None):
+        '''(year, month, day, weekday, hours, minutes, seconds, subseconds)'''
+        import utime
+        if datetimetuple is None:
+            t = utime.gmtime()
+            return (t[0], t[1], t[2], t[6], t[3], t[4], t[5], 0)
+        y, mo, d, _, h, mi, s = datetimetuple[:7]
+        clock.epoch = utime.mktime((y, mo, d, h, mi, s)) - int(clock.now())
+
+
+class WDT():
+    '''Stops the program with SystemExit when it isn't fed in time, where
+    the Pico would reset.'''
+
+    def __init__(self, id=0, timeout=5000):
+        self.timeout_s = timeout / 1000
+        self.handle = None
+        self.feed()
+
+    def feed(self):
+        if self.handle is not None:
+            clock.cancel(self.handle)
+        self.handle = clock.call_later(self.timeout_s, self._expired)
+
+    def _expired(self):
+        raise SystemExit('watchdog reset')
+
+
+class _Mem():
+    '''mem32 and friends. PIO registers go to pio_sim; other addresses are
+    plain storage.'''
+
+    def __init__(self, mask):
+        self.mask = mask
+
+    def __getitem__(self, addr):
+        sim = _sim()
+        if sim.handles(addr):
+            clock.poll() # status registers are polled in loops
+            return sim.mem_read(addr) & self.mask
+        return _memory.get(addr, 0) & self.mask
+
+    def __setitem__(self, addr, value):
+        sim = _sim()
+        value &= self.mask
+        if sim.handles(addr):
+            sim.mem_write(addr, value)
+        else:
+            _memory[addr] = value
+
+
+_memory = {}
+mem32 = _Mem(0xFFFFFFFF)
+mem16 = _Mem(0xFFFF)
+mem8 = _Mem(0xFF)
+
+
+def freq(hz=None):
+    sim = _sim()
+    if hz is None:
+        return sim.sys_freq
+    sim.set_sys_freq(hz)
+
+
+def reset():
+    raise SystemExit('machine.reset()')
+
+
+soft_reset = reset
+
+
+def reset_cause():
+    return 1 # PWRON_RESET
+
+
+PWRON_RESET = 1
+WDT_RESET = 3
+
+
+def unique_id():
+    return bytes.fromhex('e66038b7135a4f2d')
+
+
+def idle():
+    clock.poll()
+
+
+def lightsleep(ms=None):
+    if ms is not None:
+        clock.advance(ms / 1000)
+
+
+deepsleep = lightsleep
+
+
+def disable_irq():
+    return 0
+
+
+def enable_irq(state=0):
+    pass
+
+
+def time_pulse_us(pin, pulse_level, timeout_us=1000000):
+    '''Times the pulse from the simulated times of its edges, so the result
+    is exact whatever the polling step.'''
+    sim = _sim()
+    edges = []
+
+    def edge(p, level, t):
+        edges.append((level, t))
+    sim.watch(pin.id, edge)
+    try:
+        start = sim.time_now()
+        deadline = start + sim.to_time(timeout_us * 1e-6)
+        began = start if sim.pins.level(pin.id) == pulse_level else None
+        while True:
+            for level, t in edges:
+                if began is None:
+                    if level == pulse_level:
+                        began = t
+                elif level != pulse_level:
+                    return int(sim.seconds(t - began) * 1e6)
+            del edges[:]
+            left = deadline - sim.time_now()
+            if left <= 0:
+                return -2 if began is None else -1
+            clock.advance(min(sim.seconds(left), 50e-6))
+    finally:
+        sim.pins.watchers[pin.id].remove(edge)
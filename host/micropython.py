@@ -0,0 +1,53 @@
+# CPython
+'''micropython for the host. The code emitters are plain Python here.'''
+
+import clock
+
+
+def const(value):
+    return value
+
+
+def native(fn):
+    return fn
+
+
+viper = native
+asm_thumb = native
+
+
+def schedule(fn, arg):
+    '''Runs fn(arg) soon, from the main loop, as a soft interrupt would.'''
+    clock.call_later(0, fn, arg)
+
+
+def alloc_emergency_exception_buf(size):
+    pass
+
+
+def opt_level(level=None):
+    return 0 if level is None else None
+
+
+def mem_info(verbose=False):
+    print('mem: not tracked on the host')
+
+
+def qstr_info(verbose=False):
+    pass
+
+
+def stack_use():
+    return 0
+
+
+def heap_lock():
+    return 0
+
+
+def heap_unlock():
+    return 0
+
+
+def kbd_intr(char):
+    pass
@@ -0,0 +1,35 @@
+# CPython
+'''rp2 for the host: PIO programs are assembled and run by pio_sim on the
+virtual clock. There is no rp2.DMA, so code that checks for it takes its
+CPU path.'''
+
+import clock
+import pio_sim
+from pio_sim import asm_pio, asm_pio_encode
+
+
+class StateMachine(pio_sim.StateMachine):
+    '''pio_sim's StateMachine, with the status queries counted as polls so
+    that loops waiting on them move the clock.'''
+
+    def active(self, value=None):
+        if value is None:
+            clock.poll()
+        return super().active(value)
+
+    def rx_fifo(self):
+        clock.poll()
+        return super().rx_fifo()
+
+    def tx_fifo(self):
+        clock.poll()
+        return super().tx_fifo()
+
+
+class PIO(pio_sim.PIO):
+    def state_machine(self, index, program=None, *args, **kwargs):
+        return StateMachine(self.id * 4 + index, program, *args, **kwargs)
+
+
+def bootsel_button():
+    return 0
@@ -0,0 +1,91 @@
+# CPython
+'''Runs one of the board scripts on Linux against the stand-ins in this
+directory and the device models in devices.py, on a virtual clock:
+
+    python host/run.py read_temperature.py
+    python host/run.py sensor_testbed.py --celsius 19.5 --humidity 60
+    python host/run.py --realtime ssd1306_benchmark.py
+    python host/run.py host/checks.py
+
+The script runs unchanged as __main__. This directory goes first on
+sys.path so its machine, rp2, utime, micropython, uos and framebuf are the
+ones imported; the repository root comes next for the drivers. At the end
+the OLED's contents are drawn as text and the virtual time is compared
+with how long the run took.
+
+By default Python code takes no virtual time, so benchmarks that time
+driver code with utime report nothing useful. Run those with --realtime,
+where the clock follows time.perf_counter() and only sleeps and bus
+transfers skip ahead:
+
+    ssd1306_benchmark.py       needs --realtime
+    bitmap_font_benchmark.py   needs --realtime
+    ssd1306_async_benchmark.py either mode; virtual counts the bus alone
+    mcp9808_benchmark.py       either mode; it times with the host counter
+    pio_stream_benchmark.py    neither, see below
+
+asyncio runs on the virtual clock too, so asyncio.sleep() and utime agree
+in both modes.
+
+pio_stream_benchmark.py weighs Python against PIO speed, and the simulated
+PIO is far too slow for that in either mode. In virtual mode it runs and
+reports the PIO side alone: interrupt handlers take no time, so no rate
+underruns.'''
+
+import argparse
+import os
+import runpy
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('script', help='the board script to run')
+    parser.add_argument('--celsius', type=float, default=23.0, help='temperature every sensor sees')
+    parser.add_argument('--humidity', type=int, default=45, help='relative humidity for the DHT11')
+    parser.add_argument('--no-oled', action='store_true', help='leave the display off the bus')
+    parser.add_argument('--no-dht', action='store_true', help='leave the DHT11 off GP15')
+    parser.add_argument('--quiet', action='store_true', help="don't draw the OLED at the end")
+    parser.add_argument('--realtime', action='store_true',
+                        help='let Python code take the time it takes on the host, for benchmarks')
+    args = parser.parse_args(argv)
+
+    sys.path[:0] = [HERE, ROOT]
+    import asyncio
+    import clock
+    import devices
+    asyncio.set_event_loop_policy(clock.EventLoopPolicy())
+    clock.use_realtime(args.realtime)
+    clock.reset()
+    devices.reset()
+    parts = devices.pico_board(args.celsius, args.humidity, oled=not args.no_oled, dht=not args.no_dht)
+
+    script = os.path.abspath(args.script)
+    if not os.path.exists(script):
+        script = os.path.join(ROOT, args.script)
+    sys.argv = [script]
+    started = time.perf_counter()
+    try:
+        runpy.run_path(script, run_name='__main__')
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            print(f'stopped: {e.code}')
+    finally:
+        real = time.perf_counter() - started
+        oled = parts.get('oled')
+        if oled is not None and not args.quiet:
+            print()
+            print('OLED:')
+            print(oled.render())
+            print(f'({oled.transactions} transactions, {oled.data_bytes} data bytes)')
+        virtual = clock.now()
+        print(f'virtual time {virtual:.3f} s, real time {real:.3f} s'
+              f' ({virtual / real if real else 0:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+# CPython
+'''uos for the host. uname() reports a Pico so board detection picks the
+rp2 pins; the file functions use the host's file system.'''
+
+import os as _os
+from collections import namedtuple
+
+uname_result = namedtuple('uname_result', ('sysname', 'nodename', 'release', 'version', 'machine'))
+
+
+def uname():
+    return uname_result('rp2', 'rp2', '1.22.0', 'v1.22.0 on host', 'Raspberry Pi Pico with RP2040')
+
+
+def ilistdir(path='.'):
+    for entry in _os.scandir(path):
+        yield (entry.name, 0x4000 if entry.is_dir() else 0x8000, 0)
+
+
+listdir = _os.listdir
+mkdir = _os.mkdir
+remove = _os.remove
+rename = _os.rename
+rmdir = _os.rmdir
+stat = _os.stat
+statvfs = _os.statvfs
+getcwd = _os.getcwd
+chdir = _os.chdir
+urandom = _os.urandom
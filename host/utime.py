@@ -0,0 +1,69 @@
+# CPython
+'''utime for the host, on the virtual clock in clock.py. Ticks wrap the
+way they do on the Pico, so code that gets ticks_diff() wrong fails here
+too.'''
+
+import calendar
+import time as _time
+import clock
+
+TICKS_PERIOD = 1 << 30
+_TICKS_MASK = TICKS_PERIOD - 1
+_TICKS_HALF = TICKS_PERIOD // 2
+
+
+def ticks_ms():
+    clock.poll()
+    return int(clock.now() * 1000) & _TICKS_MASK
+
+
+def ticks_us():
+    clock.poll()
+    return int(clock.now() * 1000000) & _TICKS_MASK
+
+
+def ticks_cpu():
+    clock.poll()
+    s = clock.sim()
+    return (s.time_now() >> 8) & _TICKS_MASK
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & _TICKS_MASK
+
+
+def ticks_diff(ticks1, ticks2):
+    return ((ticks1 - ticks2 + _TICKS_HALF) & _TICKS_MASK) - _TICKS_HALF
+
+
+def sleep(seconds):
+    clock.advance(seconds)
+
+
+def sleep_ms(ms):
+    clock.advance(ms / 1000)
+
+
+def sleep_us(us):
+    clock.advance(us / 1000000)
+
+
+def time():
+    return clock.epoch + int(clock.now())
+
+
+def time_ns():
+    return clock.epoch * 1000000000 + int(clock.now() * 1e9)
+
+
+def gmtime(secs=None):
+    '''(year, month, mday, hour, minute, second, weekday, yearday)'''
+    t = _time.gmtime(time() if secs is None else secs)
+    return (t.tm_year, t.tm_mon, t.tm_mday, t.tm_hour, t.tm_min, t.tm_sec, t.tm_wday, t.tm_yday)
+
+
+localtime = gmtime # the Pico's RTC has no time zone
+
+
+def mktime(t):
+    return calendar.timegm((t[0], t[1], t[2], t[3], t[4], t[5], 0, 0, 0))
@@ -0,0 +1,126 @@
+# Micropython
+'''Compiles LED sequences for the run-length encoded Four_LEDs programs.
+
+A sequence is a list of (state, ticks) steps: state is the nibble shown on
+the four LEDs and ticks is how long it is held. Each step is packed into 16
+bits, the state in the top 4 bits and ticks - 1 in the low 12, two steps per
+32 bit word with the first step in the high half. The PIO program outs the
+state to the pins, outs the count into y and waits y + 1 ticks of
+TICK_CYCLES cycles, so holding a state for a long time costs one step
+instead of a run of repeated nibbles.
+
+Everything here is plain Python, so sequences can be built and checked on
+a PC.'''
+
+from array import array
+
+TICK_CYCLES = 33 # cycles per tick of the delay loop, nop() [31] + jmp
+STEP_CYCLES = 2 # the two out() instructions of each step
+MAX_TICKS = 4096 # longest step, longer holds are split
+
+
+def ticks_for_ms(ms, freq):
+    '''Ticks closest to ms milliseconds at a state machine frequency.'''
+    return max(1, round(ms * freq / (1000 * TICK_CYCLES)))
+
+
+def compile_steps(steps, loop=True):
+    '''Packs (state, ticks) steps into an array('I') for Four_LEDs with
+    rle=True. A word holds two steps, so an odd number of steps is made
+    even by splitting a step in two. With loop=True a sequence that can't be
+    split is doubled instead, which plays the same when repeated.'''
+    packed = []
+    for state, ticks in steps:
+        if not 0 <= state <= 0xF:
+            raise ValueError(f'State {state} does not fit in 4 bits')
+        if ticks < 1:
+            raise ValueError('Steps must last at least one tick')
+        while ticks > MAX_TICKS:
+            packed.append([state, MAX_TICKS])
+            ticks -= MAX_TICKS
+        packed.append([state, ticks])
+
+    if len(packed) & 1:
+        for ii in range(len(packed)):
+            if packed[ii][1] > 1:
+                state, ticks = packed[ii]
+                packed[ii][1] = ticks >> 1
+                packed.insert(ii + 1, [state, ticks - (ticks >> 1)])
+                break
+        else:
+            if loop:
+                packed = packed + packed
+            else:
+                packed.append([packed[-1][0], 1])
+
+    words = array('I', [0] * (len(packed) >> 1))
+    for ii in range(0, len(packed), 2):
+        first = (packed[ii][0] << 12) | (packed[ii][1] - 1)
+        second = (packed[ii + 1][0] << 12) | (packed[ii + 1][1] - 1)
+        words[ii >> 1] = (first << 16) | second
+    return words
+
+
+def decode_words(words):
+    '''Unpacks compiled words back into (state, ticks) steps.'''
+    steps = []
+    for word in words:
+        for half in (word >> 16, word & 0xFFFF):
+            steps.append((half >> 12, (half & 0xFFF) + 1))
+    return steps
+
+
+def from_nibble_words(words, ticks_per_nibble=1):
+    '''Converts the hand-encoded pattern words of Four_LEDs, eight nibbles
+    per word shown for equal times, into steps. Runs of the same nibble are
+    merged into one step.'''
+    steps = []
+    for word in words:
+        for shift in range(28, -4, -4):
+            state = (word >> shift) & 0xF
+            if steps and steps[-1][0] == state:
+                steps[-1] = (state, steps[-1][1] + ticks_per_nibble)
+            else:
+                steps.append((state, ticks_per_nibble))
+    return steps
+
+
+def knight_rider(ticks, end_ticks=None):
+    '''A light sweeping back and forth, pausing at each end.'''
+    if end_ticks is None:
+        end_ticks = ticks
+    return [(0x1, end_ticks), (0x2, ticks), (0x4, ticks), (0x8, end_ticks), (0x4, ticks), (0x2, ticks)]
+
+
+def countdown(start, ticks):
+    '''Counts down in binary from start to 0, then flashes all LEDs.'''
+    steps = [(value, ticks) for value in range(start, -1, -1)]
+    steps.append((0xF, ticks >> 1 or 1))
+    steps.append((0x0, ticks >> 1 or 1))
+    return steps
+
+
+def duration_cycles(steps):
+    '''Cycles the PIO program takes to play the steps once.'''
+    return sum(ticks * TICK_CYCLES + STEP_CYCLES for _, ticks in steps)
+
+
+if __name__ == "__main__":
+    # A slow Knight Rider sweep at 2 kHz, a step every 100 ms and half a
+    # second at each end
+    freq = 2000
+    steps = knight_rider(ticks_for_ms(100, freq), ticks_for_ms(500, freq))
+    words = compile_steps(steps)
+    assert decode_words(words) == steps
+    print(f'Knight Rider: {len(steps)} steps in {len(words)} words, '
+          f'{duration_cycles(steps) / freq:.2f} s per sweep')
+
+    # The same kind of sweep hand-encoded as equal-time nibbles
+    hand = (0x11111111, 0x11111111, 0x24888888, 0x88888888, 0x42000000)
+    merged = from_nibble_words(hand)
+    assert merged == [(0x1, 16), (0x2, 1), (0x4, 1), (0x8, 14), (0x4, 1), (0x2, 1), (0x0, 6)]
+    print(f'Hand-encoded sweep: {len(hand)} words as nibbles, {len(compile_steps(merged))} words compiled')
+
+    long_hold = compile_steps([(0xF, 10000), (0x0, 1)])
+    assert decode_words(long_hold) == [(0xF, 4096), (0xF, 4096), (0xF, 1808), (0x0, 1)]
+    print(f'Countdown from 15: {len(compile_steps(countdown(15, ticks_for_ms(1000, freq))))} words')
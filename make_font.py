@@ -0,0 +1,222 @@
+# CPython
+'''Makes font files for bitmap_font.py. Run this on a PC and copy the output
+to the board's flash. The seven segment generator and font_bytes() also run
+under MicroPython, which bitmap_font_benchmark.py uses to build a font in RAM.
+
+Fonts can come from three sources:
+    a built-in seven segment digit font of any height, needs nothing else
+    a BDF bitmap font, needs nothing else
+    a TrueType/OpenType font at a given pixel size, needs Pillow
+
+Examples:
+    python make_font.py --seven-segment 24 digits24.fnt
+    python make_font.py --bdf helvR14.bdf --chars "0123456789.-: C" helv14.fnt
+    python make_font.py --ttf DejaVuSans.ttf --size 16 dejavu16.fnt'''
+
+import struct
+
+MAGIC = b'MVF1'
+DIGITS = '0123456789.-: C'
+
+
+def pack_glyph(rows, width, height):
+    '''Packs a glyph given as a list of rows of 0/1 pixels into MONO_VLSB
+    bytes: one byte per column for each 8 pixel page, LSB at the top.'''
+    data = bytearray(((height + 7) // 8) * width)
+    for y in range(height):
+        for x in range(width):
+            if rows[y][x]:
+                data[(y >> 3) * width + x] |= 1 << (y & 7)
+    return bytes(data)
+
+
+def font_bytes(height, glyphs):
+    '''Returns the contents of a font file. glyphs maps each char to
+    (width, rows).'''
+    codes = sorted(ord(ch) for ch in glyphs)
+    first = codes[0]
+    count = codes[-1] - first + 1
+    # The header stores each of these in one byte
+    if height > 255:
+        raise ValueError('Font height %d is over 255 pixels' % height)
+    if first > 255:
+        raise ValueError('First char %r (code %d) is above 255; the file format '
+                         'starts fonts at codes 0-255' % (chr(first), first))
+    if count > 255:
+        raise ValueError('Chars %r to %r span %d codes, over 255'
+                         % (chr(first), chr(codes[-1]), count))
+    table = bytearray()
+    data = bytearray()
+    offset = 7 + count * 3
+    for code in range(first, first + count):
+        ch = chr(code)
+        if ch not in glyphs:
+            table += struct.pack('<BH', 0, 0)
+            continue
+        width, rows = glyphs[ch]
+        packed = pack_glyph(rows, width, height)
+        table += struct.pack('<BH', width, offset + len(data))
+        data += packed
+    if offset + len(data) > 0xFFFF:
+        raise ValueError('Font too large for the file format')
+    return MAGIC + bytes((height, first, count)) + table + data
+
+
+def write_font(path, height, glyphs):
+    '''Writes a font file and returns its size.'''
+    data = font_bytes(height, glyphs)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return len(data)
+
+
+# Segments of a seven segment digit
+#  aaa
+# f   b
+#  ggg
+# e   c
+#  ddd
+SEGMENTS = {
+    '0': 'abcdef', '1': 'bc', '2': 'abdeg', '3': 'abcdg', '4': 'bcfg',
+    '5': 'acdfg', '6': 'acdefg', '7': 'abc', '8': 'abcdefg', '9': 'abcdfg',
+    '-': 'g', 'C': 'adef',
+}
+
+
+def seven_segment(height):
+    '''Draws the DIGITS chars as seven segment glyphs.'''
+    t = max(2, height // 8) # segment thickness
+    w = max(height * 9 // 16, 2 * t + 2)
+    gap = max(1, t // 2) # space between glyphs
+    mid = (height - t) // 2
+    bars = {
+        'a': (t, 0, w - 2 * t, t),
+        'g': (t, mid, w - 2 * t, t),
+        'd': (t, height - t, w - 2 * t, t),
+        'f': (0, t, t, mid - t),
+        'b': (w - t, t, t, mid - t),
+        'e': (0, mid + t, t, height - t - mid - t),
+        'c': (w - t, mid + t, t, height - t - mid - t),
+    }
+
+    def blank(width):
+        return [[0] * width for _ in range(height)]
+
+    def fill(rows, x, y, bw, bh):
+        for yy in range(y, y + bh):
+            for xx in range(x, x + bw):
+                rows[yy][xx] = 1
+
+    glyphs = {}
+    for ch, segs in SEGMENTS.items():
+        rows = blank(w + gap)
+        for seg in segs:
+            fill(rows, *bars[seg])
+        glyphs[ch] = (w + gap, rows)
+    rows = blank(t + gap)
+    fill(rows, 0, height - t, t, t)
+    glyphs['.'] = (t + gap, rows)
+    rows = blank(t + gap)
+    fill(rows, 0, height // 3 - t // 2, t, t)
+    fill(rows, 0, 2 * height // 3 - t // 2, t, t)
+    glyphs[':'] = (t + gap, rows)
+    glyphs[' '] = (w // 2, blank(w // 2))
+    return height, glyphs
+
+
+def read_bdf(path, chars):
+    '''Reads the given chars from a BDF font. Glyphs are placed in cells of
+    the font's bounding box height, aligned on the baseline.'''
+    with open(path) as f:
+        lines = f.read().splitlines()
+    height = ascent = None
+    glyphs = {}
+    ii = 0
+    while ii < len(lines):
+        words = lines[ii].split()
+        ii += 1
+        if not words:
+            continue
+        if words[0] == 'FONTBOUNDINGBOX':
+            height = int(words[2])
+            ascent = height + int(words[4])
+        elif words[0] == 'STARTCHAR':
+            code = advance = bbx = None
+            while lines[ii].split()[0] != 'BITMAP':
+                words = lines[ii].split()
+                if words[0] == 'ENCODING':
+                    code = int(words[1])
+                elif words[0] == 'DWIDTH':
+                    advance = int(words[1])
+                elif words[0] == 'BBX':
+                    bbx = [int(v) for v in words[1:5]]
+                ii += 1
+            ii += 1
+            bitmap = []
+            while lines[ii].strip() != 'ENDCHAR':
+                bitmap.append(int(lines[ii], 16))
+                ii += 1
+            ii += 1
+            if code is None or code < 0 or chr(code) not in chars:
+                continue
+            bw, bh, xoff, yoff = bbx
+            width = max(advance, xoff + bw)
+            rows = [[0] * width for _ in range(height)]
+            top = ascent - (yoff + bh)
+            row_bits = (bw + 7) // 8 * 8
+            for yy, bits in enumerate(bitmap):
+                for xx in range(bw):
+                    if bits & (1 << (row_bits - 1 - xx)) and 0 <= top + yy < height and xoff + xx >= 0:
+                        rows[top + yy][xoff + xx] = 1
+            glyphs[chr(code)] = (width, rows)
+    if height is None:
+        raise ValueError(f'{path} is not a BDF font')
+    return height, glyphs
+
+
+def read_ttf(path, size, chars):
+    '''Rasterizes the given chars of a TrueType/OpenType font with Pillow.'''
+    try:
+        from PIL import Image, ImageDraw, ImageFont
+    except ImportError:
+        raise SystemExit('Converting TrueType fonts needs Pillow: pip install pillow')
+    font = ImageFont.truetype(path, size)
+    ascent, descent = font.getmetrics()
+    height = ascent + descent
+    glyphs = {}
+    for ch in chars:
+        width = max(1, round(font.getlength(ch)))
+        image = Image.new('L', (width, height), 0)
+        ImageDraw.Draw(image).text((0, 0), ch, font=font, fill=255)
+        pixels = image.load()
+        rows = [[1 if pixels[x, y] >= 128 else 0 for x in range(width)] for y in range(height)]
+        glyphs[ch] = (width, rows)
+    return height, glyphs
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Makes font files for bitmap_font.py')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--seven-segment', type=int, metavar='HEIGHT', help='built-in seven segment digits')
+    source.add_argument('--bdf', metavar='FILE', help='BDF font to convert')
+    source.add_argument('--ttf', metavar='FILE', help='TrueType/OpenType font to convert (needs Pillow)')
+    parser.add_argument('--size', type=int, default=16, help='pixel size for --ttf')
+    parser.add_argument('--chars', default=DIGITS, help=f'chars to include, default "{DIGITS}"')
+    parser.add_argument('output', help='font file to write')
+    args = parser.parse_args()
+
+    if args.seven_segment:
+        height, glyphs = seven_segment(args.seven_segment)
+    elif args.bdf:
+        height, glyphs = read_bdf(args.bdf, args.chars)
+    else:
+        height, glyphs = read_ttf(args.ttf, args.size, args.chars)
+    if not glyphs:
+        raise SystemExit('None of the chars are in the font')
+    size = write_font(args.output, height, glyphs)
+    print(f'{args.output}: {len(glyphs)} glyphs, {height} pixels high, {size} bytes')
+
+
+if __name__ == "__main__":
+    main()
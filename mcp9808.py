@@ -1,5 +1,17 @@
 # Imports
-from machine import I2C
+import utime
+from array import array
+from micropython import const
+try:
+    from ulab import numpy as np
+except ImportError:
+    try:
+        import numpy as np
+    except ImportError:
+        np = None
+if np is not None:
+    # ulab names its float type float, single or double precision by build
+    _FLOAT = np.float32 if hasattr(np, 'float32') else np.float
 
 
 # Register pointers
@@ -13,12 +25,20 @@ REG_DEVIDE_ID = const(7)
 REG_RESOLUTION = const(8)
 
 
+# Addresses the sensor can be strapped to with A0-A2
+ADDR_FIRST = const(0x18)
+ADDR_LAST = const(0x1F)
+
+
 # Sensor resolution values
 TEMP_RESOLUTION_MIN = const(0) # +0.5 C, refresh rate 30 ms
 TEMP_RESOLUTION_LOW = const(1) # +0.25 C, refresh rate 65 ms
 TEMP_RESOLUTION_AVG = const(2) # +0.125 C, refresh rate 130 ms
 TEMP_RESOLUTION_MAX = const(3) # +0.0625 C, refresh rate 250 ms [Default]
 
+# Conversion time in ms, indexed by the resolution value
+CONVERSION_TIME_MS = (30, 65, 130, 250)
+
 
 # Alert selectors
 ALERT_SELECT_ALL = const(0) # ambient > upper || ambient > critical || ambient < lower [Default]
@@ -34,6 +54,133 @@ ALERT_POLARITY_AHIGH = const(1) # Active-high
 ALERT_OUTPUT_COMPARATOR = const(0)
 ALERT_OUTPUT_INTERRUPT = const(1)
 
+
+# Alert cause flags in the upper bits of the ambient temperature register
+ALERT_FLAG_CRIT = const(0x8000) # Ambient temp >= critical
+ALERT_FLAG_UPPER = const(0x4000) # Ambient temp > upper
+ALERT_FLAG_LOWER = const(0x2000) # Ambient temp < lower
+ALERT_FLAGS = const(0xE000)
+
+
+# Identification register contents
+MANUFACTURER_ID = b'\x00T'
+DEVICE_ID = b'\x04\x00'
+
+
+# Config LSB bits that are not kept in the shadow copy. The alert status is
+# owned by the sensor and the interrupt clear bit always reads back as 0.
+CONFIG_VOLATILE_BITS = const(0x30)
+
+
+def decode_temp(raw):
+    """
+    Convert a raw ambient temperature register word, as returned by
+    MCP9808.get_temp_raw(), to degrees celsius.
+    """
+    temp = (raw & 0x0fff) / 16
+    if raw & 0x1000 == 0x1000:
+        temp -= 256
+    return temp
+
+
+def decode_temp_centi(raw):
+    """
+    Convert a raw ambient temperature register word to an integer number of
+    hundredths of a degree celsius, rounded down. No floats are involved.
+    """
+    t = raw & 0x1fff
+    if t & 0x1000:
+        t -= 0x2000
+    return (t * 25) >> 2 # t/16 degrees = t*6.25 centi-degrees
+
+
+def decode_temps_centi(src, dst=None):
+    """
+    Bulk version of decode_temp_centi(). Decodes every raw word in src, for
+    example the samples array of a stream, into dst and returns dst. If dst
+    is not given a new array('h') is created; passing src itself decodes in
+    place as long as src has a signed type such as array('h') or array('i').
+
+    Vectorised with ulab on the board or NumPy on a host, where available,
+    otherwise a plain loop that allocates nothing. ulab has no 32 bit
+    integers, so the vectorised path works in floats, which hold every
+    value exactly: the low 13 bits, the sign and the 6.25 centi-degree steps
+    all stay below 2**24. It allocates a few arrays of len(src) floats.
+    """
+    n = len(src)
+    if dst is None:
+        dst = array('h', [0] * n)
+    if np is None or n == 0:
+        return _decode_temps_centi_loop(src, dst)
+    f = np.array(src, dtype=_FLOAT)
+    t = f - np.floor(f / 8192) * 8192 # raw & 0x1fff, for signed src too
+    t = np.where(t >= 4096, t - 8192, t)
+    c = np.array(np.floor(t * 6.25), dtype=np.int16)
+    if isinstance(dst, array) and dst.typecode == 'h':
+        np.frombuffer(dst, dtype=np.int16)[:n] = c
+    else:
+        for ii in range(n):
+            dst[ii] = int(c[ii])
+    return dst
+
+
+def _decode_temps_centi_loop(src, dst):
+    """
+    decode_temps_centi() without ulab or NumPy.
+    """
+    for ii in range(len(src)):
+        t = src[ii] & 0x1fff
+        if t & 0x1000:
+            t -= 0x2000
+        dst[ii] = (t * 25) >> 2
+    return dst
+
+
+def encode_temp_centi(centi):
+    """
+    Convert hundredths of a degree celsius to an alert boundary register
+    word. Boundaries have a resolution of 0.25 C; the value is truncated
+    towards zero.
+    """
+    if centi >= 0:
+        quarters = centi // 25
+    else:
+        quarters = -(-centi // 25)
+    return (quarters << 2) & 0x1ffc
+
+
+def _bus_access(i2c):
+    """
+    Picks the bus backend once so the register access methods don't have to
+    probe the I2C object on every call. Returns functions that read and
+    write a register as read(addr, reg, buf) and write(addr, reg, buf), each
+    in one transaction.
+    """
+    if hasattr(i2c, "readfrom_mem_into"):
+        # Micropython machine.I2C
+        return i2c.readfrom_mem_into, i2c.writeto_mem
+    if hasattr(i2c, "mem_read"):
+        # PyBoard Micropython
+        def read(addr, reg, buf):
+            i2c.mem_read(buf, addr, reg)
+
+        def write(addr, reg, buf):
+            i2c.mem_write(buf, addr, reg)
+        return read, write
+    raise ValueError('I2C object needed as argument!')
+
+
+def _read_ids(read, addr, buf):
+    """
+    Reads the manufacturer and device ID registers of the device at addr
+    and returns them as a tuple of bytes.
+    """
+    read(addr, REG_MANUFACTURER_ID, buf)
+    m_id = bytes(buf)
+    read(addr, REG_DEVIDE_ID, buf)
+    return m_id, bytes(buf)
+
+
 class MCP9808(object):
     """
     This class implements an interface to the MCP9808 temprature sensor from
@@ -45,52 +192,82 @@ class MCP9808(object):
         Initialize a sensor object on the given I2C bus and accessed by the
         given address.
         """
-        if i2c == None or i2c.__class__ != I2C:
-            raise ValueError('I2C object needed as argument!')
+        self._read_mem, self._write_mem = _bus_access(i2c)
         self._i2c = i2c
         self._addr = addr
+        # Preallocated buffers so that steady-state reads don't allocate
+        self._buf = memoryview(bytearray(2))
+        self._buf1 = self._buf[:1]
+        self._wbuf = bytearray(2)
+        # Staging buffer for writes to shadowed registers. The shadow copy
+        # is only updated once the write has gone through.
+        self._sbuf = bytearray(2)
+        # Bus transactions avoided thanks to the shadow registers (compared
+        # to a pointer/read/write cycle), and the number of writes that were
+        # dropped because nothing changed.
+        self.saved_transactions = 0
+        self.skipped_writes = 0
         self._check_device()
 
-    def _send(self, buf):
+    def _read_reg(self, reg, buf):
         """
-        Sends the given bufer object over I2C to the sensor.
+        Reads len(buf) bytes from the given register into buf. The register
+        pointer write and the read share one transaction (repeated start).
         """
-        if hasattr(self._i2c, "writeto"):
-            # Micropython
-            self._i2c.writeto(self._addr, bytearray([buf]))
-        elif hasattr(self._i2c, "send"):
-            # PyBoard Micropython
-            self._i2c.send(self._addr, buf)
-        else:
-            raise Exception("Invalid I2C object. Unknown Micropython/platform?")
+        self._read_mem(self._addr, reg, buf)
 
-    def _recv(self, n):
+    def _write_reg(self, reg, buf):
         """
-        Read bytes from the sensor using I2C. The byte count must be specified
-        as an argument.
-        Returns a bytearray containing the result.
+        Writes the contents of buf to the given register in one transaction.
         """
-        if hasattr(self._i2c, "writeto"):
-            # Micropython (PyCom)
-            return self._i2c.readfrom(self._addr, n)
-        elif hasattr(self._i2c, "send"):
-            # PyBoard Micropython
-            return self._i2c.recv(n, self._addr)
-        else:
-            raise Exception("Invalid I2C object. Unknown Micropython/platform?")
+        self._write_mem(self._addr, reg, buf)
 
     def _check_device(self):
         """
-        Tries to identify the manufacturer and device identifiers.
+        Tries to identify the manufacturer and device identifiers and fills
+        the shadow copies of the writable registers.
         """
-        self._send(REG_MANUFACTURER_ID)
-        self._m_id = self._recv(2)
-        if not self._m_id == b'\x00T':
+        self._m_id, self._d_id = _read_ids(self._read_mem, self._addr, self._buf)
+        if not self._m_id == MANUFACTURER_ID:
             raise Exception("Invalid manufacturer ID: '%s'!" % self._m_id)
-        self._send(REG_DEVIDE_ID)
-        self._d_id = self._recv(2)
-        if not self._d_id == b'\x04\x00':
+        if not self._d_id == DEVICE_ID:
             raise Exception("Invalid device or revision ID: '%s'!" % self._d_id)
+        self.sync()
+
+    def sync(self):
+        """
+        Re-reads the config, resolution and alert boundary registers into the
+        shadow copies. Only needed if something other than this object may
+        have changed the sensor configuration.
+        """
+        self._config = bytearray(2)
+        self._read_reg(REG_CONFIG, self._config)
+        self._config[1] &= ~CONFIG_VOLATILE_BITS
+        self._read_reg(REG_RESOLUTION, self._buf1)
+        self._resolution = self._buf1[0] & 0x03
+        self._boundaries = {}
+        for reg in (REG_TEMP_BOUNDARY_UPPER, REG_TEMP_BOUNDARY_LOWER, REG_TEMP_BOUNDARY_CRITICAL):
+            self._boundaries[reg] = bytearray(2)
+            self._read_reg(reg, self._boundaries[reg])
+
+    def _write_config(self, msb, lsb):
+        """
+        Writes the config register unless the shadow copy shows that it
+        already holds the given value. The read half of the usual
+        read-modify-write cycle is never needed.
+        """
+        lsb &= ~CONFIG_VOLATILE_BITS
+        if self._config[0] == msb and self._config[1] == lsb:
+            self.skipped_writes += 1
+            self.saved_transactions += 3
+            return
+        b = self._sbuf
+        b[0] = msb
+        b[1] = lsb
+        self._write_reg(REG_CONFIG, b)
+        self._config[0] = msb
+        self._config[1] = lsb
+        self.saved_transactions += 2
 
     def set_shutdown_mode(self, shdn=True):
         """
@@ -99,16 +276,11 @@ class MCP9808(object):
         """
         if shdn.__class__ != bool:
             raise ValueError('Boolean argument needed to set shutdown mode!')
-        self._send(REG_CONFIG)
-        cfg = self._recv(2)
-        b = bytearray()
-        b.append(REG_CONFIG)
+        cfg = self._config
         if shdn:
-            b.append(cfg[0] | 1)
+            self._write_config(cfg[0] | 1, cfg[1])
         else:
-            b.append(cfg[0] & ~1)
-        b.append(cfg[1])
-        self._send(b)
+            self._write_config(cfg[0] & ~1, cfg[1])
 
     def set_alert_mode(self, enable_alert=True, output_mode=ALERT_OUTPUT_INTERRUPT, polarity=ALERT_POLARITY_ALOW, selector=ALERT_SELECT_ALL):
         """
@@ -128,29 +300,22 @@ class MCP9808(object):
             raise ValueError("Invalid alert polarity set.")
         
         enable_alert = 1 if enable_alert else 0 
-        self._send(REG_CONFIG)
-        cfg = self._recv(2)
+        cfg = self._config
 
         alert_bits = (output_mode | (polarity << 1) | (selector << 2) | (enable_alert << 3)) & 0xF
         lsb_data = (cfg[1] & 0xF0) | alert_bits
 
-        b = bytearray()
-        b.append(REG_CONFIG)
-        b.append(cfg[0])
-        b.append(lsb_data)
-        self._send(b)
+        self._write_config(cfg[0], lsb_data)
 
     def acknowledge_alert_irq(self):
         """
         Must be called if MCP9808 is operating in interrupt output mode
         """
-        self._send(REG_CONFIG)
-        cfg = self._recv(2)
-        b = bytearray()
-        b.append(REG_CONFIG)
-        b.append(cfg[0]) # MSB data
-        b.append(cfg[1] | 0x20) # LSB data with interrupt clear bit set
-        self._send(b)  
+        b = self._wbuf
+        b[0] = self._config[0] # MSB data
+        b[1] = self._config[1] | 0x20 # LSB data with interrupt clear bit set
+        self._write_reg(REG_CONFIG, b)
+        self.saved_transactions += 2
 
     def set_alert_boundary_temp(self, boundary_register, value):
         """
@@ -161,19 +326,18 @@ class MCP9808(object):
         if value < -128 or value > 127: # 8 bit two's complement
             raise ValueError("Temperature out of range [-128, 127]")
 
-        integral = int(value)
-        frac = abs(value - integral)
-        if integral < 0:
-            integral = (1 << 9) + integral
-        integral = ((integral & 0x1FF) << 4) 
-        frac = (((1 if frac * 2 >= 1 else 0) << 1) + (1 if (frac * 2 - int(frac * 2)) * 2 >= 1 else 0)) << 2
-        twos_value = (integral + frac if value >= 0 else integral - frac) & 0x1ffc 
-        b = bytearray()
-        b.append(boundary_register)
-        b.append((twos_value & 0xFF00) >> 8)
-        b.append(twos_value & 0xFF)
-        self._send(b)
-        
+        twos_value = encode_temp_centi(round(value * 100))
+        shadow = self._boundaries[boundary_register]
+        if shadow[0] == (twos_value & 0xFF00) >> 8 and shadow[1] == twos_value & 0xFF:
+            self.skipped_writes += 1
+            self.saved_transactions += 1
+            return
+        b = self._sbuf
+        b[0] = (twos_value & 0xFF00) >> 8
+        b[1] = twos_value & 0xFF
+        self._write_reg(boundary_register, b)
+        shadow[0] = b[0]
+        shadow[1] = b[1]
 
     def set_resolution(self, r):
         """
@@ -181,24 +345,29 @@ class MCP9808(object):
         """
         if r not in [TEMP_RESOLUTION_MIN, TEMP_RESOLUTION_LOW, TEMP_RESOLUTION_AVG, TEMP_RESOLUTION_MAX]:
             raise ValueError('Invalid temperature resolution requested!')
-        b = bytearray()
-        b.append(REG_RESOLUTION)
-        b.append(r)
-        self._send(b)
+        if self._resolution == r:
+            self.skipped_writes += 1
+            self.saved_transactions += 1
+            return
+        self._buf1[0] = r
+        self._write_reg(REG_RESOLUTION, self._buf1)
+        self._resolution = r
+
+    def get_temp_raw(self):
+        """
+        Read the ambient temperature register and return it as a 16 bit
+        integer, alert flag bits included. This is the allocation-free fast
+        path: one combined bus transaction into a preallocated buffer.
+        """
+        buf = self._buf
+        self._read_reg(REG_TEMP, buf)
+        return (buf[0] << 8) | buf[1]
 
     def get_temp(self):
         """
         Read temperature in degree celsius and return float value.
         """
-        self._send(REG_TEMP)
-        raw = self._recv(2)
-        u = (raw[0] & 0x0f) << 4
-        l = raw[1] / 16
-        if raw[0] & 0x10 == 0x10:
-            temp = (u + l) - 256
-        else:
-            temp = u + l
-        return temp
+        return decode_temp(self.get_temp_raw())
 
     def get_temp_int(self):
         """
@@ -208,26 +377,31 @@ class MCP9808(object):
         This method does avoid floating point arithmetic completely to support
         platforms missing float support.
         """
-        self._send(REG_TEMP)
-        raw = self._recv(2)
-        u = (raw[0] & 0xf) << 4
-        l = raw[1] >> 4
-        if raw[0] & 0x10 == 0x10:
-            temp = (u + l) - 256
-            frac = -((raw[1] & 0x0f) * 100 >> 4)
-        else:
-            temp = u + l
-            frac = (raw[1] & 0x0f) * 100 >> 4
+        raw = self.get_temp_raw()
+        temp = (raw & 0x0fff) >> 4
+        frac = (raw & 0x0f) * 100 >> 4
+        if raw & 0x1000 == 0x1000:
+            temp -= 256
+            frac = -frac
         return temp, frac
 
+    def stream(self, size=32, count=None):
+        """
+        Returns an iterator that yields one raw temperature word per
+        conversion of the current resolution. The samples are also kept in
+        a ring buffer of the given size. If count is given the iterator stops
+        after that many samples.
+        """
+        return MCP9808Stream(self, size, count)
+
     def _debug_config(self, cfg=None):
         """
         Prints the first 9 bits of the config register mapped to human
         readable descriptions
         """
         if not cfg:
-            self._send(REG_CONFIG)
-            cfg = self._recv(2)
+            cfg = bytearray(2)
+            self._read_reg(REG_CONFIG, cfg)
         
         # meanings[a][b] with a the bit index (LSB order),
         # b=0 the config description and b={bit value}+1 the value description 
@@ -247,4 +421,288 @@ class MCP9808(object):
         for i in range(0, min(len(meanings), len(cfg)*8)):
             part = 0 if i > 7 else 1
             value = 1 if (cfg[part] & (2**(i % 8))) > 0 else 0
-            print(meanings[i][0] + ": " + meanings[i][1 + value])
\ No newline at end of file
+            print(meanings[i][0] + ": " + meanings[i][1 + value])
+
+
+class MCP9808Stream(object):
+    """
+    Iterator over the sensor's temperature conversions. Each step sleeps
+    until the next conversion of the active resolution is due (30 to 250 ms),
+    reads the raw register word and stores it in a fixed-size array('H')
+    ring buffer. Words are only decoded when latest() or temps() is called.
+
+    The pacing follows set_resolution() changes on the fly. In shutdown mode
+    the sensor stops converting, so the stream would repeat the last value.
+    """
+
+    def __init__(self, sensor, size=32, count=None):
+        self._sensor = sensor
+        self.samples = array('H', [0] * size)
+        self._size = size
+        self._head = 0 # next slot to write
+        self.count = 0 # total samples taken
+        self._remaining = count
+        self._due = utime.ticks_ms()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._remaining is not None:
+            if self._remaining <= 0:
+                raise StopIteration
+            self._remaining -= 1
+        wait = utime.ticks_diff(self._due, utime.ticks_ms())
+        if wait > 0:
+            utime.sleep_ms(wait)
+        raw = self._sensor.get_temp_raw()
+        # Schedule from the previous due time so the pacing doesn't drift,
+        # unless the consumer fell behind by more than a whole period.
+        period = CONVERSION_TIME_MS[self._sensor._resolution]
+        self._due = utime.ticks_add(self._due, period)
+        if utime.ticks_diff(self._due, utime.ticks_ms()) < 0:
+            self._due = utime.ticks_add(utime.ticks_ms(), period)
+        self.samples[self._head] = raw
+        self._head = (self._head + 1) % self._size
+        self.count += 1
+        return raw
+
+    def __len__(self):
+        """
+        Number of samples held in the ring buffer.
+        """
+        return min(self.count, self._size)
+
+    def latest(self):
+        """
+        Returns the most recent sample in degrees celsius, or None if no
+        sample has been taken yet.
+        """
+        if self.count == 0:
+            return None
+        return decode_temp(self.samples[(self._head - 1) % self._size])
+
+    def temps(self):
+        """
+        Returns the buffered samples in degrees celsius, oldest first.
+        """
+        n = len(self)
+        start = (self._head - n) % self._size
+        return [decode_temp(self.samples[(start + ii) % self._size]) for ii in range(n)]
+
+
+class MCP9808Bus(object):
+    """
+    Handles all MCP9808 sensors on one I2C bus. The valid address range is
+    probed once and the IDs of every sensor found are checked in the same
+    pass; devices at those addresses with other IDs are left out. After
+    that, sweep() reads every sensor back to back into a
+    preallocated array of raw words and records the read latency of each
+    device. Per-sensor work is one bus transaction and no allocations.
+    """
+
+    def __init__(self, i2c=None, addrs=None):
+        """
+        Probe the given addresses, or the whole 0x18-0x1F range, for sensors.
+        Addresses that don't answer are skipped, and so are devices that
+        answer with other IDs; their addresses are kept in self.others.
+        """
+        self._read_mem, self._write_mem = _bus_access(i2c)
+        self._i2c = i2c
+        self._buf = memoryview(bytearray(2))
+        self._buf1 = self._buf[:1]
+        if addrs is None:
+            addrs = range(ADDR_FIRST, ADDR_LAST + 1)
+
+        found = []
+        others = []
+        self.resolution = TEMP_RESOLUTION_MIN
+        for addr in addrs:
+            try:
+                ids = _read_ids(self._read_mem, addr, self._buf)
+            except OSError:
+                continue # nothing at this address
+            if ids != (MANUFACTURER_ID, DEVICE_ID):
+                others.append(addr) # some other device
+                continue
+            self._read_mem(addr, REG_RESOLUTION, self._buf1)
+            self.resolution = max(self.resolution, self._buf1[0] & 0x03)
+            found.append(addr)
+
+        self.addrs = tuple(found)
+        self.others = tuple(others)
+        self.readings = array('H', [0] * len(found))
+        self.latency_us = array('I', [0] * len(found))
+
+    def __len__(self):
+        return len(self.addrs)
+
+    def set_resolution(self, r):
+        """
+        Sets the temperature resolution of every sensor on the bus.
+        """
+        if r not in [TEMP_RESOLUTION_MIN, TEMP_RESOLUTION_LOW, TEMP_RESOLUTION_AVG, TEMP_RESOLUTION_MAX]:
+            raise ValueError('Invalid temperature resolution requested!')
+        self._buf1[0] = r
+        for addr in self.addrs:
+            self._write_mem(addr, REG_RESOLUTION, self._buf1)
+        self.resolution = r
+
+    def sweep(self):
+        """
+        Reads the ambient temperature register of every sensor. Returns the
+        readings array, which holds one raw word per entry of self.addrs and
+        is reused by the next sweep. The time each read took is stored in
+        self.latency_us.
+        """
+        buf = self._buf
+        read = self._read_mem
+        readings = self.readings
+        latency = self.latency_us
+        addrs = self.addrs
+        for ii in range(len(addrs)):
+            start = utime.ticks_us()
+            read(addrs[ii], REG_TEMP, buf)
+            latency[ii] = utime.ticks_diff(utime.ticks_us(), start)
+            readings[ii] = (buf[0] << 8) | buf[1]
+        return readings
+
+    def sweeps(self, count=None):
+        """
+        Generator that runs one sweep per conversion period of the slowest
+        resolution on the bus and yields the readings array each time.
+        """
+        due = utime.ticks_ms()
+        while count is None or count > 0:
+            wait = utime.ticks_diff(due, utime.ticks_ms())
+            if wait > 0:
+                utime.sleep_ms(wait)
+            else:
+                # A slow sweep or consumer left the schedule behind. Restart
+                # it from now rather than sweeping back to back to catch up.
+                due = utime.ticks_ms()
+            due = utime.ticks_add(due, CONVERSION_TIME_MS[self.resolution])
+            if count is not None:
+                count -= 1
+            yield self.sweep()
+
+    def temps(self):
+        """
+        Returns the readings of the last sweep in degrees celsius.
+        """
+        return [decode_temp(raw) for raw in self.readings]
+
+
+class MCP9808Monitor(object):
+    """
+    Watches the sensor's ALERT output with a pin interrupt instead of
+    polling, so there is no I2C traffic until a boundary is crossed. When the
+    pin fires, the temperature register is read once, the alert cause is
+    taken from its flag bits and, in interrupt output mode, the alert is
+    acknowledged. Each event is passed to callback(flags, raw) and queued
+    for next_event().
+
+    The pin is any object with an irq() method and IRQ_FALLING/IRQ_RISING
+    constants, usually a machine.Pin. Pin callbacks are soft interrupts by
+    default, which is needed because the handler talks to the bus.
+    """
+
+    def __init__(self, sensor, pin, callback=None, output_mode=ALERT_OUTPUT_INTERRUPT,
+                 polarity=ALERT_POLARITY_ALOW, selector=ALERT_SELECT_ALL, queue_size=8):
+        """
+        Enable alerts on the sensor and attach the handler to the pin.
+        Program the boundaries with set_alert_boundary_temp() first.
+        """
+        self._sensor = sensor
+        self._pin = pin
+        self.callback = callback
+        self._output_mode = output_mode
+        self._events = array('H', [0] * queue_size)
+        self._head = 0 # oldest queued event
+        self._pending = 0
+        self.dropped = 0 # events lost because the queue was full
+        self._flag = None # created by next_event()
+        # The handler reads into its own buffer so it can't overwrite a read
+        # the main loop has in progress in the sensor's buffer
+        self._buf = bytearray(2)
+
+        if output_mode == ALERT_OUTPUT_COMPARATOR:
+            # The output stays asserted while out of bounds, so the
+            # releasing edge reports the return to normal.
+            trigger = pin.IRQ_FALLING | pin.IRQ_RISING
+        elif polarity == ALERT_POLARITY_ALOW:
+            trigger = pin.IRQ_FALLING
+        else:
+            trigger = pin.IRQ_RISING
+        pin.irq(handler=self._handler, trigger=trigger)
+        # Enabled after the handler is attached, so an output that is
+        # active straight away still gets its edge seen
+        sensor.set_alert_mode(True, output_mode, polarity, selector)
+
+    def stop(self):
+        """
+        Detach the pin interrupt and disable the sensor's alert output.
+        """
+        self._pin.irq(handler=None)
+        self._sensor.set_alert_mode(False)
+
+    def _handler(self, pin):
+        buf = self._buf
+        self._sensor._read_reg(REG_TEMP, buf)
+        raw = (buf[0] << 8) | buf[1]
+        if self._output_mode == ALERT_OUTPUT_INTERRUPT:
+            self._sensor.acknowledge_alert_irq()
+
+        size = len(self._events)
+        if self._pending == size:
+            # Drop the oldest event to make room
+            self._head = (self._head + 1) % size
+            self._pending -= 1
+            self.dropped += 1
+        self._events[(self._head + self._pending) % size] = raw
+        self._pending += 1
+
+        if self.callback:
+            self.callback(raw & ALERT_FLAGS, raw)
+        if self._flag:
+            self._flag.set()
+
+    def pending(self):
+        """
+        Number of queued events.
+        """
+        return self._pending
+
+    def get_event(self):
+        """
+        Removes the oldest queued event and returns it as a tuple of the
+        alert flags and the raw temperature word, or returns None if the
+        queue is empty.
+        """
+        if self._pending == 0:
+            return None
+        raw = self._events[self._head]
+        self._head = (self._head + 1) % len(self._events)
+        self._pending -= 1
+        return raw & ALERT_FLAGS, raw
+
+    async def next_event(self):
+        """
+        Waits for the next event and returns it like get_event(). Works with
+        uasyncio on the board and asyncio on the host.
+        """
+        try:
+            import uasyncio as asyncio
+        except ImportError:
+            import asyncio
+        if self._flag is None:
+            if hasattr(asyncio, 'ThreadSafeFlag'):
+                # Safe to set from an interrupt handler and clears itself
+                self._flag = asyncio.ThreadSafeFlag()
+            else:
+                self._flag = asyncio.Event()
+        while self._pending == 0:
+            await self._flag.wait()
+            if isinstance(self._flag, asyncio.Event):
+                self._flag.clear()
+        return self.get_event()
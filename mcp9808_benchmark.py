@@ -0,0 +1,185 @@
+# Micropython
+'''Microbenchmark for MCP9808 temperature reads. Compares the original
+pointer-write/STOP/read path, which allocates a new buffer on every call, with
+the driver's combined-transaction fast path. Both run against FakeI2C so no
+sensor is needed and the numbers only reflect the Python side of the driver.
+
+For each path it prints calls per second, heap bytes allocated per call and
+how many garbage collections ran during the timed loop. It also times
+decoding a log of 10k raw samples one float at a time, with the
+allocation-free integer loop, and vectorised by decode_temps_centi() when
+ulab or NumPy is there, which is compared with the loop.
+
+On a PC run it with host/run.py, which supplies utime and micropython. The
+timings then come from time.perf_counter_ns(), since the host utime runs on
+a virtual clock, and the bytes per call column shows '-' because CPython
+has no gc.mem_alloc().'''
+
+import gc
+import utime
+from array import array
+import mcp9808
+from mcp9808 import MCP9808, REG_TEMP, decode_temp, decode_temps_centi
+
+try:
+    from time import perf_counter_ns
+except ImportError:
+    perf_counter_ns = None
+
+
+def ticks_us():
+    '''Microseconds of real time, from the host's counter where there is one.'''
+    if perf_counter_ns is not None:
+        return perf_counter_ns() // 1000
+    return utime.ticks_us()
+
+
+def ticks_diff(end, start):
+    if perf_counter_ns is not None:
+        return end - start
+    return utime.ticks_diff(end, start)
+
+
+class FakeI2C():
+    '''Stands in for machine.I2C with an MCP9808 register file behind it.
+    Supports both the plain writeto/readfrom calls and the combined register
+    calls. Like the real bus, readfrom() returns a new bytes object.'''
+
+    def __init__(self, temp=0x0194):
+        self.regs = {
+            1: bytearray(2),                    # config
+            2: bytearray(2),                    # upper boundary
+            3: bytearray(2),                    # lower boundary
+            4: bytearray(2),                    # critical boundary
+            5: bytearray((temp >> 8, temp & 0xFF)),
+            6: bytearray(b'\x00T'),             # manufacturer ID
+            7: bytearray(b'\x04\x00'),          # device ID
+            8: bytearray(b'\x03'),              # resolution
+        }
+        self.pointer = 0
+        self.transactions = 0
+
+    def writeto(self, addr, buf):
+        self.transactions += 1
+        self.pointer = buf[0]
+        reg = self.regs[self.pointer]
+        for ii in range(1, len(buf)):
+            reg[ii - 1] = buf[ii]
+
+    def readfrom(self, addr, n):
+        self.transactions += 1
+        return bytes(self.regs[self.pointer][:n])
+
+    def readfrom_mem_into(self, addr, memaddr, buf):
+        self.transactions += 1
+        reg = self.regs[memaddr]
+        for ii in range(len(buf)):
+            buf[ii] = reg[ii]
+
+    def writeto_mem(self, addr, memaddr, buf):
+        self.transactions += 1
+        reg = self.regs[memaddr]
+        for ii in range(len(buf)):
+            reg[ii] = buf[ii]
+
+
+def legacy_get_temp(i2c, addr):
+    '''The read path the driver used before the fast path was added.'''
+    if hasattr(i2c, "writeto"):
+        i2c.writeto(addr, bytearray([REG_TEMP]))
+    if hasattr(i2c, "writeto"):
+        raw = i2c.readfrom(addr, 2)
+    u = (raw[0] & 0x0f) << 4
+    l = raw[1] / 16
+    if raw[0] & 0x10 == 0x10:
+        temp = (u + l) - 256
+    else:
+        temp = u + l
+    return temp
+
+
+def run(label, fn, n):
+    '''Times n calls of fn and prints the results.'''
+    # Heap bytes per call, measured with the collector switched off
+    bytes_per_call = None
+    if hasattr(gc, 'mem_alloc'):
+        gc.collect()
+        gc.disable()
+        before = gc.mem_alloc()
+        for _ in range(100):
+            fn()
+        bytes_per_call = (gc.mem_alloc() - before) / 100
+        gc.enable()
+
+    gc.collect()
+    if hasattr(gc, 'get_stats'):
+        # CPython keeps a count of collections per generation
+        before = sum(s['collections'] for s in gc.get_stats())
+        start = ticks_us()
+        for _ in range(n):
+            fn()
+        elapsed = ticks_diff(ticks_us(), start)
+        collections = sum(s['collections'] for s in gc.get_stats()) - before
+    else:
+        # MicroPython has no counter but the allocated heap shrinks
+        # whenever a collection runs
+        collections = 0
+        last = gc.mem_alloc()
+        start = ticks_us()
+        for _ in range(n):
+            fn()
+            now = gc.mem_alloc()
+            if now < last:
+                collections += 1
+            last = now
+        elapsed = ticks_diff(ticks_us(), start)
+
+    rate = n * 1000000 // max(elapsed, 1)
+    per_call = '-' if bytes_per_call is None else bytes_per_call
+    print(f'{label:<22} {rate:>9} calls/s  {per_call} bytes/call  {collections} collections')
+
+
+def run_decode(n):
+    '''Times decoding n logged raw samples per sample, with the loop and
+    vectorised.'''
+    raws = array('H', [(0x0194 + ii) & 0x1fff for ii in range(n)])
+    out = array('h', [0] * n)
+
+    start = ticks_us()
+    temps = [decode_temp(raw) for raw in raws]
+    elapsed = ticks_diff(ticks_us(), start)
+    print(f'decode_temp() x {n:<8} {elapsed / 1000:>9.1f} ms')
+
+    start = ticks_us()
+    mcp9808._decode_temps_centi_loop(raws, out)
+    loop = ticks_diff(ticks_us(), start)
+    print(f'integer loop {n:<11} {loop / 1000:>9.1f} ms')
+
+    if mcp9808.np is None:
+        print('decode_temps_centi() runs the loop: no ulab or NumPy')
+        return
+    start = ticks_us()
+    decode_temps_centi(raws, out)
+    elapsed = ticks_diff(ticks_us(), start)
+    print(f'decode_temps_centi() {n:<5} {elapsed / 1000:>9.1f} ms, '
+          f'{loop / max(elapsed, 1):.1f}x the loop')
+
+
+if __name__ == "__main__":
+    N = 5000
+    i2c = FakeI2C()
+    sensor = MCP9808(i2c)
+    addr = 0x18
+
+    run('legacy get_temp()', lambda: legacy_get_temp(i2c, addr), N)
+    run('fast get_temp()', sensor.get_temp, N)
+    run('fast get_temp_raw()', sensor.get_temp_raw, N)
+
+    i2c.transactions = 0
+    legacy_get_temp(i2c, addr)
+    print(f'Bus transactions per read: legacy {i2c.transactions}', end='')
+    i2c.transactions = 0
+    sensor.get_temp_raw()
+    print(f', fast {i2c.transactions}')
+
+    run_decode(10000)
@@ -0,0 +1,58 @@
+# Micropython
+'''Retained-mode text for an SSD1306 OLED. Instead of clearing the screen and
+redrawing every line on each refresh, TextLines remembers the string shown on
+each 8 pixel line and only redraws the lines whose text changed. Together
+with the driver's dirty-page tracking, an unchanged status screen costs no
+bus traffic at all.'''
+
+
+class TextLines():
+    '''Keeps one string per 8 pixel text line of an SSD1306.'''
+
+    def __init__(self, oled, num_lines=None):
+        self.oled = oled
+        self.width = oled.logical_width
+        if num_lines is None:
+            num_lines = oled.logical_height // 8
+        self.lines = [''] * num_lines
+        # In portrait mode text lines don't line up with panel pages, so
+        # the driver has to find the changed pages itself
+        self.portrait = oled.portrait is not None
+        self.dirty_pages = 0
+        self.redraws = 0 # lines redrawn since creation
+
+    def __len__(self):
+        return len(self.lines)
+
+    def write(self, line_num, s):
+        '''Sets the text of a line. The line is only redrawn if the text
+        differs from what is already shown. Returns True if it was redrawn.'''
+        if self.lines[line_num] == s:
+            return False
+        self.lines[line_num] = s
+        y = line_num * 8
+        self.oled.fill_rect(0, y, self.width, 8, 0)
+        self.oled.text(s, 0, y)
+        self.dirty_pages |= 1 << line_num
+        self.redraws += 1
+        return True
+
+    def write_lines(self, lines):
+        '''Sets the text of the first len(lines) lines and blanks the rest.'''
+        for ii in range(len(self.lines)):
+            self.write(ii, lines[ii] if ii < len(lines) else '')
+
+    def clear(self):
+        '''Blanks every line.'''
+        for ii in range(len(self.lines)):
+            self.write(ii, '')
+
+    def show(self):
+        '''Sends the lines that changed since the last show() to the
+        display. Does nothing on the bus if no line changed.'''
+        if self.portrait:
+            pages = None if self.dirty_pages else 0
+        else:
+            pages = self.dirty_pages
+        self.dirty_pages = 0
+        self.oled.show(pages=pages)
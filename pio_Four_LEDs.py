@@ -1,11 +1,28 @@
 #!/usr/bin/env python3
 '''Example of how to use PIO to control four LEDs. Demonstrates how to wrap a PIO
-program as a member of a python class.'''
+program as a member of a python class.
+
+By default the PIO program raises an interrupt after every 32 bit word and a
+Python handler puts the next one. At high rates Python can't keep up and
+the pattern stalls. With stream=True the patterns are packed into an
+array('I') and fed to a joined 8 word TX FIFO in bulk: by DMA on ports
+that have rp2.DMA, otherwise by a timer that tops the FIFO up. Either way
+there's one interrupt per buffer or per FIFO refill, not one per word.
+Underruns are detected with the PIO's TXSTALL flag.
+
+With rle=True the patterns are run-length encoded steps made by
+led_sequence.compile_steps(): each 16 bits hold a nibble and how many ticks
+to show it for, so long holds don't need repeated nibbles.'''
 
 import time
-from machine import Pin
+from array import array
+from machine import Pin, Timer, mem32
 import rp2
 from rp2 import StateMachine, asm_pio
+from led_sequence import TICK_CYCLES, STEP_CYCLES, decode_words
+import pio_regs
+
+FIFO_DEPTH = 8 # TX FIFO depth when joined
 
 class Four_LEDs():
     '''Provides a way to feed an arbitrary length pattern to a collection
@@ -15,14 +32,25 @@ class Four_LEDs():
     By using different patterns of nibbles, you can create a variety of effects
     like a Ceylon, Knight Rider, or a countdown timer.'''
     
-    def __init__(self, patterns=(0x0,), loops=1, delay_mult=5, freq=2000, out_base=None):
+    def __init__(self, patterns=(0x0,), loops=1, delay_mult=5, freq=2000, out_base=None,
+                 stream=False, sm_id=0, rle=False):
         self.patterns = patterns
         self.loops = loops
         self.out_base = out_base
-        self.sm = rp2.StateMachine(0, self.prog, freq=freq, out_base=out_base, set_base=out_base)
-
-        self.sm.exec(f'set(x,{delay_mult})') # set the delay multiplier
+        self.stream = stream
+        self.rle = rle
+        self.freq = freq
+        self.delay_mult = delay_mult
         self.count = 0
+        self.underruns = 0
+        if stream:
+            self._start_stream(sm_id)
+            return
+        program = self.rle_prog if rle else self.prog
+        self.sm = rp2.StateMachine(sm_id, program, freq=freq, out_base=out_base, set_base=out_base)
+
+        if not rle:
+            self.sm.exec(f'set(x,{delay_mult})') # set the delay multiplier
         self.sm.irq(self.ISR)
         self.sm.put(patterns[0])
         self.sm.active(1)
@@ -42,9 +70,161 @@ class Four_LEDs():
         nop()         [T]
         jmp(y_dec, "delay_loop")
         jmp(not_osre, "next_nibble")
-        irq(0)  # Tell the ISR that we need our next value
+        irq(rel(0))  # Tell this state machine's ISR that we need our next value
         jmp("next_nibble")
 
+    @rp2.asm_pio(out_init=(rp2.PIO.OUT_LOW,)*4,
+                 set_init=(rp2.PIO.OUT_LOW,)*4,
+                 autopull=True,
+                 fifo_join=rp2.PIO.JOIN_TX)
+    def stream_prog():
+        '''Same as prog() but without the interrupt per word. Autopull takes
+        words from the joined FIFO; if it runs dry the last nibble is held
+        until more arrive.'''
+        T = 31
+        wrap_target()
+        out(pins, 4)
+        mov(y,x)
+        label("delay_loop")
+        nop()         [T]
+        jmp(y_dec, "delay_loop")
+        wrap()
+
+    @rp2.asm_pio(out_init=(rp2.PIO.OUT_LOW,)*4,
+                 set_init=(rp2.PIO.OUT_LOW,)*4,
+                 autopull=True)
+    def rle_prog():
+        '''Version of prog() for run-length encoded steps. Each step is a
+        nibble for the pins followed by a 12 bit count of ticks - 1.'''
+        label("next_step")
+        out(pins, 4)
+        out(y, 12)
+
+        T = 31
+        label("delay_loop")
+        nop()         [T]
+        jmp(y_dec, "delay_loop")
+        jmp(not_osre, "next_step")
+        irq(rel(0))  # Tell this state machine's ISR that we need our next value
+        jmp("next_step")
+
+    @rp2.asm_pio(out_init=(rp2.PIO.OUT_LOW,)*4,
+                 set_init=(rp2.PIO.OUT_LOW,)*4,
+                 autopull=True,
+                 fifo_join=rp2.PIO.JOIN_TX)
+    def rle_stream_prog():
+        '''Version of stream_prog() for run-length encoded steps.'''
+        T = 31
+        wrap_target()
+        out(pins, 4)
+        out(y, 12)
+        label("delay_loop")
+        nop()         [T]
+        jmp(y_dec, "delay_loop")
+        wrap()
+
+    def word_cycles(self):
+        '''Cycles the program takes to play each word of the patterns, when
+        it never waits for data.'''
+        # jmp(not_osre) after each nibble or step of the ISR-fed programs
+        extra = 0 if self.stream else 1
+        if not self.rle:
+            return [8 * (2 + TICK_CYCLES * (self.delay_mult + 1) + extra)] * len(self.patterns)
+        steps = decode_words(self.patterns)
+        return [steps[ii][1] * TICK_CYCLES + STEP_CYCLES + extra
+                + steps[ii + 1][1] * TICK_CYCLES + STEP_CYCLES + extra
+                for ii in range(0, len(steps), 2)]
+
+    def nibble_rate(self):
+        '''Nibbles per second the program runs at with the current freq and
+        delay_mult, when it never waits for data. With rle=True, steps per
+        second averaged over the patterns.'''
+        per_word = 2 if self.rle else 8
+        return self.freq * per_word * len(self.patterns) / sum(self.word_cycles())
+
+    def _start_stream(self, sm_id):
+        self.buf = array('I', self.patterns)
+        self.mv = memoryview(self.buf)
+        self.index = 0 # next word to send when feeding by timer
+        self.feeding = True
+        self.fdebug = pio_regs.fdebug(sm_id)
+        self.stall_bit = pio_regs.txstall_bit(sm_id)
+        program = self.rle_stream_prog if self.rle else self.stream_prog
+        self.sm = rp2.StateMachine(sm_id, program, freq=self.freq,
+                                   out_base=self.out_base, set_base=self.out_base)
+        if not self.rle:
+            self.sm.exec(f'set(x,{self.delay_mult})') # set the delay multiplier
+        self.dma = None
+        self.timer = None
+        if hasattr(rp2, 'DMA'):
+            # The PIO's TX DREQ paces the DMA, one interrupt per buffer
+            self.dma = rp2.DMA()
+            self.ctrl = self.dma.pack_ctrl(size=2, inc_write=False, irq_quiet=False,
+                                           treq_sel=pio_regs.dreq(sm_id))
+            self.dma.irq(self._dma_done)
+            self.dma.config(read=self.buf, write=self.sm, count=len(self.buf),
+                            ctrl=self.ctrl, trigger=True)
+        else:
+            self._top_up(None)
+            # Top the FIFO up when about half of it has been played, going
+            # by its fastest words
+            fifo_ms = FIFO_DEPTH * min(self.word_cycles()) * 1000 / self.freq
+            self.timer = Timer(period=max(1, int(fifo_ms / 2)), mode=Timer.PERIODIC,
+                               callback=self._top_up)
+        mem32[self.fdebug] = self.stall_bit # clear the stall flag
+        self.sm.active(1)
+
+    def _check_underrun(self):
+        if mem32[self.fdebug] & self.stall_bit:
+            self.underruns += 1
+            mem32[self.fdebug] = self.stall_bit
+
+    def _buffer_done(self):
+        '''Counts a whole pass through the patterns. Returns False once the
+        requested number of loops has been queued.'''
+        self.count += 1
+        if self.loops > 0 and self.count >= self.loops:
+            self.feeding = False
+        return self.feeding
+
+    def _dma_done(self, dma):
+        self._check_underrun()
+        if self._buffer_done():
+            dma.read = self.buf
+            dma.count = len(self.buf)
+            dma.active(1)
+
+    def _top_up(self, timer):
+        '''Fills the free FIFO slots with the next words of the patterns.'''
+        if not self.feeding:
+            return
+        if timer is not None:
+            self._check_underrun()
+        sm = self.sm
+        free = FIFO_DEPTH - sm.tx_fifo()
+        while free > 0:
+            n = min(free, len(self.buf) - self.index)
+            sm.put(self.mv[self.index:self.index + n])
+            free -= n
+            self.index += n
+            if self.index == len(self.buf):
+                self.index = 0
+                if not self._buffer_done():
+                    if self.timer is not None:
+                        self.timer.deinit()
+                    return
+
+    def done(self):
+        '''True when the whole pattern has been played.'''
+        if not self.stream:
+            return not self.sm.active()
+        # Once everything has been queued, the program stalls after the
+        # last nibble. The FIFO is read first so that every call polls the
+        # state machine; a top-up in between clears the stall flag.
+        queued = self.sm.tx_fifo()
+        return (not self.feeding and queued == 0
+                and mem32[self.fdebug] & self.stall_bit)
+
     def ISR(self,sm):
         '''Interrupt service routine that feeds the next word of the pattern
         into the PIO prog.'''
@@ -57,6 +237,13 @@ class Four_LEDs():
 
     def stop(self):
         '''Stops the state machine and turns off the LEDs.'''
+        if self.stream:
+            self.feeding = False
+            if self.dma is not None:
+                self.dma.active(0)
+                self.dma.close()
+            if self.timer is not None:
+                self.timer.deinit()
         self.sm.active(0)
         self.sm.exec('set(pins,0x0)')
 
@@ -74,8 +261,23 @@ if __name__ == "__main__":
     #patterns = (0x42184218)
 
     blinker = Four_LEDs(patterns=patterns, loops=3, delay_mult=1, out_base=Pin(25)) #,freq=8000)
-    while blinker.sm.active():
+    while not blinker.done():
         pass
 
-    #blinker.stop()
+    # The same pattern streamed from a buffer, fast enough that the ISR
+    # version would stall
+    blinker = Four_LEDs(patterns=patterns, loops=1000, delay_mult=0, freq=1000000,
+                        out_base=Pin(25), stream=True)
+    while not blinker.done():
+        pass
+    blinker.stop()
+    print(f'Streamed at {blinker.nibble_rate():.0f} nibbles/s, {blinker.underruns} underruns')
+
+    # A slow Knight Rider sweep with pauses at the ends, three words per sweep
+    from led_sequence import compile_steps, knight_rider, ticks_for_ms
+    sweep = compile_steps(knight_rider(ticks_for_ms(100, 2000), ticks_for_ms(500, 2000)))
+    blinker = Four_LEDs(patterns=sweep, loops=5, freq=2000, out_base=Pin(25), stream=True, rle=True)
+    while not blinker.done():
+        pass
+    blinker.stop()
     print('Finished')
@@ -2,6 +2,7 @@
 '''Demonstrates basic use of PIO to blink four LEDs. The pattern of the blink is
 defined by a tuple or list of 32 bit words.'''
 import time
+import rp2
 from rp2 import StateMachine, asm_pio
 from machine import Pin
 
@@ -0,0 +1,133 @@
+# Micropython
+'''Clock divider and cycle count arithmetic for PIO waveforms. Pure integer
+and float code with no hardware access, so it can be checked on a PC.
+
+A PIO state machine runs at sys_freq / div, where div is a 16.8 fixed point
+number from 1 to 65536. The waveform program in waveform.py spends
+high + 2 cycles with the pin high and low + 2 cycles with it low, where high
+and low are the values loaded into its Y register and OSR, so a period is any
+whole number of cycles from MIN_PERIOD up. solve() picks the divider and
+the cycle counts that come closest to a requested frequency and duty cycle.
+
+A fractional divider stretches some cycles by one sys clock, which adds
+jitter, so for equal frequency error an integer divider is preferred.'''
+
+from collections import namedtuple
+
+SYS_FREQ = 125000000
+MIN_PERIOD = 4 # cycles, 2 high and 2 low
+MAX_DIV = 65536
+# Longest period tried with each divider. Longer periods only help
+# at low frequencies, which are handled with a divider of 1.
+MAX_SEARCH = 4096
+
+# The result of solve(). div_int and div_frac make the divider
+# div_int + div_frac / 256; high and low are the register values for the
+# waveform program; freq and duty are what that achieves and error_ppm the
+# frequency error in parts per million.
+Setting = namedtuple('Setting', ('div_int', 'div_frac', 'high', 'low', 'freq', 'duty', 'error_ppm'))
+
+
+def divider(div_int, div_frac=0):
+    '''The divider as a number.'''
+    return div_int + div_frac / 256
+
+
+def clkdiv_register(div_int, div_frac=0):
+    '''The value for a state machine's CLKDIV register. A divider of 65536
+    is written as 0.'''
+    return ((div_int & 0xFFFF) << 16) | (div_frac << 8)
+
+
+def split_period(period, duty):
+    '''Splits a period in cycles into (high, low) register values for a
+    duty cycle. Each half gets at least 2 cycles.'''
+    high_cycles = min(max(round(period * duty), 2), period - 2)
+    return high_cycles - 2, period - high_cycles - 2
+
+
+def evaluate(div256, period, freq, duty, sys_freq=SYS_FREQ):
+    '''Builds the Setting for a divider in 256ths and a period in cycles.'''
+    high, low = split_period(period, duty)
+    actual = sys_freq * 256 / (div256 * period)
+    return Setting(div256 >> 8, div256 & 0xFF, high, low, actual,
+                   (high + 2) / period, (actual - freq) * 1e6 / freq)
+
+
+def solve(freq, duty=0.5, sys_freq=SYS_FREQ, integer_only=False, max_search=MAX_SEARCH):
+    '''Finds the divider and period closest to freq. Among settings with the
+    same frequency error it prefers an integer divider, then the smallest
+    duty cycle error. Raises ValueError if freq can't be reached.'''
+    # The period in 256ths of a sys clock cycle
+    target = sys_freq * 256 / freq
+    if target < 256 * MIN_PERIOD:
+        raise ValueError(f'{freq} Hz is above the highest PIO waveform frequency {sys_freq // MIN_PERIOD} Hz')
+    # Sys clock cycles in a period, if whole. Only periods that divide it
+    # can be hit exactly with an integer divider.
+    whole = int(sys_freq / freq) if sys_freq % freq == 0 else 0
+
+    # The best candidate so far, kept as plain numbers so that trying one
+    # allocates nothing; the Setting is only built for the winner
+    found = False
+    best_div = best_period = 0
+    best_err = best_duty_err = 0.0
+    best_frac = False
+
+    def consider(div256, period):
+        nonlocal found, best_div, best_period, best_err, best_duty_err, best_frac
+        if period < MIN_PERIOD or period > 0xFFFFFFFF + 4 or not 256 <= div256 <= MAX_DIV * 256:
+            return
+        actual = sys_freq * 256 / (div256 * period)
+        # errors within a thousandth of a ppm count as equal
+        err = round(abs(actual - freq) * 1e6 / freq, 3)
+        frac = div256 & 0xFF != 0
+        # split_period() inline, without its tuple
+        high_cycles = min(max(round(period * duty), 2), period - 2)
+        duty_err = abs(high_cycles / period - duty)
+        if found:
+            if err != best_err:
+                if err > best_err:
+                    return
+            elif frac != best_frac:
+                if frac:
+                    return
+            elif duty_err >= best_duty_err:
+                return
+        found = True
+        best_div = div256
+        best_period = period
+        best_err = err
+        best_duty_err = duty_err
+        best_frac = frac
+
+    for period in range(MIN_PERIOD, min(int(target / 256), max_search) + 1):
+        if found and best_err == 0 and not best_frac:
+            # Exact with an integer divider: only another such setting with
+            # a closer duty cycle can do better
+            if best_duty_err == 0:
+                break
+            if whole and whole % period:
+                continue
+        ideal = target / period
+        div_int = round(ideal / 256)
+        consider(div_int * 256, period)
+        if not integer_only:
+            consider(round(ideal), period)
+    # Long periods at full speed for low frequencies
+    period = round(target / 256)
+    consider(256, period)
+    if not found:
+        raise ValueError(f'{freq} Hz is below the lowest PIO waveform frequency')
+    return evaluate(best_div, best_period, freq, duty, sys_freq)
+
+
+if __name__ == "__main__":
+    for freq, duty in ((1, 0.5), (4000, 0.5), (38000, 0.33), (1000000, 0.5), (7372800, 0.5), (31250000, 0.5)):
+        s = solve(freq, duty)
+        print(f'{freq:>9} Hz {duty:.2f}: div {s.div_int}+{s.div_frac}/256 period {s.high + s.low + 4:>9} cycles '
+              f'-> {s.freq:.3f} Hz duty {s.duty:.3f} error {s.error_ppm:+.3f} ppm')
+    assert solve(4000).error_ppm == 0 and solve(4000).div_frac == 0
+    assert solve(31250000).high == 0
+    s = solve(7372800, integer_only=True)
+    assert s.div_frac == 0
+    assert clkdiv_register(65536, 0) == 0 and clkdiv_register(2, 128) == 0x00028000
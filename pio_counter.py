@@ -0,0 +1,122 @@
+# Micropython
+'''Measures the high and low periods of a signal on an input pin with a PIO
+state machine, so PWM and PIO outputs can be checked without an
+oscilloscope by looping them back to an input.
+
+The program counts down X in a two cycle loop while the pin is high, pushes
+the count, then does the same while it's low. Running at the full system
+clock that resolves a half period to 16 ns at 125 MHz. The RX FIFO is joined
+to 8 words. Counts are collected in bulk into an array('I'): by DMA on
+ports that have rp2.DMA, otherwise with sm.get() into slices of the array
+as words arrive. signal_stats turns the counts into frequency, duty cycle
+and jitter.'''
+
+import machine
+import utime
+import rp2
+from array import array
+from machine import Pin
+from rp2 import PIO, StateMachine, asm_pio
+import signal_stats
+import pio_regs
+
+FIFO_DEPTH = 8 # RX FIFO depth when joined
+
+
+@asm_pio(fifo_join=PIO.JOIN_RX)
+def period_counter():
+    wait(0, pin, 0)             # start on a rising edge
+    wait(1, pin, 0)
+    wrap_target()
+    mov(x, invert(null))
+    label('high')
+    jmp(x_dec, 'high_next')     # count, x never reaches 0
+    label('high_next')
+    jmp(pin, 'high')            # two cycles per count while high
+    mov(isr, invert(x))
+    push(block)
+    mov(x, invert(null))
+    label('low')
+    jmp(pin, 'rose')
+    jmp(x_dec, 'low')           # two cycles per count while low
+    label('rose')
+    mov(isr, invert(x))
+    push(block)
+    wrap()
+
+
+class PeriodCounter():
+    '''Measures the signal on pin with state machine sm_id.'''
+
+    def __init__(self, pin, sm_id=4):
+        self.pin = Pin(pin, Pin.IN)
+        self.sm_id = sm_id
+        self.clock_freq = machine.freq()
+        self.sm = StateMachine(sm_id, period_counter, in_base=self.pin, jmp_pin=self.pin)
+        self.dma = None
+        if hasattr(rp2, 'DMA'):
+            self.dma = rp2.DMA()
+            self.ctrl = self.dma.pack_ctrl(size=2, inc_read=False,
+                                           treq_sel=pio_regs.dreq(sm_id, rx=True))
+
+    def deinit(self):
+        self.sm.active(0)
+        if self.dma is not None:
+            self.dma.close()
+
+    def capture(self, periods=256, timeout_ms=1000):
+        '''Returns an array('I') of 2 * periods counts, high then low for
+        each period. Returns fewer counts if the signal stops for longer than
+        timeout_ms.'''
+        buf = array('I', [0] * (2 * periods))
+        sm = self.sm
+        sm.active(0)
+        while sm.rx_fifo():
+            sm.get()
+        sm.restart()
+        start = utime.ticks_ms()
+        got = 0
+        if self.dma is not None:
+            self.dma.config(read=sm, write=buf, count=len(buf), ctrl=self.ctrl, trigger=True)
+            sm.active(1)
+            while self.dma.active():
+                if utime.ticks_diff(utime.ticks_ms(), start) > timeout_ms:
+                    self.dma.active(0)
+                    break
+            got = len(buf) - self.dma.count
+        else:
+            mv = memoryview(buf)
+            sm.active(1)
+            while got < len(buf):
+                n = min(sm.rx_fifo(), len(buf) - got)
+                if n:
+                    sm.get(mv[got:got + n])
+                    got += n
+                elif utime.ticks_diff(utime.ticks_ms(), start) > timeout_ms:
+                    break
+        sm.active(0)
+        return buf[:got & ~1] if got < len(buf) else buf
+
+    def measure(self, periods=256, timeout_ms=1000):
+        '''Captures and returns (SignalStats, counts). The stats are None if
+        no whole period arrived within timeout_ms: the pin isn't toggling.'''
+        counts = self.capture(periods, timeout_ms)
+        return signal_stats.analyse(counts, self.clock_freq), counts
+
+
+if __name__ == "__main__":
+    # Loop GP15 back to GP16 and measure a 1 kHz 25% PWM
+    from machine import PWM
+    pwm = PWM(Pin(15))
+    pwm.freq(1000)
+    pwm.duty_u16(16384)
+    counter = PeriodCounter(16)
+    stats, counts = counter.measure()
+    if stats is None:
+        print('no signal on GP16: is it wired to GP15?')
+    else:
+        print(stats)
+        edges, bins = signal_stats.period_histogram(counts, counter.clock_freq)
+        print(signal_stats.format_histogram(edges, bins))
+    counter.deinit()
+    pwm.deinit()
@@ -0,0 +1,459 @@
+# CPython
+'''Static cycle counts for asm_pio programs, so the timing of a PIO program
+can be worked out and tuned without counting instructions by hand.
+
+analyse() finds the loops in a program assembled by pio_sim: a label that
+some later instruction, or the wrap, jumps back to. For each loop it
+reports:
+- the register counting it down and that register's start value;
+- the cycles for each way around the loop, with the branch conditions
+  taken on the way;
+- how it can exit.
+Inner loops are folded into the loops around them.
+
+Cycle counts are polynomials in the program's inputs. An input is a
+register set from outside the program, such as x loaded by sm.exec(), or a
+value shifted out of the OSR, named after the register and the address of
+the out(), like y@1. Time spent in wait() or in a loop that exits on a pin
+becomes a term of its own, like wait@12 or countdown, since only the
+signal decides it.
+
+freq_for() and solve_input() work backwards from a target time to the
+StateMachine freq or the input value that comes closest.'''
+
+from collections import namedtuple
+from pio_sim import (SimStateMachine, JMP, WAIT, IN, OUT, PUSHPULL, MOV, IRQ, SET, SYS_FREQ,
+                     load_programs)
+
+REGISTERS = ('pins', 'x', 'y', 'null', 'pindirs', 'pc', 'isr', 'osr')
+CONDITIONS = (None, ('x == 0', 'x != 0'), ('x != 0', 'x == 0'), ('y == 0', 'y != 0'),
+              ('y != 0', 'y == 0'), ('x != y', 'x == y'), ('pin high', 'pin low'),
+              ('OSR not empty', 'OSR empty'))
+MAX_DIV = 65536
+
+
+class Poly():
+    '''A polynomial with integer coefficients in named inputs.'''
+
+    def __init__(self, terms=None):
+        self.terms = {k: v for k, v in (terms or {}).items() if v}
+
+    @staticmethod
+    def const(value):
+        return Poly({(): value})
+
+    @staticmethod
+    def var(name):
+        return Poly({(name,): 1})
+
+    def _coerce(self, other):
+        return other if isinstance(other, Poly) else Poly.const(other)
+
+    def __add__(self, other):
+        other = self._coerce(other)
+        terms = dict(self.terms)
+        for k, v in other.terms.items():
+            terms[k] = terms.get(k, 0) + v
+        return Poly(terms)
+
+    __radd__ = __add__
+
+    def __mul__(self, other):
+        other = self._coerce(other)
+        terms = {}
+        for k1, v1 in self.terms.items():
+            for k2, v2 in other.terms.items():
+                k = tuple(sorted(k1 + k2))
+                terms[k] = terms.get(k, 0) + v1 * v2
+        return Poly(terms)
+
+    __rmul__ = __mul__
+
+    def __eq__(self, other):
+        return self.terms == self._coerce(other).terms
+
+    def __hash__(self):
+        return hash(tuple(sorted(self.terms.items())))
+
+    def variables(self):
+        return sorted({name for k in self.terms for name in k})
+
+    def value(self, env=None):
+        '''Evaluates with inputs from env; raises KeyError for a missing one.'''
+        env = env or {}
+        total = 0
+        for k, v in self.terms.items():
+            for name in k:
+                v *= env[name]
+            total += v
+        return total
+
+    def partial(self, env):
+        '''Substitutes the inputs env has, leaving the rest.'''
+        result = Poly()
+        for k, v in self.terms.items():
+            term = Poly.const(v)
+            for name in k:
+                term = term * (env[name] if name in env else Poly.var(name))
+            result = result + term
+        return result
+
+    def __str__(self):
+        if not self.terms:
+            return '0'
+        parts = []
+        for k in sorted(self.terms, key=lambda k: (-len(k), k)):
+            v = self.terms[k]
+            names = '*'.join(k)
+            if not names:
+                parts.append(str(v))
+            elif v == 1:
+                parts.append(names)
+            else:
+                parts.append(f'{v}*{names}')
+        return ' + '.join(parts).replace('+ -', '- ')
+
+    __repr__ = __str__
+
+
+# One way through a loop: the cycles it takes and the branch conditions
+# on the way.
+Path = namedtuple('Path', ('cycles', 'conditions'))
+
+# A loop: label names the loop head, body is the set of addresses in it.
+# counter is 'x' or 'y' for a loop closed by jmp(x_dec) or jmp(y_dec), with
+# start its value on entry and iterations the times round (start + 1).
+# paths are the ways round once, exits (from, to, Path) the ways out, with
+# the cycles from the start of the iteration.
+Loop = namedtuple('Loop', ('label', 'head', 'body', 'counter', 'start', 'iterations', 'paths', 'exits'))
+
+
+class Analysis():
+    '''The loops of a pio_sim Program.'''
+
+    def __init__(self, program):
+        self.program = program
+        self.code = [SimStateMachine.decode(word, program.sideset_count, program.sideset_opt)
+                     for word in program.code]
+        self.names = {}
+        for name, addr in sorted(program.labels.items(), key=lambda item: item[1]):
+            self.names.setdefault(addr, name)
+        self.inputs = {} # input name: description
+        self.loops = self._find_loops()
+
+    def name(self, addr):
+        return self.names.get(addr, f'@{addr}')
+
+    def successors(self, addr):
+        '''[(address, condition)] the instruction at addr can go on to.'''
+        op, a, b = self.code[addr][:3]
+        program = self.program
+        fall = program.wrap_target if addr == program.wrap else addr + 1
+        if op == JMP:
+            if a == 0:
+                return [(b, None)]
+            taken, not_taken = CONDITIONS[a]
+            return [(b, taken), (fall, not_taken)]
+        if (op == OUT and a == 5) or (op == MOV and a == 5):
+            return [] # jumps to a computed address
+        return [(fall, None)] if fall < len(self.code) else []
+
+    def predecessors(self, addr):
+        return [p for p in range(len(self.code)) if any(t == addr for t, _ in self.successors(p))]
+
+    def cost(self, addr):
+        '''Cycles for the instruction at addr, with any stall as a term.'''
+        op, a, b, c, delay = self.code[addr][:5]
+        cycles = Poly.const(1 + delay)
+        if op == WAIT or (op == IRQ and b and not a):
+            cycles = cycles + Poly.var(f'wait@{addr}')
+        return cycles
+
+    def _find_loops(self):
+        # Back edges from a depth first search, then the natural loop of
+        # each loop head
+        back = {}
+        state = {}
+
+        def visit(addr):
+            state[addr] = 1
+            for t, _ in self.successors(addr):
+                if state.get(t) == 1:
+                    back.setdefault(t, []).append(addr)
+                elif t not in state:
+                    visit(t)
+            state[addr] = 2
+        visit(0)
+
+        bodies = {}
+        for head, tails in back.items():
+            body = {head}
+            stack = list(tails)
+            while stack:
+                n = stack.pop()
+                if n not in body:
+                    body.add(n)
+                    stack.extend(self.predecessors(n))
+            bodies[head] = body
+
+        loops = {}
+        for head in sorted(bodies, key=lambda h: len(bodies[h])):
+            loops[head] = self._summarise(head, bodies[head], back[head], loops)
+        return [loops[head] for head in sorted(loops)]
+
+    def _counter(self, head, tails):
+        '''The register a loop counts down, if every jump back is a
+        jmp(x_dec) or jmp(y_dec).'''
+        counters = set()
+        for tail in tails:
+            op, a, b = self.code[tail][:3]
+            if op == JMP and b == head and a in (2, 4):
+                counters.add('x' if a == 2 else 'y')
+            else:
+                return None
+        return counters.pop() if len(counters) == 1 else None
+
+    def value_before(self, addr, reg, depth=0):
+        '''The value of reg on reaching addr from addr - 1, if the straight
+        line code before it decides it.'''
+        p = addr - 1
+        while p >= 0 and depth < 32:
+            op, a, b, c = self.code[p][:4]
+            if op == JMP and a == 0:
+                return None # not reached by falling through
+            if op == SET and REGISTERS[a] == reg:
+                return Poly.const(b)
+            if op == OUT and REGISTERS[a] == reg:
+                name = f'{reg}@{p}'
+                self.inputs[name] = f'out({reg}, {b}) at {p}'
+                return Poly.var(name)
+            if op == MOV and REGISTERS[a] == reg:
+                if b == 1 and c == 3:
+                    return Poly.const(0xFFFFFFFF) # invert(null)
+                if b == 0 and c in (1, 2):
+                    return self.value_before(p, REGISTERS[c], depth + 1)
+                if b == 0 and c in (6, 7):
+                    src = REGISTERS[c]
+                    self.inputs.setdefault(src, f'{src} when mov({reg}, {src}) at {p} runs')
+                    return Poly.var(src)
+                return None
+            if op == JMP and ((a == 2 and reg == 'x') or (a == 4 and reg == 'y')):
+                return None
+            if reg in ('isr', 'osr') and op in (IN, OUT, PUSHPULL):
+                return None
+            p -= 1
+            depth += 1
+        if p < 0:
+            self.inputs.setdefault(reg, f'{reg} set before the program runs')
+            return Poly.var(reg)
+        return None
+
+    def _walk(self, head, body, loops):
+        '''All the ways from head back to head, and out of the loop.'''
+        paths = []
+        exits = []
+        inner = {}
+        for h, loop in loops.items():
+            if h != head and loop.body < body:
+                if h not in inner or len(loop.body) > len(inner[h].body):
+                    inner[h] = loop
+
+        def arrive(addr, cycles, conds, depth):
+            if addr == head:
+                paths.append(Path(cycles, tuple(conds)))
+            elif addr not in body:
+                exits.append((None, addr, Path(cycles, tuple(conds))))
+            elif depth < 64:
+                at(addr, cycles, conds, depth + 1)
+
+        def at(addr, cycles, conds, depth):
+            if addr in inner and depth > 0:
+                for src, dest, cost in self._exit_costs(inner[addr]):
+                    arrive(dest, cycles + cost.cycles, conds + list(cost.conditions), depth)
+                return
+            cycles = cycles + self.cost(addr)
+            for t, cond in self.successors(addr):
+                c = conds + [cond] if cond else conds
+                if t == head:
+                    paths.append(Path(cycles, tuple(c)))
+                elif t not in body:
+                    exits.append((addr, t, Path(cycles, tuple(c))))
+                else:
+                    arrive(t, cycles, c, depth)
+
+        at(head, Poly(), [], 0)
+        return paths, exits
+
+    def _summarise(self, head, body, tails, loops):
+        paths, exits = self._walk(head, body, loops)
+        counter = self._counter(head, tails)
+        start = iterations = None
+        if counter:
+            start = self.value_before(head, counter)
+            if start is None:
+                name = f'{self.name(head)}_start'
+                self.inputs[name] = f'{counter} on entering {self.name(head)}'
+                start = Poly.var(name)
+            iterations = start + 1
+        return Loop(self.name(head), head, frozenset(body), counter, start, iterations,
+                    _unique(paths), exits)
+
+    def _exit_costs(self, loop):
+        '''[(from, to, Path)] for leaving a loop from its entry. Running a
+        counted loop to the end takes start iterations plus the last one;
+        any other exit takes as long as the signal decides.'''
+        costs = []
+        iteration = loop.paths[0].cycles if len({p.cycles for p in loop.paths}) == 1 else None
+        for src, dest, path in loop.exits:
+            counted_out = (loop.counter and src is not None and self.code[src][0] == JMP
+                           and self.code[src][2] == loop.head)
+            if counted_out and iteration is not None:
+                # The usual way out, so not worth listing as a condition
+                cycles = loop.start * iteration + path.cycles
+                conds = ()
+            else:
+                cycles = Poly.var(loop.label) + path.cycles
+                conds = path.conditions
+            costs.append((src, dest, Path(cycles, conds)))
+        return costs
+
+    def loop(self, label):
+        for loop in self.loops:
+            if loop.label == label:
+                return loop
+        raise KeyError(label)
+
+    def total(self, label):
+        '''Cycles for a counted loop to run to the end from entering it.'''
+        loop = self.loop(label)
+        if loop.counter is None or len({p.cycles for p in loop.paths}) != 1:
+            raise ValueError(f'{label} is not a counted loop with one way round')
+        return loop.iterations * loop.paths[0].cycles
+
+
+def _unique(paths):
+    seen = []
+    for path in paths:
+        if path not in seen:
+            seen.append(path)
+    return seen
+
+
+def analyse(program):
+    return Analysis(program)
+
+
+def seconds(cycles, freq, sys_freq=SYS_FREQ):
+    '''Time for a number of cycles at a StateMachine freq, with the divider
+    the rp2 module would set for it.'''
+    div256 = sys_freq * 256 // freq
+    return cycles * div256 / (sys_freq * 256)
+
+
+def freq_for(cycles, target, sys_freq=SYS_FREQ):
+    '''Returns (freq, seconds): the StateMachine freq that makes cycles take
+    closest to target seconds, and the time it gives. Raises ValueError if
+    the divider would be out of range.'''
+    div256 = round(sys_freq * 256 * target / cycles)
+    if not 256 <= div256 <= MAX_DIV * 256:
+        raise ValueError(f'{cycles} cycles in {target} s needs a divider of {div256 / 256:.2f}')
+    freq = sys_freq * 256 // div256
+    return freq, seconds(cycles, freq, sys_freq)
+
+
+def solve_input(cycles, name, target, env=None, lo=0, hi=31):
+    '''The value from lo to hi for input name that brings cycles, with the
+    other inputs from env, closest to target cycles.'''
+    env = dict(env or {})
+
+    def at(v):
+        env[name] = v
+        return cycles.value(env)
+    base = at(lo)
+    slope = at(lo + 1) - base if hi > lo else 0
+    guess = lo if slope == 0 else lo + round((target - base) / slope)
+    best = None
+    for v in (guess - 1, guess, guess + 1):
+        v = min(max(v, lo), hi)
+        if best is None or abs(at(v) - target) < abs(at(best) - target):
+            best = v
+    return best
+
+
+def report(analysis, freq=None, env=None, sys_freq=SYS_FREQ):
+    '''The loops of an analysis as text, with times when freq is given and
+    values for the inputs env has.'''
+    env = env or {}
+    lines = [f'{analysis.program.name}:']
+    for name, desc in sorted(analysis.inputs.items()):
+        value = f' = {env[name]}' if name in env else ''
+        lines.append(f'  input {name}{value}: {desc}')
+
+    def show(cycles, timed=True):
+        text = str(cycles)
+        known = cycles.partial(env)
+        if known.variables():
+            if known != cycles:
+                text += f' = {known}'
+        else:
+            n = known.value()
+            if str(cycles) != str(n):
+                text += f' = {n}'
+            if freq and timed:
+                text += f' cycles, {seconds(n, freq, sys_freq) * 1e6:.2f} us'
+        return text
+
+    for loop in analysis.loops:
+        span = f'{min(loop.body)}-{max(loop.body)}'
+        if loop.counter:
+            lines.append(f'  {loop.label} ({span}): counts {loop.counter} down from {show(loop.start, False)}')
+        else:
+            lines.append(f'  {loop.label} ({span}): repeats until an exit')
+        for path in loop.paths:
+            via = f' when {", ".join(path.conditions)}' if path.conditions else ''
+            lines.append(f'    round once{via}: {show(path.cycles)}')
+        if loop.counter and len({p.cycles for p in loop.paths}) == 1:
+            lines.append(f'    to the end: {show(analysis.total(loop.label))}')
+        for src, dest, path in loop.exits:
+            via = f' when {", ".join(path.conditions)}' if path.conditions else ''
+            lines.append(f'    exits to {analysis.name(dest)}{via}')
+    return '\n'.join(lines)
+
+
+if __name__ == "__main__":
+    import os
+    here = os.path.dirname(os.path.abspath(__file__))
+    leds = load_programs(os.path.join(here, 'pio_Four_LEDs.py'))
+    dht = load_programs(os.path.join(here, 'dht11_pio.py'))
+
+    # Four_LEDs: cycles per nibble as a function of delay_mult in x
+    a = analyse(leds['Four_LEDs.prog'])
+    print(report(a, 2000, {'x': 5}))
+    nibble = a.loop('next_nibble').paths[0].cycles
+    assert nibble.value({'x': 5}) == 2 + 33 * 6 + 1 # as Four_LEDs.nibble_rate()
+    x = solve_input(nibble, 'x', 2000 / 4)
+    print(f'4 nibbles/s at 2 kHz: delay_mult {x}, {2000 / nibble.value({"x": x}):.3f} nibbles/s')
+    freq, t = freq_for(nibble.value({'x': 5}), 1 / 10)
+    print(f'10 nibbles/s with delay_mult 5: freq {freq}, {1 / t:.4f} nibbles/s')
+    print()
+
+    # The DHT start pulse and the 0/1 threshold of the packed program
+    a = analyse(dht['DHT11_PIO.DHT_PACKED'])
+    print(report(a, 1600000, {'y@1': 31}))
+    start = a.total('waity').value({'y@1': 31})
+    threshold = a.total('countdown')
+    print(f'start pulse at 1.6 MHz: {seconds(start, 1600000) * 1e3:.2f} ms, '
+          f'a bit reads 1 when high for over {seconds(threshold.value(), 1600000) * 1e6:.2f} us')
+    freq, t = freq_for(threshold.value(), 48e-6)
+    print(f'threshold of 48 us, between a 0 (28 us) and a 1 (70 us): freq {freq}')
+
+    # Cross-check the nibble time against the simulator
+    import pio_sim
+    sm = pio_sim.StateMachine(0, leds['Four_LEDs.prog'], freq=2000, out_base=25, set_base=25)
+    sm.exec('set(x, 5)')
+    sm.put(0x12481248)
+    edges = []
+    pio_sim.SIM.watch(25, lambda pin, level, t: edges.append(t))
+    sm.active(1)
+    pio_sim.SIM.run(1)
+    assert edges[1] - edges[0] == nibble.value({'x': 5}) * pio_sim.SIM.sm(0).clkdiv
@@ -0,0 +1,59 @@
+# Micropython
+'''Addresses of the PIO registers that rp2.StateMachine has no method for,
+worked out from a state machine id 0-7: 0-3 are on PIO0, 4-7 on PIO1.
+
+    CTRL      enable, restart and clock divider restart of a block's state
+              machines, for starting several in the same cycle
+    FDEBUG    the sticky FIFO stall and overflow flags, cleared by writing 1
+    SMx_CLKDIV a state machine's clock divider, for an exact integer or
+              fractional divider rather than the one freq= picks
+
+Use them with machine.mem32. DMA DREQ numbers for a state machine's FIFOs
+are here too.'''
+
+PIO_BASE = (0x50200000, 0x50300000)
+CTRL = 0x000 # SM_ENABLE bits 0-3, SM_RESTART bits 4-7, CLKDIV_RESTART bits 8-11
+FDEBUG = 0x008 # TXSTALL bits 24-27, TXOVER 16-19, RXUNDER 8-11, RXSTALL 0-3
+TXSTALL_SHIFT = 24
+SM0_CLKDIV = 0x0c8
+SM_STRIDE = 0x18 # between the registers of consecutive state machines
+
+
+def _check(sm_id):
+    if not 0 <= sm_id < 8:
+        raise ValueError(f'No state machine {sm_id}, there are 8: 0-3 on PIO0 and 4-7 on PIO1')
+
+
+def ctrl(sm_id):
+    '''Address of the CTRL register of the state machine's block.'''
+    _check(sm_id)
+    return PIO_BASE[sm_id >> 2] + CTRL
+
+
+def fdebug(sm_id):
+    '''Address of the FDEBUG register of the state machine's block.'''
+    _check(sm_id)
+    return PIO_BASE[sm_id >> 2] + FDEBUG
+
+
+def clkdiv(sm_id):
+    '''Address of the state machine's CLKDIV register.'''
+    _check(sm_id)
+    return PIO_BASE[sm_id >> 2] + SM0_CLKDIV + (sm_id & 3) * SM_STRIDE
+
+
+def sm_mask(sm_id):
+    '''The state machine's bit in its block's CTRL fields.'''
+    _check(sm_id)
+    return 1 << (sm_id & 3)
+
+
+def txstall_bit(sm_id):
+    '''The state machine's TXSTALL flag in FDEBUG.'''
+    return sm_mask(sm_id) << TXSTALL_SHIFT
+
+
+def dreq(sm_id, rx=False):
+    '''DMA DREQ number for the state machine's TX FIFO, or RX with rx=True.'''
+    _check(sm_id)
+    return ((sm_id >> 2) << 3) + (4 if rx else 0) + (sm_id & 3)
@@ -0,0 +1,1249 @@
+# CPython
+'''Host-side assembler and cycle simulator for rp2.asm_pio programs, so PIO
+timing can be checked and benchmarked on a PC without a board.
+
+asm_pio() here assembles the same DSL as MicroPython's rp2 module into the
+same 16 bit instruction words, including delays, side-set (with the
+optional enable bit when not every instruction sets it), wrap and
+wrap_target. load_programs() pulls the asm_pio programs out of a source file
+without importing it, so modules that need machine can still be tested.
+
+The simulator models both PIO blocks with their four state machines each,
+their FIFOs (joined or not), autopush/autopull with thresholds and shift
+directions, side-set, delays, wrap, IRQ flags and the GPIO pins. Each state
+machine runs at its own clock divider; time is kept in 256ths of a system
+clock cycle so fractional dividers are exact. Stalled instructions and
+delays are skipped over in one step, as are jmp(x_dec)/jmp(y_dec) loops
+that jump to themselves and whole repeats of a program that comes back to
+wrap_target unchanged, so most programs run at many millions of cycles per
+second.
+
+External hardware is modelled through the pins: drive() schedules levels on
+a pin and watch() calls back when a pin changes. call_at() runs any
+function at a simulated time, for timers and device models.
+
+StateMachine and PIO mirror the rp2 classes so board code can run against
+the simulator; SIM is the simulator they use.'''
+
+import ast
+import heapq
+from collections import deque
+
+SYS_FREQ = 125000000
+NUM_PINS = 30
+INF = float('inf')
+
+
+class PIO():
+    '''The rp2.PIO constants, and a PIO block as rp2.PIO(id).'''
+    IN_LOW = 0
+    IN_HIGH = 1
+    OUT_LOW = 2
+    OUT_HIGH = 3
+    SHIFT_LEFT = 0
+    SHIFT_RIGHT = 1
+    JOIN_NONE = 0
+    JOIN_TX = 1
+    JOIN_RX = 2
+    IRQ_SM0 = 0x100
+    IRQ_SM1 = 0x200
+    IRQ_SM2 = 0x400
+    IRQ_SM3 = 0x800
+
+    def __init__(self, id):
+        self.id = id
+
+    def state_machine(self, index, program=None, *args, **kwargs):
+        return StateMachine(self.id * 4 + index, program, *args, **kwargs)
+
+    def add_program(self, program):
+        SIM.blocks[self.id].load(program)
+
+    def remove_program(self, program=None):
+        SIM.blocks[self.id].unload(program)
+
+
+# -- assembler ---------------------------------------------------------------
+
+class Program():
+    '''An assembled program: the instruction words plus the settings given
+    to asm_pio.'''
+
+    def __init__(self, name, code, wrap_target, wrap, sideset_count, sideset_opt, labels, config):
+        self.name = name
+        self.code = code
+        self.wrap_target = wrap_target
+        self.wrap = wrap
+        self.sideset_count = sideset_count # side-set bits, including the enable bit
+        self.sideset_opt = sideset_opt
+        self.labels = labels
+        self.config = config
+
+    def __len__(self):
+        return len(self.code)
+
+    def __repr__(self):
+        return f'<Program {self.name}: {len(self.code)} instructions>'
+
+
+class _Instr():
+    '''An instruction as written in the DSL, before encoding.'''
+
+    def __init__(self, asm, word, target=None):
+        self.asm = asm
+        self.word = word
+        self.target = target
+        self.delay_value = 0
+        self.side_value = None
+
+    def __getitem__(self, delay):
+        self.delay_value = delay
+        return self
+
+    def delay(self, delay):
+        self.delay_value = delay
+        return self
+
+    def side(self, value):
+        self.side_value = value
+        return self
+
+
+class _Assembler():
+    '''Collects the instructions of one program. The DSL functions are its
+    methods, bound into the namespace the program body runs in.'''
+
+    def __init__(self):
+        self.instrs = []
+        self.labels = {}
+        self.wrap_target_at = None
+        self.wrap_at = None
+
+    def emit(self, word, target=None):
+        instr = _Instr(self, word, target)
+        self.instrs.append(instr)
+        return instr
+
+    def namespace(self):
+        ns = {
+            'gpio': 0, 'pins': 0, 'x': 1, 'y': 2, 'null': 3, 'pindirs': 4, 'pc': 5,
+            'status': 5, 'isr': 6, 'osr': 7, 'exec': 8,
+            'invert': lambda v: v | 0x08, 'reverse': lambda v: v | 0x10,
+            'not_x': 1, 'x_dec': 2, 'not_y': 3, 'y_dec': 4, 'x_not_y': 5, 'pin': 6,
+            'not_osre': 7, 'noblock': 0x01, 'block': 0x21, 'iffull': 0x40,
+            'ifempty': 0x40, 'clear': 0x40, 'rel': lambda v: v | 0x10,
+        }
+        for name in ('wrap_target', 'wrap', 'label', 'word', 'nop', 'jmp', 'wait', 'in_',
+                     'out', 'push', 'pull', 'mov', 'irq', 'set'):
+            ns[name] = getattr(self, name)
+        return ns
+
+    def wrap_target(self):
+        self.wrap_target_at = len(self.instrs)
+
+    def wrap(self):
+        self.wrap_at = len(self.instrs) - 1
+
+    def label(self, name):
+        if name in self.labels:
+            raise SyntaxError(f'Duplicate label {name}')
+        self.labels[name] = len(self.instrs)
+
+    def word(self, instr, label=None):
+        return self.emit(instr, label)
+
+    def nop(self):
+        return self.emit(0xA042) # mov(y, y)
+
+    def jmp(self, cond, label=None):
+        if label is None:
+            label, cond = cond, 0
+        return self.emit(0x0000 | (cond << 5), label)
+
+    def wait(self, polarity, src, index):
+        if src == 6:
+            src = 1 # pin
+        elif src != 0:
+            src = 2 # irq
+        return self.emit(0x2000 | (polarity << 7) | (src << 5) | index)
+
+    def in_(self, src, count):
+        return self.emit(0x4000 | (src << 5) | (count & 0x1F))
+
+    def out(self, dest, count):
+        if dest == 8:
+            dest = 7 # exec
+        return self.emit(0x6000 | (dest << 5) | (count & 0x1F))
+
+    def push(self, value=0, value2=0):
+        value |= value2
+        if not value & 1:
+            value |= 0x20 # blocking unless noblock
+        return self.emit(0x8000 | (value & 0x60))
+
+    def pull(self, value=0, value2=0):
+        value |= value2
+        if not value & 1:
+            value |= 0x20
+        return self.emit(0x8080 | (value & 0x60))
+
+    def mov(self, dest, src):
+        if dest == 8:
+            dest = 4 # exec
+        return self.emit(0xA000 | (dest << 5) | src)
+
+    def irq(self, mod, index=None):
+        if index is None:
+            index, mod = mod, 0
+        return self.emit(0xC000 | (mod & 0x60) | index)
+
+    def set(self, dest, data):
+        return self.emit(0xE000 | (dest << 5) | data)
+
+    def encode(self, sideset_pins, name, config, sideset_opt=None):
+        '''Resolves labels and packs delay and side-set into each word. Side-set
+        is optional if sideset_opt, or by default if any instruction has no
+        side().'''
+        if not self.instrs:
+            raise SyntaxError(f'{name}: empty program')
+        if len(self.instrs) > 32:
+            raise SyntaxError(f'{name}: {len(self.instrs)} instructions, a PIO block holds 32')
+        sideset_count = sideset_pins
+        if sideset_opt is None:
+            sideset_opt = any(ins.side_value is None for ins in self.instrs)
+        opt = bool(sideset_pins) and sideset_opt
+        if opt:
+            sideset_count += 1
+        if sideset_count > 5:
+            raise SyntaxError(f'{name}: too many side-set bits')
+        delay_max = (1 << (5 - sideset_count)) - 1
+        code = []
+        for ii, ins in enumerate(self.instrs):
+            word = ins.word
+            if ins.target is not None:
+                target = ins.target
+                if isinstance(target, str):
+                    if target not in self.labels:
+                        raise SyntaxError(f'{name}: unknown label {target}')
+                    target = self.labels[target]
+                word |= target
+            if not 0 <= ins.delay_value <= delay_max:
+                raise SyntaxError(f'{name}: delay {ins.delay_value} out of range 0-{delay_max} at {ii}')
+            ds = ins.delay_value
+            if ins.side_value is not None:
+                if not sideset_pins:
+                    raise SyntaxError(f'{name}: side() without sideset_init')
+                side = ins.side_value
+                if opt:
+                    side |= 1 << sideset_pins
+                ds |= side << (5 - sideset_count)
+            code.append(word | (ds << 8))
+        wrap_target = self.wrap_target_at if self.wrap_target_at is not None else 0
+        wrap = self.wrap_at if self.wrap_at is not None else len(code) - 1
+        return Program(name, code, wrap_target, wrap, sideset_count, opt, dict(self.labels), config)
+
+
+def _pin_count(init):
+    if init is None:
+        return 0
+    return len(init) if isinstance(init, (tuple, list)) else 1
+
+
+def asm_pio(*, out_init=None, set_init=None, sideset_init=None, in_shiftdir=0, out_shiftdir=0,
+            autopush=False, autopull=False, push_thresh=32, pull_thresh=32, fifo_join=0, **kwargs):
+    '''Decorator that assembles a PIO program, like rp2.asm_pio. Returns a
+    Program in place of the function.'''
+    config = dict(out_init=out_init, set_init=set_init, sideset_init=sideset_init,
+                  in_shiftdir=in_shiftdir, out_shiftdir=out_shiftdir, autopush=autopush,
+                  autopull=autopull, push_thresh=push_thresh, pull_thresh=pull_thresh,
+                  fifo_join=fifo_join)
+
+    def assemble(fn):
+        asm = _Assembler()
+        ns = dict(fn.__globals__)
+        ns.update(asm.namespace())
+        body = type(fn)(fn.__code__, ns, fn.__name__, fn.__defaults__, fn.__closure__)
+        body()
+        return asm.encode(_pin_count(sideset_init), fn.__name__, config)
+    return assemble
+
+
+def asm_pio_encode(instr, sideset_count, sideset_opt=False):
+    '''Encodes one instruction given as DSL source, like rp2.asm_pio_encode.'''
+    asm = _Assembler()
+    eval(instr, asm.namespace())
+    if len(asm.instrs) != 1:
+        raise SyntaxError(f'Expected one instruction: {instr}')
+    pins = sideset_count - 1 if sideset_opt else sideset_count
+    return asm.encode(pins, 'exec', {}, sideset_opt).code[0]
+
+
+def load_programs(path):
+    '''Assembles the asm_pio programs in a source file without running the
+    rest of it. Returns a dict of Program by name; programs defined in a
+    class are named Class.function.'''
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+    found = []
+
+    def is_asm_pio(node):
+        for dec in node.decorator_list:
+            target = dec.func if isinstance(dec, ast.Call) else dec
+            if isinstance(target, ast.Attribute) and target.attr == 'asm_pio':
+                return True
+            if isinstance(target, ast.Name) and target.id == 'asm_pio':
+                return True
+        return False
+
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef) and is_asm_pio(node):
+            found.append((node.name, node))
+        elif isinstance(node, ast.ClassDef):
+            for item in node.body:
+                if isinstance(item, ast.FunctionDef) and is_asm_pio(item):
+                    found.append((f'{node.name}.{item.name}', item))
+
+    programs = {}
+    for name, node in found:
+        ns = {'rp2': _RP2_NAMESPACE, 'PIO': PIO, 'asm_pio': asm_pio}
+        module = ast.Module(body=[node], type_ignores=[])
+        exec(compile(module, path, 'exec'), ns)
+        programs[name] = ns[node.name]
+    return programs
+
+
+class _Namespace():
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+_RP2_NAMESPACE = _Namespace(PIO=PIO, asm_pio=asm_pio)
+
+
+# -- simulator ---------------------------------------------------------------
+
+# Decoded instruction fields, see SimStateMachine.decode()
+JMP, WAIT, IN, OUT, PUSHPULL, MOV, IRQ, SET = range(8)
+
+
+def _bitrev(v):
+    return int(f'{v & 0xFFFFFFFF:032b}'[::-1], 2)
+
+
+class SimStateMachine():
+    '''One simulated state machine.'''
+
+    def __init__(self, sim, block, index):
+        self.sim = sim
+        self.block = block
+        self.index = index
+        self.id = block.id * 4 + index
+        self.facade = None
+        self.program = None
+        self.code = []
+        self.enabled = False
+        self.clkdiv = 256 # in 256ths, 256 is full speed
+        self.time = 0 # time of the next instruction, in 256ths of a sys cycle
+        self.cycles = 0 # instructions cycles run, including delays and stalls
+        self.exec_next = None
+        self.in_base = self.out_base = self.set_base = self.sideset_base = self.jmp_pin = 0
+        self.out_count = self.set_count = self.sideset_pins = 0
+        self.sideset_count = 0
+        self.sideset_opt = False
+        self.sideset_pindirs = False
+        self.autopush = self.autopull = False
+        self.push_thresh = self.pull_thresh = 32
+        self.in_shiftdir = self.out_shiftdir = 0
+        self.tx = deque()
+        self.rx = deque()
+        self.fifo_ops = 0 # pushes and pulls so far
+        self.tx_depth = self.rx_depth = 4
+        self.wrap_target = 0
+        self.wrap = 0
+        self.x = self.y = 0
+        self.pc = 0
+        self.osr = 0
+        self.restart()
+
+    def restart(self):
+        '''SM_RESTART: clears the shift counters, the ISR and a stalled
+        instruction. X, Y, the PC and the OSR contents are kept.'''
+        self.isr = 0
+        self.isr_count = 0
+        self.osr_count = 32 # empty
+        self.exec_next = None
+
+    def configure(self, program, clkdiv, in_base, out_base, set_base, jmp_pin, sideset_base,
+                  in_shiftdir, out_shiftdir, push_thresh, pull_thresh):
+        config = program.config
+        self.program = program
+        self.code = [self.decode(word, program.sideset_count, program.sideset_opt) for word in program.code]
+        self.pure = [self.is_pure(ins, config) for ins in self.code]
+        self.wrap_target = program.wrap_target
+        self.wrap = program.wrap
+        self.clkdiv = clkdiv
+        self.sideset_count = program.sideset_count
+        self.sideset_opt = program.sideset_opt
+        self.sideset_pins = _pin_count(config['sideset_init'])
+        self.out_count = _pin_count(config['out_init'])
+        self.set_count = _pin_count(config['set_init'])
+        self.in_base = in_base if in_base is not None else 0
+        self.out_base = out_base if out_base is not None else 0
+        self.set_base = set_base if set_base is not None else 0
+        self.jmp_pin = jmp_pin if jmp_pin is not None else 0
+        self.sideset_base = sideset_base if sideset_base is not None else 0
+        self.autopush = config['autopush']
+        self.autopull = config['autopull']
+        self.push_thresh = (push_thresh if push_thresh is not None else config['push_thresh']) or 32
+        self.pull_thresh = (pull_thresh if pull_thresh is not None else config['pull_thresh']) or 32
+        self.in_shiftdir = in_shiftdir if in_shiftdir is not None else config['in_shiftdir']
+        self.out_shiftdir = out_shiftdir if out_shiftdir is not None else config['out_shiftdir']
+        join = config['fifo_join']
+        self.tx_depth = 8 if join == PIO.JOIN_TX else 0 if join == PIO.JOIN_RX else 4
+        self.rx_depth = 8 if join == PIO.JOIN_RX else 0 if join == PIO.JOIN_TX else 4
+        self.tx.clear()
+        self.rx.clear()
+        self.x = self.y = 0
+        self.pc = 0
+        self.restart()
+        # Initial pin directions and levels, as the rp2 module sets them
+        pins = self.sim.pins
+        for base, init in ((out_base, config['out_init']), (set_base, config['set_init']),
+                           (sideset_base, config['sideset_init'])):
+            if base is None or init is None:
+                continue
+            inits = init if isinstance(init, (tuple, list)) else (init,)
+            for ii, mode in enumerate(inits):
+                pin = (base + ii) % 32
+                pins.set_pin(pin, mode & 1, mode >> 1 & 1)
+
+    @staticmethod
+    def decode(word, sideset_count, sideset_opt):
+        '''Splits an instruction word into (op, a, b, c, delay, side) where
+        side is None or the side-set value.'''
+        op = word >> 13
+        ds = (word >> 8) & 0x1F
+        delay = ds & ((1 << (5 - sideset_count)) - 1)
+        side = None
+        if sideset_count:
+            field = ds >> (5 - sideset_count)
+            if sideset_opt:
+                if field >> (sideset_count - 1):
+                    side = field & ((1 << (sideset_count - 1)) - 1)
+            else:
+                side = field
+        if op == JMP:
+            return (op, (word >> 5) & 7, word & 0x1F, 0, delay, side)
+        if op == WAIT:
+            return (op, (word >> 7) & 1, (word >> 5) & 3, word & 0x1F, delay, side)
+        if op == IN or op == OUT:
+            return (op, (word >> 5) & 7, (word & 0x1F) or 32, 0, delay, side)
+        if op == PUSHPULL:
+            return (op, (word >> 7) & 1, (word >> 6) & 1, (word >> 5) & 1, delay, side)
+        if op == MOV:
+            return (op, (word >> 5) & 7, (word >> 3) & 3, word & 7, delay, side)
+        if op == IRQ:
+            return (op, (word >> 6) & 1, (word >> 5) & 1, word & 0x1F, delay, side)
+        return (op, (word >> 5) & 7, word & 0x1F, 0, delay, side)
+
+    @staticmethod
+    def is_pure(ins, config):
+        '''True if an instruction neither reads the pins, FIFOs or IRQ flags
+        nor does anything another state machine could see apart from
+        setting pins.'''
+        op, a, b, c = ins[:4]
+        if op == JMP:
+            return a != 6
+        if op == IN:
+            return a != 0 and not config['autopush']
+        if op == OUT:
+            return a != 7 and not config['autopull']
+        if op == MOV:
+            return c not in (0, 5) and a != 4
+        return op == SET
+
+    def _irq_index(self, index):
+        if index & 0x10:
+            return (index & 4) | ((index + self.index) & 3)
+        return index & 7
+
+    def _read_pins(self):
+        levels = self.sim.pins.word()
+        base = self.in_base
+        return ((levels >> base) | (levels << (32 - base))) & 0xFFFFFFFF
+
+    def _shift_out(self, count):
+        mask = (1 << count) - 1 if count < 32 else 0xFFFFFFFF
+        if self.out_shiftdir:
+            data = self.osr & mask
+            self.osr = self.osr >> count if count < 32 else 0
+        else:
+            data = (self.osr >> (32 - count)) & mask
+            self.osr = (self.osr << count) & 0xFFFFFFFF
+        self.osr_count = min(self.osr_count + count, 32)
+        return data
+
+    def _shift_in(self, data, count):
+        mask = (1 << count) - 1 if count < 32 else 0xFFFFFFFF
+        data &= mask
+        if self.in_shiftdir:
+            self.isr = ((self.isr >> count) | (data << (32 - count))) & 0xFFFFFFFF if count < 32 else data
+        else:
+            self.isr = ((self.isr << count) | data) & 0xFFFFFFFF if count < 32 else data
+        self.isr_count = min(self.isr_count + count, 32)
+
+    def _push(self):
+        self.rx.append(self.isr)
+        self.isr = 0
+        self.isr_count = 0
+        self.sim.fifo_activity(self)
+
+    def _pull(self):
+        self.osr = self.tx.popleft()
+        self.osr_count = 0
+        self.sim.fifo_activity(self)
+
+    def _write_pins(self, base, count, value, dirs=False):
+        pins = self.sim.pins
+        for ii in range(count):
+            pin = (base + ii) % 32
+            if dirs:
+                pins.set_dir(pin, (value >> ii) & 1)
+            else:
+                pins.set_level(pin, (value >> ii) & 1)
+
+    def run(self, limit):
+        '''Runs instructions while the next one is due at or before limit.
+
+        When the program comes back to wrap_target in the same state
+        after only pure instructions, it will repeat exactly until limit,
+        so whole repeats are skipped. Not done while pins are watched, as
+        watchers expect every edge.'''
+        sim = self.sim
+        pure = self.pure
+        skip = not sim.pins.watchers
+        snap = None
+        clean = False
+        while self.enabled and self.time <= limit and not sim.stop:
+            if skip and self.pc == self.wrap_target and self.exec_next is None:
+                state = (self.x, self.y, self.isr, self.isr_count, self.osr, self.osr_count)
+                if clean and snap[0] == state:
+                    period = self.time - snap[1]
+                    repeats = (limit - self.time) // period
+                    if repeats > 0:
+                        self.cycles += repeats * (self.cycles - snap[2])
+                        self.time += repeats * period
+                snap = (state, self.time, self.cycles)
+                clean = True
+            if self.exec_next is not None or not pure[self.pc]:
+                clean = False
+            self.step(limit)
+
+    def step(self, limit):
+        '''Executes one instruction, or one stalled attempt at it.'''
+        if self.exec_next is not None:
+            ins = self.exec_next
+            self.exec_next = None
+            forced = True
+        else:
+            ins = self.code[self.pc]
+            forced = False
+        op, a, b, c, delay, side = ins
+        period = self.clkdiv
+        if side is not None:
+            self._write_pins(self.sideset_base, self.sideset_pins, side, self.sideset_pindirs)
+
+        pc = self.pc
+        next_pc = pc if forced else (self.wrap_target if pc == self.wrap else pc + 1)
+        if forced and op != JMP:
+            next_pc = pc
+        stalled = False
+
+        if op == JMP:
+            taken = False
+            if a == 0:
+                taken = True
+            elif a == 1:
+                taken = self.x == 0
+            elif a == 2:
+                taken = self.x != 0
+                if b == pc and taken and not forced:
+                    # jmp(x_dec) to itself: run the whole countdown at once
+                    loops = self.x
+                    self.x = 0xFFFFFFFF
+                    self.pc = next_pc
+                    cycles = (loops + 1) * (1 + delay)
+                    self.cycles += cycles
+                    self.time += cycles * period
+                    return
+                self.x = (self.x - 1) & 0xFFFFFFFF
+            elif a == 3:
+                taken = self.y == 0
+            elif a == 4:
+                taken = self.y != 0
+                if b == pc and taken and not forced:
+                    loops = self.y
+                    self.y = 0xFFFFFFFF
+                    self.pc = next_pc
+                    cycles = (loops + 1) * (1 + delay)
+                    self.cycles += cycles
+                    self.time += cycles * period
+                    return
+                self.y = (self.y - 1) & 0xFFFFFFFF
+            elif a == 5:
+                taken = self.x != self.y
+            elif a == 6:
+                taken = self.sim.pins.level(self.jmp_pin) == 1
+            else:
+                taken = self.osr_count < self.pull_thresh
+            if taken:
+                next_pc = b
+
+        elif op == WAIT:
+            if b == 0:
+                ok = self.sim.pins.level(c) == a
+            elif b == 1:
+                ok = self.sim.pins.level((self.in_base + c) % 32) == a
+            else:
+                flags = self.block.irq_flags
+                index = self._irq_index(c)
+                ok = flags[index] == a
+                if ok and a == 1:
+                    flags[index] = 0
+            stalled = not ok
+
+        elif op == IN:
+            if self.autopush and self.isr_count + b >= self.push_thresh and len(self.rx) >= self.rx_depth:
+                stalled = True
+                self.block.fdebug |= 1 << self.index # RXSTALL
+            else:
+                if a == 0:
+                    data = self._read_pins()
+                elif a == 1:
+                    data = self.x
+                elif a == 2:
+                    data = self.y
+                elif a == 6:
+                    data = self.isr
+                elif a == 7:
+                    data = self.osr
+                else:
+                    data = 0
+                self._shift_in(data, b)
+                if self.autopush and self.isr_count >= self.push_thresh:
+                    self._push()
+
+        elif op == OUT:
+            if self.autopull and self.osr_count >= self.pull_thresh:
+                if self.tx:
+                    self._pull()
+                else:
+                    stalled = True
+                    self.block.fdebug |= 1 << (24 + self.index) # TXSTALL
+            if not stalled:
+                data = self._shift_out(b)
+                if a == 0:
+                    self._write_pins(self.out_base, min(b, 32), data)
+                elif a == 1:
+                    self.x = data
+                elif a == 2:
+                    self.y = data
+                elif a == 4:
+                    self._write_pins(self.out_base, min(b, 32), data, True)
+                elif a == 5:
+                    next_pc = data & 0x1F
+                elif a == 6:
+                    self._shift_in(data, b)
+                elif a == 7:
+                    self.exec_next = self.decode(data & 0xFFFF, self.sideset_count, self.sideset_opt)
+                if self.autopull and self.osr_count >= self.pull_thresh and self.tx:
+                    self._pull()
+
+        elif op == PUSHPULL:
+            if a == 0: # push
+                if b and self.isr_count < self.push_thresh:
+                    pass
+                elif len(self.rx) >= self.rx_depth:
+                    self.block.fdebug |= 1 << self.index
+                    if c:
+                        stalled = True
+                    else:
+                        self.isr = 0
+                        self.isr_count = 0
+                else:
+                    self._push()
+            else: # pull
+                if b and self.osr_count < self.pull_thresh:
+                    pass
+                elif self.tx:
+                    self._pull()
+                elif c:
+                    stalled = True
+                    self.block.fdebug |= 1 << (24 + self.index)
+                else:
+                    self.osr = self.x
+                    self.osr_count = 0
+
+        elif op == MOV:
+            if c == 0:
+                data = self._read_pins()
+            elif c == 1:
+                data = self.x
+            elif c == 2:
+                data = self.y
+            elif c == 5:
+                data = 0 # status with the default EXECCTRL settings
+            elif c == 6:
+                data = self.isr
+            elif c == 7:
+                data = self.osr
+            else:
+                data = 0
+            if b == 1:
+                data = ~data & 0xFFFFFFFF
+            elif b == 2:
+                data = _bitrev(data)
+            if a == 0:
+                self._write_pins(self.out_base, self.out_count, data)
+            elif a == 1:
+                self.x = data
+            elif a == 2:
+                self.y = data
+            elif a == 4:
+                self.exec_next = self.decode(data & 0xFFFF, self.sideset_count, self.sideset_opt)
+            elif a == 5:
+                next_pc = data & 0x1F
+            elif a == 6:
+                self.isr = data
+                self.isr_count = 0
+            elif a == 7:
+                self.osr = data
+                self.osr_count = 0
+
+        elif op == IRQ:
+            flags = self.block.irq_flags
+            index = self._irq_index(c)
+            if a:
+                flags[index] = 0
+            elif b and self.waiting_irq == index:
+                # irq(block, n) waits for the flag to be cleared
+                stalled = flags[index] != 0
+                if not stalled:
+                    self.waiting_irq = None
+            else:
+                flags[index] = 1
+                self.sim.irq_raised(self.block, index)
+                if b:
+                    self.waiting_irq = index
+                    stalled = True
+
+        else: # SET
+            if a == 0:
+                self._write_pins(self.set_base, self.set_count, b)
+            elif a == 1:
+                self.x = b
+            elif a == 2:
+                self.y = b
+            elif a == 4:
+                self._write_pins(self.set_base, self.set_count, b, True)
+
+        if stalled:
+            if forced:
+                self.exec_next = ins
+            # Nothing the stall waits on can change before limit, so skip
+            # to the first cycle of this state machine's clock after it
+            steps = max(1, -(-(limit - self.time) // period))
+            self.cycles += steps
+            self.time += steps * period
+            return
+        self.pc = next_pc
+        self.cycles += 1 + delay
+        self.time += (1 + delay) * period
+
+    waiting_irq = None
+
+
+class SimBlock():
+    '''One PIO block: four state machines, the IRQ flags and the loaded
+    programs.'''
+
+    def __init__(self, sim, id):
+        self.sim = sim
+        self.id = id
+        self.sms = [SimStateMachine(sim, self, ii) for ii in range(4)]
+        self.irq_flags = [0] * 8
+        self.irq_handlers = [None] * 4
+        self.programs = []
+        self.fdebug = 0
+
+    def load(self, program):
+        if program in self.programs:
+            return
+        used = sum(len(p) for p in self.programs)
+        if used + len(program) > 32:
+            raise OSError(12, f'ENOMEM: PIO{self.id} needs {used + len(program)} of 32 instructions')
+        self.programs.append(program)
+
+    def unload(self, program=None):
+        if program is None:
+            self.programs.clear()
+        elif program in self.programs:
+            self.programs.remove(program)
+
+
+class Pins():
+    '''The GPIO pins as seen by the state machines. A pin's level is the
+    state machine or CPU output when its direction is out, otherwise the
+    level an external device drives, otherwise its pull.'''
+
+    def __init__(self, sim):
+        self.sim = sim
+        self.out = [0] * 32
+        self.oe = [0] * 32
+        self.ext = [None] * 32
+        self.pull = [0] * 32 # 1 for a pull-up
+        self.watchers = {}
+
+    def level(self, pin):
+        if self.oe[pin]:
+            return self.out[pin]
+        ext = self.ext[pin]
+        if ext is not None:
+            return ext
+        return self.pull[pin]
+
+    def word(self):
+        w = 0
+        for pin in range(NUM_PINS):
+            if self.level(pin):
+                w |= 1 << pin
+        return w
+
+    def _changed(self, pin, before):
+        after = self.level(pin)
+        if after != before:
+            for fn in self.watchers.get(pin, ()):
+                fn(pin, after, self.sim.time_now())
+
+    def set_level(self, pin, value):
+        before = self.level(pin)
+        self.out[pin] = value
+        self._changed(pin, before)
+
+    def set_dir(self, pin, output):
+        before = self.level(pin)
+        self.oe[pin] = output
+        self._changed(pin, before)
+
+    def set_pin(self, pin, value, output):
+        before = self.level(pin)
+        self.out[pin] = value
+        self.oe[pin] = output
+        self._changed(pin, before)
+
+    def set_external(self, pin, level):
+        before = self.level(pin)
+        self.ext[pin] = level
+        self._changed(pin, before)
+
+    def set_pull(self, pin, level):
+        before = self.level(pin)
+        self.pull[pin] = level
+        self._changed(pin, before)
+
+
+class Simulator():
+    '''Both PIO blocks, the pins and the clock.'''
+
+    def __init__(self, sys_freq=SYS_FREQ):
+        self.sys_freq = sys_freq
+        self.time = 0 # 256ths of a sys cycle
+        self.pins = Pins(self)
+        self.blocks = [SimBlock(self, 0), SimBlock(self, 1)]
+        self.events = [] # (time, seq, fn, args)
+        self.cancelled = set()
+        self.seq = 0
+        self.stop = False
+        self.watching = [] # the state machines run_until() calls are waiting on
+        self.running = None # state machine being stepped
+        self.pending_irqs = []
+
+    def sm(self, id):
+        return self.blocks[id >> 2].sms[id & 3]
+
+    def time_now(self):
+        '''The current time, taking a running state machine into account.'''
+        if self.running is not None:
+            return self.running.time
+        return self.time
+
+    def seconds(self, t=None):
+        return (self.time if t is None else t) / (256 * self.sys_freq)
+
+    def to_time(self, seconds):
+        return int(round(seconds * 256 * self.sys_freq))
+
+    def set_sys_freq(self, sys_freq):
+        '''Changes the system clock. Times are rescaled so that the seconds
+        passed stay the same; the state machines keep their dividers, so
+        they speed up or slow down with it, as on the chip.'''
+        old = self.sys_freq
+
+        def scale(t):
+            return t * sys_freq // old
+        self.time = scale(self.time)
+        for block in self.blocks:
+            for sm in block.sms:
+                sm.time = scale(sm.time)
+        self.events = [(scale(t), seq, fn, args) for t, seq, fn, args in self.events]
+        heapq.heapify(self.events)
+        self.sys_freq = sys_freq
+
+    def call_at(self, t, fn, *args):
+        '''Calls fn(*args) when the simulation reaches time t. Returns a
+        handle for cancel().'''
+        self.seq += 1
+        heapq.heappush(self.events, (t, self.seq, fn, args))
+        # A state machine being stepped may be skipping ahead past t
+        self.stop = True
+        return self.seq
+
+    def cancel(self, handle):
+        self.cancelled.add(handle)
+
+    def drive(self, pin, level, at=None):
+        '''Schedules an external level on a pin at a time (default now);
+        None releases it.'''
+        t = self.time_now() if at is None else at
+        return self.call_at(t, self.pins.set_external, pin, level)
+
+    def drive_seconds(self, pin, level, delay):
+        self.drive(pin, level, self.time_now() + self.to_time(delay))
+
+    def watch(self, pin, fn):
+        '''Calls fn(pin, level, time) whenever the pin's level changes.'''
+        self.pins.watchers.setdefault(pin, []).append(fn)
+
+    def fifo_activity(self, sm):
+        sm.fifo_ops += 1
+        if sm in self.watching:
+            self.stop = True
+
+    def irq_raised(self, block, index):
+        if index < 4 and block.irq_handlers[index] is not None:
+            self.pending_irqs.append((block, index))
+            self.stop = True
+
+    def _dispatch_irqs(self):
+        while self.pending_irqs:
+            block, index = self.pending_irqs.pop(0)
+            handler = block.irq_handlers[index]
+            block.irq_flags[index] = 0
+            if handler is not None:
+                handler(block.sms[index].facade)
+
+    def run_until(self, end, fifo_sm=None):
+        '''Runs everything up to time end. With fifo_sm, returns early as
+        soon as that state machine pushes or pulls a word. Returns True if
+        it returned early.
+
+        Event callbacks and irq handlers may call run_until() again, for
+        example to model the time a handler spends on a bus. The inner call
+        runs everything up to its own end and the outer one carries on.'''
+        ops = fifo_sm.fifo_ops if fifo_sm is not None else 0
+
+        def ready():
+            return fifo_sm is not None and fifo_sm.fifo_ops != ops
+        self.watching.append(fifo_sm)
+        try:
+            while not ready():
+                self.stop = False
+                first = None
+                second = INF
+                for block in self.blocks:
+                    for sm in block.sms:
+                        if sm.enabled:
+                            if first is None or sm.time < first.time:
+                                if first is not None:
+                                    second = min(second, first.time)
+                                first = sm
+                            else:
+                                second = min(second, sm.time)
+                t = first.time if first is not None else INF
+                ev = self.events[0][0] if self.events else INF
+                if ev <= t and ev <= end:
+                    _, seq, fn, args = heapq.heappop(self.events)
+                    self.time = max(self.time, ev)
+                    if seq in self.cancelled:
+                        self.cancelled.discard(seq)
+                    else:
+                        fn(*args)
+                    continue
+                if t > end:
+                    break
+                self.running = first
+                first.run(min(second, ev, end))
+                self.running = None
+                self.time = max(self.time, min(first.time, end))
+                if self.pending_irqs:
+                    self._dispatch_irqs()
+            if not ready():
+                self.time = max(self.time, end)
+                return False
+            return True
+        finally:
+            self.running = None
+            self.watching.pop()
+
+    def run(self, seconds):
+        self.run_until(self.time + self.to_time(seconds))
+
+    def run_cycles(self, cycles):
+        self.run_until(self.time + cycles * 256)
+
+    # -- PIO registers, for machine.mem32 -----------------------------------
+
+    PIO_BASE = (0x50200000, 0x50300000)
+
+    def _block_reg(self, addr):
+        for block in self.blocks:
+            offset = addr - self.PIO_BASE[block.id]
+            if 0 <= offset < 0x1000:
+                return block, offset
+        return None, None
+
+    def handles(self, addr):
+        return self._block_reg(addr)[0] is not None
+
+    def mem_read(self, addr):
+        block, offset = self._block_reg(addr)
+        if offset == 0x000: # CTRL
+            return sum(1 << ii for ii in range(4) if block.sms[ii].enabled)
+        if offset == 0x004: # FSTAT
+            value = 0
+            for ii, sm in enumerate(block.sms):
+                value |= (len(sm.rx) >= sm.rx_depth) << ii
+                value |= (not sm.rx) << (8 + ii)
+                value |= (len(sm.tx) >= sm.tx_depth) << (16 + ii)
+                value |= (not sm.tx) << (24 + ii)
+            return value
+        if offset == 0x008: # FDEBUG
+            return block.fdebug
+        if offset == 0x030: # IRQ
+            return sum(block.irq_flags[ii] << ii for ii in range(8))
+        if 0x0c8 <= offset < 0x0c8 + 4 * 0x18 and (offset - 0x0c8) % 0x18 == 0:
+            div = block.sms[(offset - 0x0c8) // 0x18].clkdiv
+            return ((div >> 8) & 0xFFFF) << 16 | (div & 0xFF) << 8
+        return 0
+
+    def mem_write(self, addr, value):
+        block, offset = self._block_reg(addr)
+        if offset == 0x000: # CTRL
+            now = self.time_now()
+            for ii, sm in enumerate(block.sms):
+                if value & (1 << (4 + ii)):
+                    sm.restart()
+                enable = bool(value & (1 << ii))
+                if (enable and not sm.enabled) or (value & (1 << (8 + ii))):
+                    sm.time = now
+                sm.enabled = enable
+        elif offset == 0x008: # FDEBUG, write 1 to clear
+            block.fdebug &= ~value
+        elif offset == 0x030: # IRQ, write 1 to clear
+            for ii in range(8):
+                if value & (1 << ii):
+                    block.irq_flags[ii] = 0
+        elif 0x0c8 <= offset < 0x0c8 + 4 * 0x18 and (offset - 0x0c8) % 0x18 == 0:
+            div_int = (value >> 16) & 0xFFFF or 0x10000
+            block.sms[(offset - 0x0c8) // 0x18].clkdiv = div_int * 256 + ((value >> 8) & 0xFF)
+
+
+SIM = Simulator()
+
+
+def reset(sys_freq=SYS_FREQ):
+    '''Replaces SIM with a fresh simulator.'''
+    global SIM
+    SIM = Simulator(sys_freq)
+    return SIM
+
+
+# -- rp2 facade --------------------------------------------------------------
+
+# How long a blocking get() or put() waits in simulated time before it
+# decides the state machine will never get there
+BLOCKING_LIMIT_S = 10
+
+
+def _pin_number(pin):
+    if pin is None or isinstance(pin, int):
+        return pin
+    return pin.id
+
+
+class StateMachine():
+    '''rp2.StateMachine on the simulator.'''
+
+    def __init__(self, id, program=None, *args, **kwargs):
+        self.id = id
+        self.sm = SIM.sm(id)
+        self.sm.facade = self
+        if program is not None:
+            self.init(program, *args, **kwargs)
+
+    def init(self, program, freq=-1, *, in_base=None, out_base=None, set_base=None, jmp_pin=None,
+             sideset_base=None, in_shiftdir=None, out_shiftdir=None, push_thresh=None,
+             pull_thresh=None):
+        sm = self.sm
+        sm.enabled = False
+        sm.block.load(program)
+        if freq is None or freq < 0:
+            clkdiv = 256
+        else:
+            clkdiv = SIM.sys_freq * 256 // freq
+            if not 256 <= clkdiv <= 0x10000 * 256:
+                raise ValueError('freq out of range')
+        sm.configure(program, clkdiv, _pin_number(in_base), _pin_number(out_base),
+                     _pin_number(set_base), _pin_number(jmp_pin), _pin_number(sideset_base),
+                     in_shiftdir, out_shiftdir, push_thresh, pull_thresh)
+
+    def active(self, value=None):
+        sm = self.sm
+        if value is None:
+            return sm.enabled
+        value = bool(value)
+        if value and not sm.enabled:
+            sm.time = SIM.time_now()
+        sm.enabled = value
+        return value
+
+    def restart(self):
+        # rp2 also jumps back to the start of the program
+        self.sm.restart()
+        self.sm.pc = 0
+
+    def exec(self, instr):
+        sm = self.sm
+        if isinstance(instr, str):
+            instr = asm_pio_encode(instr, sm.sideset_count, sm.sideset_opt)
+        sm.exec_next = sm.decode(instr, sm.sideset_count, sm.sideset_opt)
+        # Run it now, out of band, as the hardware does for SMx_INSTR writes
+        enabled = sm.enabled
+        time = sm.time
+        sm.time = SIM.time_now()
+        sm.step(sm.time)
+        if sm.exec_next is not None:
+            sm.exec_next = None # stalled, the hardware would keep retrying
+        sm.time = time if enabled else sm.time
+
+    def _wait(self, ready):
+        deadline = SIM.time_now() + SIM.to_time(BLOCKING_LIMIT_S)
+        if SIM.running is not None:
+            if not ready():
+                raise RuntimeError('Blocking FIFO access from an irq handler')
+            return
+        while not ready():
+            if SIM.time >= deadline:
+                raise RuntimeError(f'State machine {self.id} stalled: FIFO never became ready')
+            SIM.run_until(deadline, self.sm)
+
+    def get(self, buf=None, shift=0):
+        sm = self.sm
+        if buf is None:
+            self._wait(lambda: sm.rx)
+            value = sm.rx.popleft()
+            return value >> shift
+        for ii in range(len(buf)):
+            self._wait(lambda: sm.rx)
+            buf[ii] = sm.rx.popleft() >> shift
+        return None
+
+    def put(self, value, shift=0):
+        sm = self.sm
+        values = (value,) if isinstance(value, int) else value
+        for v in values:
+            self._wait(lambda: len(sm.tx) < sm.tx_depth)
+            sm.tx.append((v << shift) & 0xFFFFFFFF)
+
+    def rx_fifo(self):
+        return len(self.sm.rx)
+
+    def tx_fifo(self):
+        return len(self.sm.tx)
+
+    def irq(self, handler=None, trigger=0, hard=False):
+        self.sm.block.irq_handlers[self.sm.index] = handler
+
+
+if __name__ == "__main__":
+    import os
+    import time
+
+    here = os.path.dirname(os.path.abspath(__file__))
+
+    # A square wave at freq*2: one period every 2 cycles
+    square = load_programs(os.path.join(here, 'PWM_vs_PIO.py'))['square']
+    sm = StateMachine(0, square, freq=8000, set_base=15)
+    edges = []
+    SIM.watch(15, lambda pin, level, t: edges.append(t))
+    sm.active(1)
+    SIM.run(0.01)
+    sm.active(0)
+    periods = {edges[ii + 2] - edges[ii] for ii in range(len(edges) - 2)}
+    print(f'square: {len(edges) // 2} periods of {SIM.seconds(periods.pop()) * 1e6:.1f} us at 8 kHz')
+
+    # The blinker spends 3 + 33 * (x + 1) cycles per nibble, then one on
+    # irq(0), so the handler runs 8 * 201 + 1 cycles after the start
+    reset()
+    blinky = load_programs(os.path.join(here, 'pio_blink.py'))['blinky']
+    sm = StateMachine(0, blinky, freq=2000, out_base=25, set_base=25)
+    sm.exec('set(x, 5)')
+    raised = []
+    sm.irq(lambda sm: raised.append(SIM.time_now()))
+    sm.put(0x12481248)
+    sm.active(1)
+    SIM.run(1)
+    expected = 8 * (3 + 33 * 6) + 1
+    print(f'blinky: irq after {SIM.seconds(raised[0]) * 2000:.0f} cycles, expected {expected}')
+    assert raised == [expected * SIM.sm(0).clkdiv]
+
+    # A waveform generator looped back into the period counter
+    reset()
+    from pio_clock import solve
+    programs = load_programs(os.path.join(here, 'waveform.py'))
+    programs.update(load_programs(os.path.join(here, 'pio_counter.py')))
+    setting = solve(38000, 0.33)
+    gen = StateMachine(0, programs['waveform'], sideset_base=15)
+    gen.put(setting.high)
+    gen.exec('pull()')
+    gen.exec('mov(y, osr)')
+    gen.put(setting.low)
+    gen.exec('pull()')
+    SIM.mem_write(0x50200000 + 0x0c8, (setting.div_int << 16) | (setting.div_frac << 8))
+    counter = StateMachine(4, programs['period_counter'], in_base=15, jmp_pin=15)
+    gen.active(1)
+    counter.active(1)
+    counts = [counter.get() for _ in range(200)]
+    import signal_stats
+    stats = signal_stats.analyse(counts[2:], SYS_FREQ)
+    print(f'waveform: asked for {setting.freq:.2f} Hz duty {setting.duty:.3f}, '
+          f'counted {stats.freq:.2f} Hz duty {stats.duty:.3f} jitter {stats.jitter_pp_ns:.1f} ns p-p')
+
+    # Speed: a delay loop and a tight loop. Watching the square wave's pin
+    # makes the simulator step every cycle rather than skip repeats.
+    for name, watch in (('blinky, delay loop', False), ('square, stepped', True), ('square, skipped', False)):
+        reset()
+        if name.startswith('blinky'):
+            sm = StateMachine(0, blinky, out_base=25, set_base=25)
+            sm.exec('set(x, 31)')
+            sm.irq(lambda sm: sm.put(0x12481248))
+            sm.put(0x12481248)
+        else:
+            sm = StateMachine(0, square, set_base=15)
+            if watch:
+                SIM.watch(15, lambda pin, level, t: None)
+        sm.active(1)
+        start = time.perf_counter()
+        SIM.run(0.01)
+        elapsed = time.perf_counter() - start
+        print(f'{name}: {SIM.sm(0).cycles / elapsed / 1e6:.1f} M cycles/s')
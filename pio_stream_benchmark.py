@@ -0,0 +1,48 @@
+# Micropython
+'''Finds the highest nibble rate Four_LEDs can sustain, fed one word per
+interrupt and streamed from a buffer. Runs each mode at increasing state
+machine frequencies with the shortest delay and compares the time taken
+with the time the PIO program needs on its own. A mode underruns when the
+pattern takes noticeably longer than that, because the program was waiting
+for data. In stream mode the TXSTALL count is reported too.
+
+Needs nothing attached; the nibbles go to GP2-GP5.'''
+
+import utime
+from machine import Pin
+from pio_Four_LEDs import Four_LEDs
+
+PATTERNS = tuple(0x01234567 + ii for ii in range(64))
+FREQS = (20000, 100000, 500000, 2000000, 10000000, 50000000, 125000000)
+
+
+def run(freq, stream):
+    '''Plays the patterns once or more and returns (expected nibbles/s,
+    achieved nibbles/s, underruns).'''
+    loops = max(1, freq // 200000) # keep each run to roughly 100 ms or more
+    start = utime.ticks_us()
+    leds = Four_LEDs(patterns=PATTERNS, loops=loops, delay_mult=0, freq=freq,
+                     out_base=Pin(2), stream=stream)
+    while not leds.done():
+        pass
+    us = utime.ticks_diff(utime.ticks_us(), start)
+    leds.stop()
+    nibbles = len(PATTERNS) * 8 * loops
+    return leds.nibble_rate(), nibbles * 1000000 / us, leds.underruns
+
+
+if __name__ == "__main__":
+    best = {}
+    for stream in (False, True):
+        mode = 'stream' if stream else 'irq'
+        for freq in FREQS:
+            expected, achieved, underruns = run(freq, stream)
+            ok = achieved >= 0.95 * expected
+            if ok:
+                best[mode] = achieved
+            note = '' if ok else '  underrun'
+            if stream:
+                note += f'  {underruns} TXSTALL'
+            print(f'{mode:<6} {freq:>9} Hz: expected {expected:>9.0f} achieved {achieved:>9.0f} nibbles/s{note}')
+    for mode in best:
+        print(f'{mode}: highest sustained rate {best[mode]:.0f} nibbles/s')
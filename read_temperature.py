@@ -12,7 +12,9 @@ on stdout and on an OLED board.'''
 import utime
 from machine import Pin, I2C
 from ssd1306 import SSD1306_I2C
-from mcp9808 import MCP9808
+from oled_text import TextLines
+from counting_bus import CountingI2C
+from mcp9808 import MCP9808, decode_temp
 import uos
 
 uname = uos.uname()
@@ -29,45 +31,29 @@ elif 'rp2' in uname.sysname:
 else:
     print(f'Unknown board type {uname.sysname}')
     
-def oled_writeln(oled, s, line_num):
-    '''Writes a string to the specified line.'''
-    oled.text(s, 0, line_num*8)
-
-class MockOLED():
-    '''Sends all OLED commands to /dev/null.'''
-    
-    def __init__(self):
-        print('Using a mock OLED')
-        
-    def text(self, *args):
-        pass
-    
-    def fill(self, *args):
-        pass
-    
-    def show(self, *args):
-        pass
-    
-    
 if __name__ == "__main__":
     
     i2c = I2C(i2c_num, sda=sda_pin, scl=scl_pin, freq=400000)
     try:
         oled = SSD1306_I2C(128, 32, i2c)
     except OSError:
-        oled = MockOLED() # No oled found so use a dummy
+        # No oled found so run the driver on a bus that just counts bytes
+        print('Using a counting stand-in for the OLED')
+        oled = SSD1306_I2C(128, 32, CountingI2C())
+    screen = TextLines(oled)
       
     # Read the temperature from the 9808
     mcp9808 = MCP9808(i2c)
     utime.sleep_ms(500)
-    for ii in range(15):
+    # The stream paces itself to the sensor's conversion time
+    for raw in mcp9808.stream(count=15):
         lines = []
-        lines.append(f'MCP9808: {round(mcp9808.get_temp())} C')
+        lines.append(f'MCP9808: {round(decode_temp(raw))} C')
 
-        # send the same output to the OLED and to stdout
-        oled.fill(0)
-        for jj in range(len(lines)):
-            print(lines[jj])
-            oled_writeln(oled, lines[jj], jj)
-        oled.show()
-        utime.sleep_ms(500)
+        # send the same output to the OLED and to stdout. Only lines whose
+        # text changed are redrawn and sent.
+        for line in lines:
+            print(line)
+        screen.write_lines(lines)
+        screen.show()
+        print(f'OLED bytes sent: {oled.bytes_sent}')
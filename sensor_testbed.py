@@ -13,41 +13,47 @@ and on an OLED board.'''
 import utime
 from machine import Pin, I2C
 from ssd1306 import SSD1306_I2C
+from oled_text import TextLines
 import dht11_pio 
 from internal_temperature_sensor import InternalTemperatureSensor
 from TMP36_Sensor import TMP36_TemperatureSensor
 from mcp9808 import MCP9808
 
-def oled_writeln(oled, s, line_num):
-    '''Writes a string to the specified line.'''
-    oled.text(s, 0, line_num*8)
-        
 if __name__ == "__main__":
     
     i2c = I2C(0, sda=Pin(0), scl=Pin(1), freq=400000)
     oled = SSD1306_I2C(128, 32, i2c)
+    screen = TextLines(oled)
  
     # Read the temperature from four different sensors
     # Some of these are pretty inaccurate so don't expect them to match
     mcp9808 = MCP9808(i2c)
     internal_temp_sensor = InternalTemperatureSensor()
     tmp36 = TMP36_TemperatureSensor(0) # TMP36 IC on ADC0
-    dht11 = dht11_pio.DHT11_PIO(15, 1)
+    # The DHT11 can only be sampled once a second, faster reads come from
+    # the cache. Conversions run in the background on the PIO.
+    dht11_sensor = dht11_pio.DHT11_PIO(15, 1)
+    dht11 = dht11_pio.CachedDHT(dht11_sensor, background=True)
     utime.sleep_ms(500)
     for ii in range(5):
         lines = []
         lines.append(f'MCP9808: {round(mcp9808.get_temp())} C')
         lines.append(f'TMP36  : {round(tmp36.read())} C')
         lines.append(f'Pico   : {round(internal_temp_sensor.read())} C')
-        humidity, temperature = dht11.read()
-        lines.append(f'DHT11: {temperature} C {humidity}%')
+        # A missing or failed DHT11 times out instead of stalling the loop
+        reading = dht11.read()
+        if reading.temperature is not None:
+            lines.append(f'DHT11: {reading.temperature} C {reading.humidity}%')
+        else:
+            lines.append(f'DHT11: {dht11_pio.STATUS_NAMES[reading.status]}')
 
-        oled.fill(0)
-        for jj in range(len(lines)):
-            print(lines[jj])
-            oled_writeln(oled, lines[jj], jj)
+        for line in lines:
+            print(line)
         print()
-        oled.show()
+        # Only lines whose text changed are redrawn and sent
+        screen.write_lines(lines)
+        screen.show()
         utime.sleep_ms(500)
         
-    dht11.deinit()
+    print(f'DHT11 cache: {dht11.hits} hits, {dht11.misses} misses, {dht11.checksum_failures} checksum failures')
+    dht11_sensor.deinit()
@@ -0,0 +1,110 @@
+# Micropython
+'''Statistics for the high and low periods measured by pio_counter. Plain
+Python with no hardware access, so it can be checked on a PC.
+
+The counter pushes one count per half period, high then low. A half period
+lasts CYCLES_PER_COUNT cycles per count plus HIGH_OVERHEAD or LOW_OVERHEAD
+cycles for the instructions between the counting loops. From the pairs this
+works out the frequency, duty cycle and period jitter, and builds
+histograms.'''
+
+from collections import namedtuple
+
+CYCLES_PER_COUNT = 2
+HIGH_OVERHEAD = 3 # mov(isr), push and mov(x) after the high loop
+LOW_OVERHEAD = 4 # the taken jmp(pin) as well after the low loop
+
+# freq in Hz, duty from 0 to 1, period and jitter in ns. jitter_rms is the
+# standard deviation of the period, jitter_pp its peak to peak spread.
+SignalStats = namedtuple('SignalStats', ('periods', 'freq', 'duty', 'period_ns',
+                                         'jitter_rms_ns', 'jitter_pp_ns'))
+
+
+def half_cycles(count, overhead=HIGH_OVERHEAD):
+    '''Cycles of the counter's clock in a half period with the given count.'''
+    return count * CYCLES_PER_COUNT + overhead
+
+
+def periods(counts):
+    '''Yields (high, low) cycles for each whole period in the counts.'''
+    for ii in range(0, len(counts) - 1, 2):
+        yield half_cycles(counts[ii]), half_cycles(counts[ii + 1], LOW_OVERHEAD)
+
+
+def analyse(counts, clock_freq):
+    '''Returns SignalStats for counts taken with a clock_freq Hz counter, or
+    None if they don't hold a whole period, meaning there was no signal.'''
+    n = 0
+    total = total_high = total_sq = 0
+    lo = hi = None
+    for high, low in periods(counts):
+        period = high + low
+        n += 1
+        total += period
+        total_high += high
+        total_sq += period * period
+        if lo is None or period < lo:
+            lo = period
+        if hi is None or period > hi:
+            hi = period
+    if n == 0:
+        return None
+    ns = 1e9 / clock_freq
+    mean = total / n
+    variance = max(total_sq / n - mean * mean, 0)
+    return SignalStats(n, clock_freq / mean, total_high / total, mean * ns,
+                       variance ** 0.5 * ns, (hi - lo) * ns)
+
+
+def histogram(values, bins=10):
+    '''Returns (edges, counts) with bins equal width bins from the lowest to
+    the highest value. edges holds the lower edge of each bin. Both are
+    empty if there are no values.'''
+    if not values:
+        return [], []
+    lo = min(values)
+    hi = max(values)
+    width = max((hi - lo) / bins, 1e-9) if hi > lo else 1
+    counts = [0] * bins
+    for v in values:
+        counts[min(int((v - lo) / width), bins - 1)] += 1
+    return [lo + ii * width for ii in range(bins)], counts
+
+
+def period_histogram(counts, clock_freq, bins=10):
+    '''Histogram of the periods in ns.'''
+    ns = 1e9 / clock_freq
+    return histogram([(high + low) * ns for high, low in periods(counts)], bins)
+
+
+def format_histogram(edges, counts, width=40, unit='ns'):
+    '''Renders a histogram as lines of text with bars of #.'''
+    if not counts:
+        return 'no signal'
+    top = max(counts) or 1
+    lines = []
+    for ii in range(len(counts)):
+        bar = '#' * (counts[ii] * width // top)
+        lines.append(f'{edges[ii]:>12.1f} {unit} {counts[ii]:>6} {bar}')
+    return '\n'.join(lines)
+
+
+if __name__ == "__main__":
+    # A 1 kHz 25% wave counted at 125 MHz: 31250 cycles high, 93750 low,
+    # with one period in four a cycle long
+    clock = 125000000
+    counts = []
+    for ii in range(400):
+        counts.append((31250 - HIGH_OVERHEAD) // 2)
+        counts.append((93750 - LOW_OVERHEAD + (ii % 4 == 0) * 2) // 2)
+    stats = analyse(counts, clock)
+    print(stats)
+    assert abs(stats.freq - 1000) < 0.1 and abs(stats.duty - 0.25) < 0.001
+    assert abs(stats.jitter_pp_ns - 16) < 0.01
+    edges, bins = period_histogram(counts, clock, 4)
+    print(format_histogram(edges, bins))
+    assert bins == [300, 0, 0, 100]
+    # A dead input captures nothing, or a lone half period
+    assert analyse([], clock) is None and analyse(counts[:1], clock) is None
+    assert period_histogram(counts[:1], clock) == ([], [])
+    assert format_histogram([], []) == 'no signal'
@@ -27,16 +27,53 @@ SET_CHARGE_PUMP = const(0x8D)
 # Subclassing FrameBuffer provides support for graphics primitives
 # http://docs.micropython.org/en/latest/pyboard/library/framebuf.html
 class SSD1306(framebuf.FrameBuffer):
-    def __init__(self, width, height, external_vcc):
+    def __init__(self, width, height, external_vcc, rotation=0):
+        # width, height, pages and buffer always describe the panel itself.
+        # In portrait mode (rotation 90 or 270) drawing happens in a separate
+        # frame buffer of logical_width x logical_height that show() converts
+        # to the panel layout. 180 and 270 use the panel's own flip.
+        if rotation not in (0, 90, 180, 270):
+            raise ValueError("rotation must be 0, 90, 180 or 270")
         self.width = width
         self.height = height
         self.external_vcc = external_vcc
+        self.rotation = rotation
         self.pages = self.height // 8
         self.buffer = bytearray(self.pages * self.width)
-        super().__init__(self.buffer, self.width, self.height, framebuf.MONO_VLSB)
+        # Copy of the frame as last sent to the panel. show() diffs against
+        # it so only the changed part of each page goes over the bus.
+        self.shadow = bytearray(len(self.buffer))
+        self.shadow_valid = False
+        self.dirty_x0 = bytearray(self.pages)
+        self.dirty_x1 = bytearray(self.pages)
+        self.bytes_sent = 0  # bus bytes used by the last show()
+        # Back buffer, its own dirty spans and state for show_async(), so a
+        # show() between two pages of a flush doesn't disturb it
+        self.back = None
+        self.back_x0 = bytearray(self.pages)
+        self.back_x1 = bytearray(self.pages)
+        self.flushing = False
+        self.flush_task = None
+        # Commands are collected here so a sequence of them goes out in one
+        # bus transaction. Byte 0 is reserved for the I2C control byte.
+        self.cmd_buf = memoryview(bytearray(33))
+        self.cmd_len = 0
+        self.batching = False
+        if rotation in (90, 270):
+            self.logical_width = height
+            self.logical_height = width
+            self.portrait = bytearray(len(self.buffer))
+            super().__init__(self.portrait, height, width, framebuf.MONO_VLSB)
+        else:
+            self.logical_width = width
+            self.logical_height = height
+            self.portrait = None
+            super().__init__(self.buffer, self.width, self.height, framebuf.MONO_VLSB)
         self.init_display()
 
     def init_display(self):
+        flip = self.rotation in (180, 270)
+        self.begin_cmds()
         for cmd in (
             SET_DISP,  # display off
             # address setting
@@ -44,10 +81,10 @@ class SSD1306(framebuf.FrameBuffer):
             0x00,  # horizontal
             # resolution and layout
             SET_DISP_START_LINE,  # start at line 0
-            SET_SEG_REMAP | 0x01,  # column addr 127 mapped to SEG0
+            SET_SEG_REMAP | (0x00 if flip else 0x01),  # column addr 127 mapped to SEG0
             SET_MUX_RATIO,
             self.height - 1,
-            SET_COM_OUT_DIR | 0x08,  # scan from COM[N] to COM0
+            SET_COM_OUT_DIR | (0x00 if flip else 0x08),  # scan from COM[N] to COM0
             SET_DISP_OFFSET,
             0x00,
             SET_COM_PIN_CFG,
@@ -72,8 +109,77 @@ class SSD1306(framebuf.FrameBuffer):
             SET_DISP | 0x01,  # display on
         ):  # on
             self.write_cmd(cmd)
+        self.end_cmds()
         self.fill(0)
-        self.show()
+        self.show(full=True)
+
+    def render_portrait(self, dst):
+        """Converts the portrait frame buffer into the panel's MONO_VLSB
+        layout in dst. Works on 8x8 pixel blocks: the 8 bytes of a block are
+        bit-transposed with three rounds of masked swaps instead of moving
+        64 pixels one at a time."""
+        src = self.portrait
+        src_stride = self.height
+        dst_stride = self.width
+        for q in range(self.width // 8):
+            for p in range(self.pages):
+                # Logical columns height-8-8p .. height-1-8p of logical page q
+                # become panel columns 8q .. 8q+7 of page p
+                s = q * src_stride + src_stride - 8 - 8 * p
+                d = p * dst_stride + 8 * q
+                a0 = src[s + 7]
+                a1 = src[s + 6]
+                a2 = src[s + 5]
+                a3 = src[s + 4]
+                a4 = src[s + 3]
+                a5 = src[s + 2]
+                a6 = src[s + 1]
+                a7 = src[s]
+                if a0 | a1 | a2 | a3 | a4 | a5 | a6 | a7:
+                    # swap 4x4 quadrants
+                    t = ((a0 >> 4) ^ a4) & 0x0F; a4 ^= t; a0 ^= t << 4
+                    t = ((a1 >> 4) ^ a5) & 0x0F; a5 ^= t; a1 ^= t << 4
+                    t = ((a2 >> 4) ^ a6) & 0x0F; a6 ^= t; a2 ^= t << 4
+                    t = ((a3 >> 4) ^ a7) & 0x0F; a7 ^= t; a3 ^= t << 4
+                    # swap 2x2 blocks within each quadrant
+                    t = ((a0 >> 2) ^ a2) & 0x33; a2 ^= t; a0 ^= t << 2
+                    t = ((a1 >> 2) ^ a3) & 0x33; a3 ^= t; a1 ^= t << 2
+                    t = ((a4 >> 2) ^ a6) & 0x33; a6 ^= t; a4 ^= t << 2
+                    t = ((a5 >> 2) ^ a7) & 0x33; a7 ^= t; a5 ^= t << 2
+                    # swap single bits within each 2x2 block
+                    t = ((a0 >> 1) ^ a1) & 0x55; a1 ^= t; a0 ^= t << 1
+                    t = ((a2 >> 1) ^ a3) & 0x55; a3 ^= t; a2 ^= t << 1
+                    t = ((a4 >> 1) ^ a5) & 0x55; a5 ^= t; a4 ^= t << 1
+                    t = ((a6 >> 1) ^ a7) & 0x55; a7 ^= t; a6 ^= t << 1
+                dst[d] = a0
+                dst[d + 1] = a1
+                dst[d + 2] = a2
+                dst[d + 3] = a3
+                dst[d + 4] = a4
+                dst[d + 5] = a5
+                dst[d + 6] = a6
+                dst[d + 7] = a7
+
+    def write_cmd(self, cmd):
+        n = self.cmd_len + 1
+        self.cmd_buf[n] = cmd
+        self.cmd_len = n
+        if not self.batching or n == len(self.cmd_buf) - 1:
+            self.flush_cmds()
+
+    def begin_cmds(self):
+        """Collects the following commands instead of sending each one."""
+        self.batching = True
+
+    def end_cmds(self):
+        """Sends the commands collected since begin_cmds()."""
+        self.batching = False
+        self.flush_cmds()
+
+    def flush_cmds(self):
+        if self.cmd_len:
+            self.write_cmds(self.cmd_buf[: self.cmd_len + 1])
+            self.cmd_len = 0
 
     def poweroff(self):
         self.write_cmd(SET_DISP)
@@ -82,53 +188,193 @@ class SSD1306(framebuf.FrameBuffer):
         self.write_cmd(SET_DISP | 0x01)
 
     def contrast(self, contrast):
+        self.begin_cmds()
         self.write_cmd(SET_CONTRAST)
         self.write_cmd(contrast)
+        self.end_cmds()
 
     def invert(self, invert):
         self.write_cmd(SET_NORM_INV | (invert & 1))
 
     def rotate(self, rotate):
+        self.begin_cmds()
         self.write_cmd(SET_COM_OUT_DIR | ((rotate & 1) << 3))
         self.write_cmd(SET_SEG_REMAP | (rotate & 1))
+        self.end_cmds()
+
+    def find_dirty(self, buf, pages=None, span_x0=None, span_x1=None):
+        """Compares buf against the shadow copy and records the span of
+        changed columns of every page in span_x0/span_x1, by default
+        dirty_x0/dirty_x1. Clean pages get x0 = 255. If pages is given, only
+        the pages whose bit is set in that mask are compared. Returns False
+        if nothing changed."""
+        shadow = self.shadow
+        if pages is None and buf == shadow:
+            return False
+        width = self.width
+        if span_x0 is None:
+            span_x0 = self.dirty_x0
+            span_x1 = self.dirty_x1
+        found = False
+        for page in range(self.pages):
+            start = page * width
+            end = start + width
+            if (pages is not None and not pages & (1 << page)) or buf[start:end] == shadow[start:end]:
+                span_x0[page] = 255
+                continue
+            x0 = 0
+            while buf[start + x0] == shadow[start + x0]:
+                x0 += 1
+            x1 = width - 1
+            while buf[start + x1] == shadow[start + x1]:
+                x1 -= 1
+            span_x0[page] = x0
+            span_x1[page] = x1
+            found = True
+        return found
+
+    def show(self, full=False, pages=None):
+        """Sends the columns of each page that changed since the last show().
+        Pass full=True to resend the whole frame. Callers that know which
+        panel pages they drew on can pass them as a bit mask in pages to
+        skip comparing the others; pages=0 sends nothing."""
+        self.bytes_sent = 0
+        if pages == 0 and not full and self.shadow_valid:
+            return
+        buf = self.buffer
+        shadow = self.shadow
+        if self.portrait is not None:
+            self.render_portrait(buf)
+        if full or not self.shadow_valid:
+            self.send_window(0, self.width - 1, 0, self.pages - 1, buf)
+            shadow[:] = buf
+            self.shadow_valid = True
+            return
+        if not self.find_dirty(buf, pages):
+            return
+
+        # Send one window per dirty page. Runs of pages that changed across
+        # the full width are contiguous in the buffer and share a window.
+        width = self.width
+        span_x0 = self.dirty_x0
+        span_x1 = self.dirty_x1
+        mv = memoryview(buf)
+        page = 0
+        while page < self.pages:
+            x0 = span_x0[page]
+            if x0 == 255:
+                page += 1
+                continue
+            x1 = span_x1[page]
+            last = page
+            if x0 == 0 and x1 == width - 1:
+                while last + 1 < self.pages and span_x0[last + 1] == 0 and span_x1[last + 1] == width - 1:
+                    last += 1
+            start = page * width + x0
+            end = last * width + x1 + 1
+            self.send_window(x0, x1, page, last, mv[start:end])
+            shadow[start:end] = mv[start:end]
+            page = last + 1
 
-    def show(self):
-        x0 = 0
-        x1 = self.width - 1
+    async def show_async(self, full=False):
+        """Non-blocking version of show() for uasyncio (or asyncio on a host).
+        The frame is copied to a back buffer and sent from there by a
+        background task, one page at a time with a yield between pages.
+        Drawing the next frame can start as soon as this returns. If the
+        previous frame is still being sent, this waits for it first.
+
+        show() may be called while a flush is running. Every page send
+        updates the shadow with exactly what went to the panel, so the two
+        stay in step; the page the flush sends last wins."""
+        try:
+            import uasyncio as asyncio
+        except ImportError:
+            import asyncio
+        while self.flushing:
+            await asyncio.sleep(0)
+        if self.back is None:
+            self.back = bytearray(len(self.buffer))
+        if self.portrait is not None:
+            self.render_portrait(self.back)
+        else:
+            self.back[:] = self.buffer
+        self.flushing = True
+        self.flush_task = asyncio.create_task(self.flush_back(full))
+
+    async def flush_back(self, full):
+        try:
+            import uasyncio as asyncio
+        except ImportError:
+            import asyncio
+        try:
+            self.bytes_sent = 0
+            back = self.back
+            shadow = self.shadow
+            width = self.width
+            span_x0 = self.back_x0
+            span_x1 = self.back_x1
+            # The shadow only becomes valid once a whole frame has been
+            # sent; a cancelled full flush leaves it invalid
+            whole = full or not self.shadow_valid
+            if whole:
+                span_x0[:] = bytes(self.pages)
+                span_x1[:] = bytes((width - 1,)) * self.pages
+            elif not self.find_dirty(back, None, span_x0, span_x1):
+                return
+            mv = memoryview(back)
+            for page in range(self.pages):
+                x0 = span_x0[page]
+                if x0 == 255:
+                    continue
+                x1 = span_x1[page]
+                start = page * width + x0
+                end = page * width + x1 + 1
+                self.send_window(x0, x1, page, page, mv[start:end])
+                shadow[start:end] = mv[start:end]
+                await asyncio.sleep(0)
+            if whole:
+                self.shadow_valid = True
+        finally:
+            self.flushing = False
+
+    def send_window(self, x0, x1, page0, page1, data):
+        """Sets the column and page window and streams data into it."""
         if self.width != 128:
             # narrow displays use centred columns
             col_offset = (128 - self.width) // 2
             x0 += col_offset
             x1 += col_offset
+        self.begin_cmds()
         self.write_cmd(SET_COL_ADDR)
         self.write_cmd(x0)
         self.write_cmd(x1)
         self.write_cmd(SET_PAGE_ADDR)
-        self.write_cmd(0)
-        self.write_cmd(self.pages - 1)
-        self.write_data(self.buffer)
+        self.write_cmd(page0)
+        self.write_cmd(page1)
+        self.end_cmds()
+        self.write_data(data)
 
 
 class SSD1306_I2C(SSD1306):
-    def __init__(self, width, height, i2c, addr=0x3C, external_vcc=False):
+    def __init__(self, width, height, i2c, addr=0x3C, external_vcc=False, rotation=0):
         self.i2c = i2c
         self.addr = addr
-        self.temp = bytearray(2)
         self.write_list = [b"\x40", None]  # Co=0, D/C#=1
-        super().__init__(width, height, external_vcc)
+        super().__init__(width, height, external_vcc, rotation)
 
-    def write_cmd(self, cmd):
-        self.temp[0] = 0x80  # Co=1, D/C#=0
-        self.temp[1] = cmd
-        self.i2c.writeto(self.addr, self.temp)
+    def write_cmds(self, buf):
+        buf[0] = 0x00  # Co=0, D/C#=0: all following bytes are commands
+        self.i2c.writeto(self.addr, buf)
+        self.bytes_sent += len(buf)
 
     def write_data(self, buf):
         self.write_list[1] = buf
         self.i2c.writevto(self.addr, self.write_list)
+        self.bytes_sent += 1 + len(buf)
 
 
 class SSD1306_SPI(SSD1306):
-    def __init__(self, width, height, spi, dc, res, cs, external_vcc=False):
+    def __init__(self, width, height, spi, dc, res, cs, external_vcc=False, rotation=0):
         self.rate = 10 * 1024 * 1024
         dc.init(dc.OUT, value=0)
         res.init(res.OUT, value=0)
@@ -137,27 +383,33 @@ class SSD1306_SPI(SSD1306):
         self.dc = dc
         self.res = res
         self.cs = cs
-        import time
+        import utime
 
         self.res(1)
-        time.sleep_ms(1)
+        utime.sleep_ms(1)
         self.res(0)
-        time.sleep_ms(10)
+        utime.sleep_ms(10)
         self.res(1)
-        super().__init__(width, height, external_vcc)
+        self.init_spi()
+        super().__init__(width, height, external_vcc, rotation)
 
-    def write_cmd(self, cmd):
+    def init_spi(self):
+        # The bus is only configured here. Call this again if another device
+        # on the same bus changes the SPI settings.
         self.spi.init(baudrate=self.rate, polarity=0, phase=0)
+
+    def write_cmds(self, buf):
         self.cs(1)
         self.dc(0)
         self.cs(0)
-        self.spi.write(bytearray([cmd]))
+        self.spi.write(buf[1:])
         self.cs(1)
+        self.bytes_sent += len(buf) - 1
 
     def write_data(self, buf):
-        self.spi.init(baudrate=self.rate, polarity=0, phase=0)
         self.cs(1)
         self.dc(1)
         self.cs(0)
         self.spi.write(buf)
-        self.cs(1)
\ No newline at end of file
+        self.cs(1)
+        self.bytes_sent += len(buf)
\ No newline at end of file
@@ -0,0 +1,82 @@
+# Micropython
+'''Measures how a blocking show() delays other tasks compared with
+show_async(). A display task redraws a 128x64 frame as fast as it can while a
+sensor task wakes up every few milliseconds and records how late it ran.
+
+The display sits on a fake I2C bus that busy-waits for as long as the bytes
+would take on a 400 kHz bus (9 clocks per byte), so the blocking behaviour
+matches real hardware. Runs under uasyncio on the board or asyncio on a host.'''
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+import utime
+from ssd1306 import SSD1306_I2C
+
+BUS_FREQ = 400000
+SENSOR_PERIOD_MS = 5
+FRAMES = 20
+
+
+class SlowI2C():
+    '''Fake I2C bus that blocks for the transfer time of each write.'''
+
+    def _transfer(self, nbytes):
+        # address byte plus payload, 9 clocks each
+        wait_us = (nbytes + 1) * 9 * 1000000 // BUS_FREQ
+        start = utime.ticks_us()
+        while utime.ticks_diff(utime.ticks_us(), start) < wait_us:
+            pass
+
+    def writeto(self, addr, buf):
+        self._transfer(len(buf))
+
+    def writevto(self, addr, vector):
+        self._transfer(sum(len(buf) for buf in vector))
+
+
+async def sensor_task(stats, done):
+    '''Wakes up every SENSOR_PERIOD_MS and records the worst lateness.'''
+    due = utime.ticks_us()
+    while not done[0]:
+        due = utime.ticks_add(due, SENSOR_PERIOD_MS * 1000)
+        delay = utime.ticks_diff(due, utime.ticks_us())
+        await asyncio.sleep(max(delay, 0) / 1000000)
+        late = utime.ticks_diff(utime.ticks_us(), due)
+        stats[0] = max(stats[0], late)
+        stats[1] += 1
+        if late > SENSOR_PERIOD_MS * 1000:
+            due = utime.ticks_us() # don't try to catch up on missed periods
+
+
+async def display_task(oled, use_async, done):
+    for frame in range(FRAMES):
+        # Change every page so each frame is a full transfer
+        oled.fill(frame & 1)
+        oled.text(f'frame {frame}', 0, 0, (frame + 1) & 1)
+        if use_async:
+            await oled.show_async()
+        else:
+            oled.show()
+            await asyncio.sleep(0)
+    while oled.flushing:
+        await asyncio.sleep(0)
+    done[0] = True
+
+
+async def run(use_async):
+    oled = SSD1306_I2C(128, 64, SlowI2C())
+    stats = [0, 0] # worst lateness in us, wake-ups
+    done = [False]
+    start = utime.ticks_ms()
+    await asyncio.gather(sensor_task(stats, done), display_task(oled, use_async, done))
+    elapsed = utime.ticks_diff(utime.ticks_ms(), start)
+    label = 'show_async()' if use_async else 'show()'
+    print(f'{label:<14} {FRAMES} frames in {elapsed} ms, sensor task: '
+          f'{stats[1]} wake-ups, worst lateness {stats[0] / 1000:.1f} ms')
+
+
+if __name__ == "__main__":
+    asyncio.run(run(False))
+    asyncio.run(run(True))
@@ -0,0 +1,107 @@
+# Micropython
+'''Counts the bus traffic of the SSD1306 driver. The display is attached to
+the counting I2C and SPI stand-ins from counting_bus, so this runs without
+a panel.
+
+Prints the cost of display init and of typical frames: a full redraw, a
+single changed digit and an unchanged frame, plus a status screen refreshed
+with and without the TextLines layer. It also compares the frame rate
+of the portrait mode conversion with a naive per-pixel rotation.'''
+
+import framebuf
+import utime
+from ssd1306 import SSD1306_I2C, SSD1306_SPI
+from counting_bus import CountingI2C, CountingSPI, FakePin
+from oled_text import TextLines
+
+
+def report(label, bus, oled):
+    print(f'{label:<24} {bus.transactions:>4} transactions {bus.bytes:>5} bytes')
+    bus.reset()
+
+
+def frames(bus, oled):
+    '''Draws a few representative frames and reports the traffic of each.'''
+    oled.fill(0)
+    oled.text('MCP9808: 21 C', 0, 0)
+    oled.text('TMP36  : 22 C', 0, 8)
+    oled.show()
+    report('  full redraw', bus, oled)
+
+    oled.fill_rect(72, 0, 8, 8, 0)
+    oled.text('3', 72, 0)
+    oled.show()
+    report('  one digit changed', bus, oled)
+
+    oled.show()
+    report('  unchanged frame', bus, oled)
+
+
+def status_screen(ticks=10):
+    '''Refreshes a four line status screen where one value changes on every
+    third tick, first redrawing everything and then through TextLines.'''
+    bus = CountingI2C()
+    oled = SSD1306_I2C(128, 32, bus)
+    screen = TextLines(oled)
+    bus.reset()
+    for tick in range(ticks):
+        lines = [f'MCP9808: {21 + tick // 3} C', 'TMP36  : 22 C', 'Pico   : 25 C', 'DHT11: 21 C 40%']
+        oled.fill(0)
+        for jj in range(len(lines)):
+            oled.text(lines[jj], 0, jj * 8)
+        oled.show(full=True)
+    print(f'Status screen x{ticks}: full redraw {bus.bytes} bytes', end='')
+    bus.reset()
+    for tick in range(ticks):
+        lines = [f'MCP9808: {21 + tick // 3} C', 'TMP36  : 22 C', 'Pico   : 25 C', 'DHT11: 21 C 40%']
+        screen.write_lines(lines)
+        screen.show()
+    print(f', TextLines {bus.bytes} bytes ({screen.redraws} line redraws)')
+
+
+def naive_rotate(oled, panel):
+    '''Copies the portrait frame to the panel layout one pixel at a time.'''
+    h = oled.height
+    for y in range(oled.logical_height):
+        for x in range(oled.logical_width):
+            panel.pixel(y, h - 1 - x, oled.pixel(x, y))
+
+
+def rotation_fps(height, frames=5):
+    oled = SSD1306_I2C(128, height, CountingI2C(), rotation=90)
+    oled.fill(0)
+    for row in range(0, oled.logical_height, 10):
+        oled.text(f'{row:>3}', 0, row)
+    panel = framebuf.FrameBuffer(oled.buffer, oled.width, oled.height, framebuf.MONO_VLSB)
+
+    start = utime.ticks_us()
+    for _ in range(frames):
+        naive_rotate(oled, panel)
+    naive = frames * 1000000 / utime.ticks_diff(utime.ticks_us(), start)
+
+    start = utime.ticks_us()
+    for _ in range(frames):
+        oled.render_portrait(oled.buffer)
+    blockwise = frames * 1000000 / utime.ticks_diff(utime.ticks_us(), start)
+    print(f'Portrait 128x{height}: per-pixel {naive:.1f} fps, 8x8 blocks {blockwise:.1f} fps')
+
+
+if __name__ == "__main__":
+    for height in (32, 64):
+        i2c = CountingI2C()
+        oled = SSD1306_I2C(128, height, i2c)
+        print(f'I2C 128x{height}')
+        report('  init + blank frame', i2c, oled)
+        frames(i2c, oled)
+
+    spi = CountingSPI()
+    oled = SSD1306_SPI(128, 64, spi, FakePin(), FakePin(), FakePin())
+    print('SPI 128x64')
+    report('  init + blank frame', spi, oled)
+    frames(spi, oled)
+    print(f'  SPI bus configured {spi.inits} time(s)')
+
+    rotation_fps(32)
+    rotation_fps(64)
+
+    status_screen()
@@ -0,0 +1,161 @@
+# Micropython
+'''A scrolling strip chart of temperature history for an SSD1306 OLED.
+
+Redrawing a full history plot on every sample is too slow in MicroPython, so
+the chart keeps its plot in a small FrameBuffer of its own. On each sample it
+scrolls that buffer left by one column, draws only the newest column and blits
+the plot onto the display. The whole plot is only redrawn when the value range
+changes enough to need a new scale.
+
+The SSD1306's hardware horizontal scroll is not used: it scrolls on the
+panel's own frame timer, so it can't be stepped by exactly one column per
+sample.'''
+
+import framebuf
+from array import array
+from mcp9808 import decode_temp_centi
+
+# Smallest span of the vertical scale, in hundredths of a degree
+MIN_SPAN = 100
+
+
+def read_centi(sensor):
+    '''Reads a sensor and returns hundredths of a degree celsius. Works with
+    MCP9808 (raw integer path, no floats), TMP36_TemperatureSensor and
+    InternalTemperatureSensor.'''
+    if hasattr(sensor, 'get_temp_raw'):
+        return decode_temp_centi(sensor.get_temp_raw())
+    return int(sensor.read() * 100)
+
+
+class StripChart():
+    '''Plots one value per column, newest on the right. Values are integers,
+    normally hundredths of a degree.'''
+
+    def __init__(self, oled, x=0, y=0, width=None, height=None):
+        self.oled = oled
+        self.x = x
+        self.y = y
+        self.width = width or oled.logical_width - x
+        self.height = height or oled.logical_height - y
+        self.buffer = bytearray(((self.height + 7) // 8) * self.width)
+        self.fb = framebuf.FrameBuffer(self.buffer, self.width, self.height, framebuf.MONO_VLSB)
+        self.samples = array('h', [0] * self.width)
+        self.head = 0 # slot of the next sample
+        self.count = 0
+        self.lo = 0 # current scale
+        self.hi = 0
+        self.data_lo = 0 # range of the buffered samples
+        self.data_hi = 0
+        self.last_y = 0
+        self.rescales = 0
+
+    def _to_y(self, value):
+        return self.height - 1 - (value - self.lo) * (self.height - 1) // (self.hi - self.lo)
+
+    def _set_scale(self):
+        '''Fits the scale to the buffered samples with a little headroom.'''
+        span = self.data_hi - self.data_lo
+        pad = max(span // 8, (MIN_SPAN - span) // 2, 1)
+        self.lo = self.data_lo - pad
+        self.hi = self.data_hi + pad
+        self.rescales += 1
+
+    def _find_data_range(self):
+        n = self.count
+        start = (self.head - n) % self.width
+        lo = hi = self.samples[start]
+        for ii in range(1, n):
+            value = self.samples[(start + ii) % self.width]
+            if value < lo:
+                lo = value
+            elif value > hi:
+                hi = value
+        self.data_lo = lo
+        self.data_hi = hi
+
+    def add(self, value):
+        '''Adds a sample and updates the display's frame buffer. Call the
+        display's show() to send it.'''
+        evicted = self.samples[self.head] if self.count == self.width else None
+        self.samples[self.head] = value
+        self.head = (self.head + 1) % self.width
+        if self.count < self.width:
+            self.count += 1
+
+        if self.count == 1:
+            self.data_lo = self.data_hi = value
+        else:
+            if value < self.data_lo:
+                self.data_lo = value
+            if value > self.data_hi:
+                self.data_hi = value
+            if evicted is not None and (evicted == self.data_lo or evicted == self.data_hi):
+                self._find_data_range()
+
+        # Rescale when the data leaves the scale, or has shrunk to less than
+        # half of it
+        span = self.hi - self.lo
+        if (self.count == 1 or self.data_lo < self.lo or self.data_hi > self.hi
+                or (span > MIN_SPAN and 2 * (self.data_hi - self.data_lo) < span)):
+            self._set_scale()
+            self.redraw()
+            return
+
+        fb = self.fb
+        w = self.width - 1
+        y = self._to_y(value)
+        fb.scroll(-1, 0)
+        fb.vline(w, 0, self.height, 0)
+        # join to the previous sample so steep changes stay visible
+        fb.vline(w, min(y, self.last_y), abs(y - self.last_y) + 1, 1)
+        self.last_y = y
+        self.oled.blit(fb, self.x, self.y)
+
+    def redraw(self):
+        '''Draws the whole history again with the current scale.'''
+        fb = self.fb
+        fb.fill(0)
+        n = self.count
+        start = (self.head - n) % self.width
+        x = self.width - n
+        last = self._to_y(self.samples[start])
+        for ii in range(n):
+            y = self._to_y(self.samples[(start + ii) % self.width])
+            fb.vline(x + ii, min(y, last), abs(y - last) + 1, 1)
+            last = y
+        self.last_y = last
+        self.oled.blit(fb, self.x, self.y)
+
+    def sample(self, sensor):
+        '''Reads a sensor with read_centi() and adds the value.'''
+        self.add(read_centi(sensor))
+
+
+if __name__ == "__main__":
+    import utime
+    from machine import Pin, I2C
+    from ssd1306 import SSD1306_I2C
+    from mcp9808 import MCP9808, TEMP_RESOLUTION_MIN
+
+    i2c = I2C(0, sda=Pin(0), scl=Pin(1), freq=400000)
+    oled = SSD1306_I2C(128, 32, i2c)
+    mcp9808 = MCP9808(i2c)
+    mcp9808.set_resolution(TEMP_RESOLUTION_MIN) # a new value every 30 ms
+    chart = StripChart(oled, y=8, height=24)
+
+    # Plot at the sensor's full rate and compare the cost of an incremental
+    # update with that of a full redraw
+    update_us = 0
+    redraw_us = 0
+    for raw in mcp9808.stream(count=300):
+        start = utime.ticks_us()
+        chart.add(decode_temp_centi(raw))
+        update_us += utime.ticks_diff(utime.ticks_us(), start)
+        start = utime.ticks_us()
+        chart.redraw()
+        redraw_us += utime.ticks_diff(utime.ticks_us(), start)
+        oled.fill_rect(0, 0, 128, 8, 0)
+        oled.text(f'{decode_temp_centi(raw) / 100:.2f} C', 0, 0)
+        oled.show()
+    print(f'Average update {update_us // 300} us, full redraw {redraw_us // 300} us, {chart.rescales} rescales')
@@ -0,0 +1,92 @@
+# Micropython
+'''Phase-aligned square and PWM waveforms from PIO state machines.
+
+Each channel is a state machine running a four instruction program that
+holds its pin high for a count loaded into Y and low for a count loaded
+into the OSR (not the ISR, which the SM_RESTART used at start clears).
+pio_clock.solve() picks the clock divider and counts for the requested
+frequency and duty cycle. The divider is written to the state machine's
+CLKDIV register directly, because StateMachine(freq=...) can't choose
+between an integer and a fractional divider. All channels on a PIO
+block are then started with one write to the block's CTRL register, so they
+run in lockstep with their edges aligned.'''
+
+import machine
+from machine import Pin, mem32
+from rp2 import PIO, StateMachine, asm_pio
+from pio_clock import solve, clkdiv_register
+import pio_regs
+
+
+@asm_pio(sideset_init=PIO.OUT_LOW)
+def waveform():
+    wrap_target()
+    mov(x, y)           .side(1)    # high for y + 2 cycles
+    label('high')
+    jmp(x_dec, 'high')
+    mov(x, osr)         .side(0)    # low for osr + 2 cycles
+    label('low')
+    jmp(x_dec, 'low')
+    wrap()
+
+
+class WaveformGenerator():
+    '''Drives a set of channels, each given as (pin, freq, duty). Channels
+    use state machines first_sm, first_sm + 1, ... Channels on the same PIO
+    block (state machines 0-3 or 4-7) start in lockstep.'''
+
+    def __init__(self, channels, first_sm=0, integer_only=False):
+        if first_sm < 0 or first_sm + len(channels) > 8:
+            raise ValueError('Not enough state machines for the channels')
+        sys_freq = machine.freq()
+        self.settings = []
+        self.sms = []
+        self.state_machines = []
+        for ii in range(len(channels)):
+            pin, freq, duty = channels[ii]
+            setting = solve(freq, duty, sys_freq, integer_only)
+            sm_id = first_sm + ii
+            sm = StateMachine(sm_id, waveform, sideset_base=Pin(pin))
+            # Load the high count into Y and the low count into the OSR
+            sm.put(setting.high)
+            sm.exec('pull()')
+            sm.exec('mov(y, osr)')
+            sm.put(setting.low)
+            sm.exec('pull()')
+            mem32[pio_regs.clkdiv(sm_id)] = clkdiv_register(setting.div_int, setting.div_frac)
+            self.settings.append(setting)
+            self.sms.append(sm_id)
+            self.state_machines.append(sm)
+
+    def _masks(self):
+        '''(CTRL address, bit mask of the channels' state machines) for each
+        PIO block in use.'''
+        masks = {}
+        for sm_id in self.sms:
+            ctrl = pio_regs.ctrl(sm_id)
+            masks[ctrl] = masks.get(ctrl, 0) | pio_regs.sm_mask(sm_id)
+        return masks.items()
+
+    def start(self):
+        '''Restarts the channels' clock dividers and starts them together.
+        StateMachine.active() starts one at a time, so this writes CTRL.'''
+        for ctrl, mask in self._masks():
+            mem32[ctrl] = (mem32[ctrl] & 0xF) | mask | (mask << 4) | (mask << 8)
+
+    def stop(self):
+        for sm in self.state_machines:
+            sm.active(0)
+
+    def report(self):
+        for ii in range(len(self.settings)):
+            s = self.settings[ii]
+            print(f'SM{self.sms[ii]}: div {s.div_int}+{s.div_frac}/256 {s.freq:.3f} Hz '
+                  f'duty {s.duty:.3f} error {s.error_ppm:+.3f} ppm')
+
+
+if __name__ == "__main__":
+    # Three aligned outputs: a 1 kHz square wave, a 1 kHz 25% PWM and
+    # a 4 kHz square wave for an oscilloscope on GP15, GP14 and GP13
+    gen = WaveformGenerator(((15, 1000, 0.5), (14, 1000, 0.25), (13, 4000, 0.5)))
+    gen.report()
+    gen.start()